@@ -0,0 +1,148 @@
+"""
+Serve user media with validators, Range support and sendfile offload.
+
+With MEDIA_SENDFILE set to "x-accel-redirect" (nginx) or "x-sendfile"
+(Apache, lighttpd) the view only checks the request and sets headers;
+the web server sends the bytes. Otherwise files are streamed through
+FileResponse, which lets the WSGI server use its zero-copy file wrapper.
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponse,
+    HttpResponseNotModified,
+    StreamingHttpResponse,
+)
+from django.utils._os import safe_join
+from django.utils.cache import patch_cache_control
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+
+READ_BLOCK_SIZE = 64 * 1024
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+# File names holding a SHA-256 digest or a uuid4 are never overwritten.
+IMMUTABLE_NAME = re.compile(
+    r"[0-9a-f]{64}"
+    r"|[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}"
+)
+RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def is_immutable(path: str) -> bool:
+    return bool(IMMUTABLE_NAME.search(os.path.basename(path)))
+
+
+def get_etag(stat) -> str:
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def parse_range(header: str, size: int):
+    """Return the (start, end) of a single byte range, None if absent.
+
+    Raises ValueError when the range cannot be satisfied.
+    """
+    match = RANGE.match(header.strip())
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first:
+        if not last or int(last) == 0:
+            raise ValueError(header)
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError(header)
+    return start, end
+
+
+def read_range(path: str, start: int, length: int):
+    with open(path, "rb") as file:
+        file.seek(start)
+        while length > 0:
+            block = file.read(min(READ_BLOCK_SIZE, length))
+            if not block:
+                break
+            length -= len(block)
+            yield block
+
+
+def offload(path: str, name: str) -> HttpResponse:
+    response = HttpResponse()
+    if settings.MEDIA_SENDFILE == "x-accel-redirect":
+        response["X-Accel-Redirect"] = quote(
+            settings.MEDIA_ACCEL_REDIRECT_PREFIX + name
+        )
+    else:
+        response["X-Sendfile"] = path
+    return response
+
+
+def file_response(request, path: str, size: int, etag: str):
+    range_header = request.headers.get("Range")
+    if_range = request.headers.get("If-Range")
+    if not range_header or if_range not in (None, etag):
+        return FileResponse(open(path, "rb"))
+
+    try:
+        byte_range = parse_range(range_header, size)
+    except ValueError:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+        return response
+    if byte_range is None:
+        return FileResponse(open(path, "rb"))
+
+    start, end = byte_range
+    response = StreamingHttpResponse(
+        read_range(path, start, end - start + 1), status=206
+    )
+    response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    response["Content-Length"] = end - start + 1
+    return response
+
+
+@require_safe
+def serve_media(request, path: str):
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404("Media file not found.")
+    try:
+        stat = os.stat(full_path)
+    except (FileNotFoundError, NotADirectoryError):
+        raise Http404("Media file not found.")
+    if not os.path.isfile(full_path):
+        raise Http404("Media file not found.")
+
+    etag = get_etag(stat)
+    if_none_match = request.headers.get("If-None-Match", "")
+    if etag in [tag.strip() for tag in if_none_match.split(",")]:
+        response = HttpResponseNotModified()
+    elif settings.MEDIA_SENDFILE:
+        # The web server answers Range requests for offloaded files.
+        response = offload(full_path, path)
+    else:
+        response = file_response(request, full_path, stat.st_size, etag)
+
+    if response.status_code not in (304, 416):
+        content_type, _ = mimetypes.guess_type(full_path)
+        response["Content-Type"] = content_type or "application/octet-stream"
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(stat.st_mtime)
+    response["Accept-Ranges"] = "bytes"
+    if is_immutable(path):
+        patch_cache_control(
+            response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True
+        )
+    else:
+        patch_cache_control(response, public=True, no_cache=True)
+    return response
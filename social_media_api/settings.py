@@ -13,6 +13,7 @@ import os
 from datetime import timedelta
 from pathlib import Path
 
+from celery.schedules import crontab
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -59,6 +60,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "user.replicas.replica_pin_middleware",
 ]
 
 ROOT_URLCONF = "social_media_api.urls"
@@ -91,6 +93,111 @@ DATABASES = {
     }
 }
 
+# Aliases of read replicas of "default". Locally, DATABASE_REPLICAS lists
+# SQLite files standing in for them; fill them with `sync_replicas`.
+DATABASE_REPLICAS = []
+for index, name in enumerate(
+    filter(None, os.environ.get("DATABASE_REPLICAS", "").split(",")), 1
+):
+    DATABASES[f"replica{index}"] = {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": BASE_DIR / name.strip(),
+    }
+    DATABASE_REPLICAS.append(f"replica{index}")
+
+# Aliases of the databases posts, comments and likes are sharded across
+# by author. Locally, DATABASE_SHARDS lists SQLite files; create their
+# schema with `migrate --database=shardN`, then move rows with `reshard`.
+DATABASE_SHARDS = []
+for index, name in enumerate(
+    filter(None, os.environ.get("DATABASE_SHARDS", "").split(",")), 1
+):
+    DATABASES[f"shard{index}"] = {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": BASE_DIR / name.strip(),
+    }
+    DATABASE_SHARDS.append(f"shard{index}")
+
+# Authors are hashed into this many buckets, the unit `reshard` moves.
+SHARD_BUCKETS = 256
+# How long the bucket to shard map stays cached. `reshard` drops it, but
+# requests already running keep the map they read; restart the web and
+# Celery workers once it is done.
+SHARD_MAP_CACHE_TIMEOUT = 60
+
+# Alias of the database `archive_old_posts` moves posts older than
+# POST_ARCHIVE_AFTER_DAYS to, with their comments and likes, so the hot
+# tables and their indexes only cover recent posts. Locally,
+# POST_ARCHIVE_DATABASE names a SQLite file; without it nothing is moved.
+POST_ARCHIVE_DATABASE = None
+if os.environ.get("POST_ARCHIVE_DATABASE"):
+    DATABASES["archive"] = {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": BASE_DIR / os.environ["POST_ARCHIVE_DATABASE"].strip(),
+    }
+    POST_ARCHIVE_DATABASE = "archive"
+POST_ARCHIVE_AFTER_DAYS = int(os.environ.get("POST_ARCHIVE_AFTER_DAYS", 90))
+
+DATABASE_ROUTERS = ["user.sharding.ShardRouter", "user.replicas.ReplicaRouter"]
+# How long a user's requests read from the primary after they write.
+REPLICA_PIN_SECONDS = 5
+
+REDIS_URL = os.environ.get("REDIS_URL")
+
+# Cache versions, follow graph sets and throttle counters must be shared
+# by every worker process; user.checks rejects per-process backends.
+CACHES = {
+    "default": (
+        {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+        if REDIS_URL
+        else {
+            "BACKEND": "django.core.cache.backends.filebased."
+            "FileBasedCache",
+            "LOCATION": BASE_DIR / "cache",
+        }
+    ),
+    "throttle": (
+        {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+        if REDIS_URL
+        else {
+            "BACKEND": "django.core.cache.backends.filebased."
+            "FileBasedCache",
+            "LOCATION": BASE_DIR / "throttle_cache",
+        }
+    ),
+}
+
+# How long per-user follow id sets stay cached between follow changes.
+FOLLOW_GRAPH_CACHE_TIMEOUT = 60 * 60
+# How long rendered feed and profile responses stay cached per viewer.
+RESPONSE_CACHE_TIMEOUT = 5 * 60
+# How long authenticated users are reused without a database lookup.
+AUTH_USER_CACHE_TIMEOUT = 60
+# How often the token blacklist Bloom filter is rebuilt, and its
+# false positive rate.
+TOKEN_BLACKLIST_REFRESH = 5 * 60
+TOKEN_BLACKLIST_ERROR_RATE = 0.001
+
+# Serve the hot read endpoints with async views; set by asgi.py.
+ASYNC_READ_VIEWS = os.environ.get("ASYNC_READ_VIEWS", "") == "True"
+
+# Buffer like actions outside the database and apply them in bulk.
+LIKE_BUFFER_ENABLED = os.environ.get("LIKE_BUFFER_ENABLED", "") == "True"
+# Used as the buffer when REDIS_URL is not set.
+LIKE_BUFFER_PATH = BASE_DIR / "like_buffer.sqlite3"
+
+# Limits of resumable uploads (bytes).
+UPLOAD_MAX_SIZE = 20 * 1024 * 1024
+UPLOAD_CHUNK_MAX_SIZE = 4 * 1024 * 1024
+
+TEST_RUNNER = "social_media_api.test_runner.TestRunner"
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -135,6 +242,12 @@ MEDIA_ROOT = BASE_DIR / "media"
 
 MEDIA_URL = "/media/"
 
+# Let the web server send media bytes: None, "x-accel-redirect" (nginx,
+# with an internal location at MEDIA_ACCEL_REDIRECT_PREFIX aliased to
+# MEDIA_ROOT) or "x-sendfile".
+MEDIA_SENDFILE = os.environ.get("MEDIA_SENDFILE") or None
+MEDIA_ACCEL_REDIRECT_PREFIX = "/protected-media/"
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -142,12 +255,19 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 REST_FRAMEWORK = {
     "DEFAULT_THROTTLE_CLASSES": [
-        "rest_framework.throttling.AnonRateThrottle",
-        "rest_framework.throttling.UserRateThrottle",
+        "user.throttling.AnonRateThrottle",
+        "user.throttling.UserRateThrottle",
+        "user.throttling.ScopedRateThrottle",
     ],
-    "DEFAULT_THROTTLE_RATES": {"anon": "100/day", "user": "1000/day"},
+    "DEFAULT_THROTTLE_RATES": {
+        "anon": "100/day",
+        "user": "1000/day",
+        "like": os.environ.get("LIKE_THROTTLE_RATE", "120/min"),
+        "comment": os.environ.get("COMMENT_THROTTLE_RATE", "20/min"),
+        "follow": os.environ.get("FOLLOW_THROTTLE_RATE", "60/min"),
+    },
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "user.authentication.CachedJWTAuthentication",
     ),
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
 }
@@ -156,6 +276,7 @@ SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(days=7),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=7),
     "ROTATE_REFRESH_TOKENS": True,
+    "TOKEN_REFRESH_SERIALIZER": "user.serializers.TokenRefreshSerializer",
 }
 
 SPECTACULAR_SETTINGS = {
@@ -170,3 +291,20 @@ CELERY_RESULT_BACKEND = os.environ.get("CELERY_BROKER_URL")
 CELERY_TIMEZONE = "Europe/Kyiv"
 CELERY_TASK_TRACK_STARTED = True
 CELERY_TASK_TIME_LIMIT = 30 * 60
+# Without a broker (local development, tests) run tasks inline.
+CELERY_TASK_ALWAYS_EAGER = not CELERY_BROKER_URL
+CELERY_TASK_EAGER_PROPAGATES = CELERY_TASK_ALWAYS_EAGER
+CELERY_BEAT_SCHEDULE = {
+    "flush-like-buffer": {
+        "task": "user.tasks.flush_like_buffer",
+        "schedule": timedelta(seconds=5),
+    },
+    "flush-expired-tokens": {
+        "task": "user.tasks.flush_expired_tokens",
+        "schedule": crontab(hour=4, minute=0),
+    },
+    "archive-old-posts": {
+        "task": "user.tasks.archive_old_posts",
+        "schedule": crontab(hour=3, minute=0),
+    },
+}
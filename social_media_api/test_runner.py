@@ -0,0 +1,83 @@
+import unittest
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+# SQLite databases standing in for read replicas in the routing tests.
+TEST_REPLICAS = ("replica1", "replica2")
+# And for shards and the post archive in the tests of those.
+TEST_SHARDS = ("shard1", "shard2")
+TEST_ARCHIVE = "archive"
+
+
+class CacheClearingResultMixin:
+    """Empty every cache before each test.
+
+    Test transactions roll back, so primary keys are reused from test to
+    test and per-id cache entries would otherwise leak between them.
+    """
+
+    def startTest(self, test) -> None:
+        for cache in caches.all():
+            cache.clear()
+        super().startTest(test)
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Run tests against private in-memory caches, cleared per test, with
+    replica, shard and archive aliases available but unused by default.
+    """
+
+    def setup_test_environment(self, **kwargs) -> None:
+        super().setup_test_environment(**kwargs)
+        for alias in (*TEST_REPLICAS, *TEST_SHARDS, TEST_ARCHIVE):
+            settings.DATABASES.setdefault(
+                alias, {"ENGINE": "django.db.backends.sqlite3"}
+            )
+        connections.configure_settings(settings.DATABASES)
+        # Reads only go to replicas, and rows to shards or the archive,
+        # in tests that enable them.
+        self.test_settings = override_settings(
+            CACHES={
+                alias: {
+                    "BACKEND": "django.core.cache.backends.locmem."
+                    "LocMemCache",
+                    "LOCATION": f"test-{alias}",
+                }
+                for alias in settings.CACHES
+            },
+            # Tests run in a single process.
+            SILENCED_SYSTEM_CHECKS=[
+                *settings.SILENCED_SYSTEM_CHECKS,
+                "user.E001",
+            ],
+            DATABASE_REPLICAS=[],
+            DATABASE_SHARDS=[],
+            POST_ARCHIVE_DATABASE=None,
+        )
+        self.test_settings.enable()
+
+    def setup_databases(self, **kwargs):
+        # Migrate the shard and archive aliases as such, without the
+        # foreign keys to users which only "default" holds.
+        with override_settings(
+            DATABASE_SHARDS=list(TEST_SHARDS),
+            POST_ARCHIVE_DATABASE=TEST_ARCHIVE,
+        ):
+            return super().setup_databases(**kwargs)
+
+    def teardown_test_environment(self, **kwargs) -> None:
+        self.test_settings.disable()
+        super().teardown_test_environment(**kwargs)
+
+    def get_resultclass(self):
+        result_class = super().get_resultclass() or unittest.TextTestResult
+        return type(
+            "CacheClearingResult",
+            (CacheClearingResultMixin, result_class),
+            {},
+        )
@@ -2,7 +2,7 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as DjangoUserAdmin
 from django.utils.translation import gettext as _
 
-from .models import User, Post, Comment
+from .models import User, Post, Comment, Follow
 
 
 @admin.register(User)
@@ -38,10 +38,29 @@ class UserAdmin(DjangoUserAdmin):
             },
         ),
     )
-    list_display = ("email", "first_name", "last_name", "is_staff")
+    list_display = (
+        "email",
+        "first_name",
+        "last_name",
+        "is_staff",
+        "followers",
+        "following",
+    )
     search_fields = ("email", "first_name", "last_name")
     ordering = ("email",)
 
+    def get_queryset(self, request):
+        return User.objects.with_follow_counts()
+
+    @admin.display(ordering="live_followers_count")
+    def followers(self, obj) -> int:
+        return obj.live_followers_count
+
+    @admin.display(ordering="live_following_count")
+    def following(self, obj) -> int:
+        return obj.live_following_count
+
 
 admin.site.register(Post)
 admin.site.register(Comment)
+admin.site.register(Follow)
@@ -0,0 +1,103 @@
+"""
+ASGI read path for the feed, profile and liked-posts endpoints.
+
+DRF views are synchronous, so under ASGI each request holds a thread
+while it waits on the database and the cache. These wrappers run GET
+and HEAD as coroutines instead: the versioned response cache is awaited
+with Django's async cache calls, and views render JSON in the event
+loop. The path is cache-hit-only: no read uses the async ORM.
+`APIView.initial` (authentication, permissions, throttling), the
+queries and serializers of a cache miss, and every other method still
+run the DRF code in a thread.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.urls import URLPattern
+from rest_framework.renderers import JSONRenderer
+
+ASYNC_METHODS = ("get", "head")
+
+
+async def adispatch(view, request, *args, **kwargs):
+    """`APIView.dispatch` awaiting the `a<handler>` of the action"""
+    view.args = args
+    view.kwargs = kwargs
+    request = view.initialize_request(request, *args, **kwargs)
+    view.request = request
+    view.headers = view.default_response_headers
+
+    try:
+        # Authentication, permissions and throttling are DRF's own.
+        await sync_to_async(view.initial)(request, *args, **kwargs)
+        method = request.method.lower()
+        name = getattr(view, "action_map", {}).get(method, method)
+        handler = getattr(view, f"a{name}", None)
+        if handler is None:
+            handler = sync_to_async(getattr(view, name))
+        response = await handler(request, *args, **kwargs)
+    except Exception as exc:
+        response = view.handle_exception(exc)
+
+    view.response = view.finalize_response(request, response, *args, **kwargs)
+    # Other renderers may query the database; Django renders them later.
+    if isinstance(request.accepted_renderer, JSONRenderer):
+        view.response.render()
+    return view.response
+
+
+def as_async_view(view_class, actions=None, **initkwargs):
+    """
+    Wrap a DRF view (or viewset with `actions`) for the async read path.
+
+    GET and HEAD are dispatched as coroutines; other methods go to the
+    regular synchronous view.
+    """
+    if actions is None:
+        sync_view = view_class.as_view(**initkwargs)
+    else:
+        sync_view = view_class.as_view(dict(actions), **initkwargs)
+        actions = {"head": actions["get"], **actions}
+    sync_handler = sync_to_async(sync_view)
+
+    async def view(request, *args, **kwargs):
+        if request.method.lower() not in ASYNC_METHODS:
+            return await sync_handler(request, *args, **kwargs)
+
+        instance = view_class(**initkwargs)
+        if actions is not None:
+            instance.action_map = actions
+            for method, action in actions.items():
+                setattr(instance, method, getattr(instance, action))
+        instance.request = request
+        # Context variables set while handling the request, like the
+        # replica alias, must not leak into the caller's context.
+        return await asyncio.create_task(
+            adispatch(instance, request, *args, **kwargs)
+        )
+
+    view.cls = view_class
+    view.initkwargs = initkwargs
+    view.actions = actions
+    # DRF's SessionAuthentication enforces CSRF itself.
+    view.csrf_exempt = True
+    return view
+
+
+def with_async_reads(urlpatterns, names) -> list:
+    """Swap the views of the named URL patterns for async wrappers"""
+    return [
+        URLPattern(
+            url.pattern,
+            as_async_view(
+                url.callback.cls,
+                getattr(url.callback, "actions", None),
+                **url.callback.initkwargs,
+            ),
+            url.default_args,
+            url.name,
+        )
+        if getattr(url, "name", None) in names
+        else url
+        for url in urlpatterns
+    ]
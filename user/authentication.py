@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from user.caching import auth_scope, get_versions
+
+AUTH_USER_KEY = "auth-user:{}:{}"
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that resolves `request.user` from the cache.
+
+    Entries are keyed by user id and the user's auth version, which is
+    bumped whenever the user row, their groups or permissions change.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(
+                "Token contained no recognizable user identification"
+            )
+
+        (version,) = get_versions([auth_scope(user_id)])
+        key = AUTH_USER_KEY.format(user_id, version)
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(validated_token)
+            cache.set(key, user, settings.AUTH_USER_CACHE_TIMEOUT)
+        return user
@@ -0,0 +1,218 @@
+"""
+Versioned response caching for hot read endpoints.
+
+Every cached response depends on a few version "scopes" (a post, a
+user, all posts of an author). Writes bump the versions of the scopes
+they touch; readers hash the current versions into a strong ETag, so an
+unchanged resource is answered with 304, or from the cache, without
+touching the ORM or the serializers. Responses rendered from data that
+may lag behind the versions, such as a replica's, are kept briefly and
+validated by ETags of their own.
+"""
+import hashlib
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import patch_cache_control
+from rest_framework import status
+from rest_framework.response import Response
+
+VERSION_KEY = "version:{}"
+RESPONSE_KEY = "response:{}"
+POST_AUTHOR_KEY = "post-author:{}"
+
+
+def post_scope(post_id) -> str:
+    return f"post:{post_id}"
+
+
+def author_scope(user_id) -> str:
+    return f"author:{user_id}"
+
+
+def user_scope(user_id) -> str:
+    return f"user:{user_id}"
+
+
+def auth_scope(user_id) -> str:
+    return f"auth:{user_id}"
+
+
+def _new_version() -> str:
+    return uuid.uuid4().hex[:12]
+
+
+def get_versions(scopes) -> list[str]:
+    keys = [VERSION_KEY.format(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    missing = {key: _new_version() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+async def aget_versions(scopes) -> list[str]:
+    keys = [VERSION_KEY.format(scope) for scope in scopes]
+    versions = await cache.aget_many(keys)
+    missing = {key: _new_version() for key in keys if key not in versions}
+    if missing:
+        await cache.aset_many(missing, timeout=None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def bump(*scopes, using=None) -> None:
+    """Invalidate every cached response that depends on `scopes`.
+
+    Runs once the transaction open on `using` commits; a response
+    rendered in between would otherwise be cached under the new version.
+    """
+    if scopes:
+        keys = [VERSION_KEY.format(scope) for scope in scopes]
+        transaction.on_commit(
+            lambda: cache.set_many(
+                {key: _new_version() for key in keys}, timeout=None
+            ),
+            using=using,
+        )
+
+
+def bump_post(post_id, author_id, using=None) -> None:
+    bump(post_scope(post_id), author_scope(author_id), using=using)
+
+
+def bump_posts(authors: dict[int, int], using=None) -> None:
+    """Bump many posts at once; `authors` maps post ids to author ids"""
+    bump(
+        *map(post_scope, authors),
+        *{author_scope(author_id) for author_id in authors.values()},
+        using=using,
+    )
+
+
+def remember_post_author(post_id, user_id) -> None:
+    cache.set(POST_AUTHOR_KEY.format(post_id), user_id, timeout=None)
+
+
+def get_post_author(post_id):
+    return cache.get(POST_AUTHOR_KEY.format(post_id))
+
+
+class CachedResponseMixin:
+    """
+    Serve `list` and `retrieve` from a per-viewer response cache.
+
+    Views return the version scopes of a response from
+    `get_cache_scopes()`, or None to skip caching for an action.
+    """
+
+    def get_cache_scopes(self):
+        return None
+
+    async def aget_cache_scopes(self):
+        return await sync_to_async(self.get_cache_scopes)()
+
+    def get_snapshot_timeout(self):
+        """Seconds to keep the response just rendered, if it may lag
+        behind the current versions; None if it can't
+        """
+        return None
+
+    def make_etag(self, request, scopes, versions) -> str:
+        parts = [
+            str(request.user.id),
+            request.accepted_media_type,
+            request.get_full_path(),
+            *scopes,
+            *versions,
+        ]
+        digest = hashlib.sha256("\n".join(parts).encode()).hexdigest()
+        return f'"{digest[:32]}"'
+
+    def get_etag(self, request, scopes) -> str:
+        return self.make_etag(request, scopes, get_versions(scopes))
+
+    def not_modified(self, request, etag: str) -> bool:
+        if_none_match = request.headers.get("If-None-Match", "")
+        return etag in [tag.strip() for tag in if_none_match.split(",")]
+
+    def make_entry(self, etag: str, data):
+        """Cache entry of a rendered response: (served ETag, data), and
+        how long to keep it
+        """
+        timeout = self.get_snapshot_timeout()
+        if timeout is None:
+            return (etag, data), settings.RESPONSE_CACHE_TIMEOUT
+        # A snapshot is validated by an ETag of its own, which clients
+        # can't reuse once the snapshot has expired.
+        return (f'{etag[:-1]}-{_new_version()}"', data), timeout
+
+    def entry_response(self, request, entry) -> Response:
+        served_etag, data = entry
+        if self.not_modified(request, served_etag):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(data)
+        response["ETag"] = served_etag
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        scopes = self.get_cache_scopes()
+        if scopes is None:
+            return handler(request, *args, **kwargs)
+
+        etag = self.get_etag(request, scopes)
+        if self.not_modified(request, etag):
+            return self.entry_response(request, (etag, None))
+        entry = cache.get(RESPONSE_KEY.format(etag))
+        if entry is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            entry, timeout = self.make_entry(etag, response.data)
+            cache.set(RESPONSE_KEY.format(etag), entry, timeout)
+        return self.entry_response(request, entry)
+
+    async def acached_response(self, handler, request, *args, **kwargs):
+        """`cached_response` for the async read path; `handler` is awaited"""
+        scopes = await self.aget_cache_scopes()
+        if scopes is None:
+            return await handler(request, *args, **kwargs)
+
+        etag = self.make_etag(request, scopes, await aget_versions(scopes))
+        if self.not_modified(request, etag):
+            return self.entry_response(request, (etag, None))
+        entry = await cache.aget(RESPONSE_KEY.format(etag))
+        if entry is None:
+            response = await handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            entry, timeout = self.make_entry(etag, response.data)
+            await cache.aset(RESPONSE_KEY.format(etag), entry, timeout)
+        return self.entry_response(request, entry)
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    # Only cache hits and 304s stay in the event loop. A miss runs the
+    # DRF handler, its querysets and serializers in a thread: the sharded
+    # and prefetching querysets have no async form.
+    async def alist(self, request, *args, **kwargs):
+        return await self.acached_response(
+            sync_to_async(super().list), request, *args, **kwargs
+        )
+
+    async def aretrieve(self, request, *args, **kwargs):
+        return await self.acached_response(
+            sync_to_async(super().retrieve), request, *args, **kwargs
+        )
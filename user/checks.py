@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.checks import Error, register
+
+# Backends keeping entries in the memory of a single process.
+PER_PROCESS_CACHES = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+@register("caches")
+def check_shared_caches(app_configs, **kwargs) -> list[Error]:
+    """
+    Cache versions, follow graph sets, revoked tokens and throttle
+    counters are written by one worker and trusted by all the others
+    """
+    return [
+        Error(
+            f"The {alias!r} cache keeps entries in a single process.",
+            hint="Set REDIS_URL, or use a cache shared by every worker.",
+            id="user.E001",
+        )
+        for alias in ("default", "throttle")
+        if settings.CACHES.get(alias, {}).get("BACKEND") in PER_PROCESS_CACHES
+    ]
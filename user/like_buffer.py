@@ -0,0 +1,262 @@
+"""
+Write-behind buffer for like/unlike events.
+
+With LIKE_BUFFER_ENABLED, like actions only record the caller's latest
+state per post in a fast store outside the main database; the periodic
+`flush_like_buffer` task coalesces them into bulk upserts. Redis is used
+when REDIS_URL is set, otherwise a separate SQLite file, so buffered
+writes never wait on the main database's writer lock.
+
+States stay pending while a flush applies them: `drain` only leases
+them, and `ack` drops them once applied, unless they changed meanwhile.
+"""
+import sqlite3
+import time
+from contextlib import closing
+from functools import lru_cache
+
+from django.conf import settings
+
+# Leased states not acknowledged within this many seconds, by a flush
+# that died, are drained again.
+LEASE_SECONDS = 300
+
+
+class SQLiteLikeBuffer:
+    def __init__(self, path) -> None:
+        self.path = str(path)
+
+    def connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(
+            self.path, timeout=10, isolation_level=None
+        )
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS pending_like (
+                user_id INTEGER NOT NULL,
+                post_id INTEGER NOT NULL,
+                is_liked INTEGER NOT NULL,
+                PRIMARY KEY (user_id, post_id)
+            )
+            """
+        )
+        if connection.execute("PRAGMA user_version").fetchone()[0] < 1:
+            connection.execute("BEGIN IMMEDIATE")
+            # Re-checked under the write lock; another process may have
+            # upgraded the file meanwhile.
+            if connection.execute("PRAGMA user_version").fetchone()[0] < 1:
+                connection.execute(
+                    "ALTER TABLE pending_like ADD COLUMN leased_at REAL"
+                )
+                connection.execute("PRAGMA user_version = 1")
+            connection.execute("COMMIT")
+        return connection
+
+    def put(self, user_id: int, states: dict[int, bool]) -> None:
+        with closing(self.connect()) as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.executemany(
+                """
+                INSERT INTO pending_like (user_id, post_id, is_liked)
+                VALUES (?, ?, ?)
+                ON CONFLICT (user_id, post_id)
+                DO UPDATE SET is_liked = excluded.is_liked, leased_at = NULL
+                """,
+                [
+                    (user_id, post_id, int(is_liked))
+                    for post_id, is_liked in states.items()
+                ],
+            )
+            connection.execute("COMMIT")
+
+    def toggle(self, user_id: int, post_id: int, stored) -> bool:
+        """Flip the pending state of a like and return the new one.
+
+        `stored()` gives the state in the database when none is pending.
+        """
+        with closing(self.connect()) as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            row = connection.execute(
+                """
+                SELECT is_liked FROM pending_like
+                WHERE user_id = ? AND post_id = ?
+                """,
+                [user_id, post_id],
+            ).fetchone()
+            is_liked = not (stored() if row is None else row[0])
+            connection.execute(
+                """
+                INSERT INTO pending_like (user_id, post_id, is_liked)
+                VALUES (?, ?, ?)
+                ON CONFLICT (user_id, post_id)
+                DO UPDATE SET is_liked = excluded.is_liked, leased_at = NULL
+                """,
+                [user_id, post_id, int(is_liked)],
+            )
+            connection.execute("COMMIT")
+        return is_liked
+
+    def pending(self, user_id: int) -> dict[int, bool]:
+        with closing(self.connect()) as connection:
+            rows = connection.execute(
+                "SELECT post_id, is_liked FROM pending_like WHERE user_id = ?",
+                [user_id],
+            )
+            return {post_id: bool(is_liked) for post_id, is_liked in rows}
+
+    def drain(self, limit: int) -> dict[int, dict[int, bool]]:
+        """Lease and return up to `limit` pending states, by user"""
+        now = time.time()
+        with closing(self.connect()) as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            rows = connection.execute(
+                """
+                SELECT rowid, user_id, post_id, is_liked FROM pending_like
+                WHERE leased_at IS NULL OR leased_at < ?
+                ORDER BY rowid LIMIT ?
+                """,
+                [now - LEASE_SECONDS, limit],
+            ).fetchall()
+            connection.executemany(
+                "UPDATE pending_like SET leased_at = ? WHERE rowid = ?",
+                [(now, row[0]) for row in rows],
+            )
+            connection.execute("COMMIT")
+
+        states = {}
+        for _, user_id, post_id, is_liked in rows:
+            states.setdefault(user_id, {})[post_id] = bool(is_liked)
+        return states
+
+    def _settle(self, statement: str, pending) -> None:
+        with closing(self.connect()) as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.executemany(
+                statement,
+                [
+                    (user_id, post_id, int(is_liked))
+                    for user_id, states in pending.items()
+                    for post_id, is_liked in states.items()
+                ],
+            )
+            connection.execute("COMMIT")
+
+    def ack(self, pending: dict[int, dict[int, bool]]) -> None:
+        """Drop drained states once applied, unless changed since"""
+        self._settle(
+            """
+            DELETE FROM pending_like
+            WHERE user_id = ? AND post_id = ? AND is_liked = ?
+            AND leased_at IS NOT NULL
+            """,
+            pending,
+        )
+
+    def release(self, pending: dict[int, dict[int, bool]]) -> None:
+        """Hand drained states that could not be applied to the next flush"""
+        self._settle(
+            """
+            UPDATE pending_like SET leased_at = NULL
+            WHERE user_id = ? AND post_id = ? AND is_liked = ?
+            """,
+            pending,
+        )
+
+
+class RedisLikeBuffer:
+    USERS_KEY = "like-buffer:users"
+    STATES_KEY = "like-buffer:{}"
+    # KEYS: states, users; ARGV: user id, then post id and state pairs.
+    # Drops the states that are unchanged and requeues the user if any
+    # are left.
+    ACK_SCRIPT = """
+        for i = 2, #ARGV, 2 do
+            if redis.call("HGET", KEYS[1], ARGV[i]) == ARGV[i + 1] then
+                redis.call("HDEL", KEYS[1], ARGV[i])
+            end
+        end
+        if redis.call("HLEN", KEYS[1]) > 0 then
+            redis.call("SADD", KEYS[2], ARGV[1])
+        end
+    """
+
+    def __init__(self, url: str) -> None:
+        self.client = _redis_client(url)
+
+    def put(self, user_id: int, states: dict[int, bool]) -> None:
+        pipeline = self.client.pipeline()
+        pipeline.hset(
+            self.STATES_KEY.format(user_id),
+            mapping={
+                post_id: int(is_liked) for post_id, is_liked in states.items()
+            },
+        )
+        pipeline.sadd(self.USERS_KEY, user_id)
+        pipeline.execute()
+
+    def toggle(self, user_id: int, post_id: int, stored) -> bool:
+        """Flip the pending state of a like and return the new one.
+
+        `stored()` gives the state in the database when none is pending.
+        """
+        key = self.STATES_KEY.format(user_id)
+
+        def flip(pipeline) -> bool:
+            state = pipeline.hget(key, post_id)
+            is_liked = not (stored() if state is None else state == b"1")
+            pipeline.multi()
+            pipeline.hset(key, post_id, int(is_liked))
+            pipeline.sadd(self.USERS_KEY, user_id)
+            return is_liked
+
+        # Retried whenever the user's states change in the meantime.
+        return self.client.transaction(flip, key, value_from_callable=True)
+
+    def pending(self, user_id: int) -> dict[int, bool]:
+        states = self.client.hgetall(self.STATES_KEY.format(user_id))
+        return {
+            int(post_id): is_liked == b"1"
+            for post_id, is_liked in states.items()
+        }
+
+    def drain(self, limit: int) -> dict[int, dict[int, bool]]:
+        """Return pending states of up to `limit` users, taking the users
+        off the queue until their states are acknowledged or released
+        """
+        return {
+            int(user_id): self.pending(int(user_id))
+            for user_id in self.client.spop(self.USERS_KEY, limit) or []
+        }
+
+    def ack(self, pending: dict[int, dict[int, bool]]) -> None:
+        """Drop drained states once applied, unless changed since"""
+        ack = self.client.register_script(self.ACK_SCRIPT)
+        for user_id, states in pending.items():
+            pairs = [
+                value
+                for post_id, is_liked in states.items()
+                for value in (post_id, int(is_liked))
+            ]
+            ack(
+                keys=[self.STATES_KEY.format(user_id), self.USERS_KEY],
+                args=[user_id, *pairs],
+            )
+
+    def release(self, pending: dict[int, dict[int, bool]]) -> None:
+        """Hand drained states that could not be applied to the next flush"""
+        if pending:
+            self.client.sadd(self.USERS_KEY, *pending)
+
+
+@lru_cache
+def _redis_client(url: str):
+    import redis
+
+    return redis.Redis.from_url(url)
+
+
+def get_buffer():
+    if settings.REDIS_URL:
+        return RedisLikeBuffer(settings.REDIS_URL)
+    return SQLiteLikeBuffer(settings.LIKE_BUFFER_PATH)
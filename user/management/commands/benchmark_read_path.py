@@ -0,0 +1,169 @@
+import asyncio
+import statistics
+import time
+from pathlib import Path
+
+import aiohttp
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import AccessToken
+
+MEMORY_SAMPLE_INTERVAL = 0.2
+
+
+def process_tree(pid: int) -> list[int]:
+    pids = [pid]
+    for children in Path(f"/proc/{pid}/task").glob("*/children"):
+        for child in children.read_text().split():
+            pids.extend(process_tree(int(child)))
+    return pids
+
+
+def rss_bytes(pid: int) -> int:
+    """Resident memory of a server process and all of its workers"""
+    total = 0
+    for tree_pid in process_tree(pid):
+        try:
+            status = Path(f"/proc/{tree_pid}/status").read_text()
+        except FileNotFoundError:
+            continue
+        for line in status.splitlines():
+            if line.startswith("VmRSS:"):
+                total += int(line.split()[1]) * 1024
+    return total
+
+
+def parse_pairs(values: list[str], option: str) -> dict[str, str]:
+    pairs = {}
+    for value in values:
+        name, sep, rest = value.partition("=")
+        if not sep:
+            raise CommandError(f"{option} expects name=value, got {value!r}")
+        pairs[name] = rest
+    return pairs
+
+
+async def run_load(url, headers, concurrency: int, total: int) -> dict:
+    latencies = []
+    errors = 0
+    remaining = iter(range(total))
+
+    async def worker(session) -> None:
+        nonlocal errors
+        for _ in remaining:
+            started = time.perf_counter()
+            try:
+                async with session.get(url, headers=headers) as response:
+                    await response.read()
+                    if response.status != 200:
+                        errors += 1
+            except aiohttp.ClientError:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    quantiles = statistics.quantiles(latencies, n=100)
+    return {
+        "rps": total / elapsed,
+        "errors": errors,
+        "p50": quantiles[49] * 1000,
+        "p99": quantiles[98] * 1000,
+    }
+
+
+async def sample_memory(pid: int, peak: list[int]) -> None:
+    while True:
+        peak[0] = max(peak[0], rss_bytes(pid))
+        await asyncio.sleep(MEMORY_SAMPLE_INTERVAL)
+
+
+async def benchmark(url, headers, pid, concurrency: int, total: int):
+    peak = [0]
+    sampler = None
+    if pid is not None:
+        sampler = asyncio.create_task(sample_memory(pid, peak))
+    try:
+        result = await run_load(url, headers, concurrency, total)
+    finally:
+        if sampler is not None:
+            sampler.cancel()
+    result["peak_rss"] = peak[0] / (1024 * 1024) if pid else None
+    return result
+
+
+class Command(BaseCommand):
+    help = (
+        "Load running WSGI and ASGI servers with concurrent reads and "
+        "compare requests per second and worker memory"
+    )
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument(
+            "--target",
+            action="append",
+            required=True,
+            help="name=base URL of a running server, e.g. "
+            "asgi=http://127.0.0.1:8001",
+        )
+        parser.add_argument(
+            "--pid",
+            action="append",
+            default=[],
+            help="name=pid of the server's master process, to sample the "
+            "resident memory of it and its workers",
+        )
+        parser.add_argument("--path", default="/api/user/posts/")
+        parser.add_argument(
+            "--email", required=True, help="User to authenticate as"
+        )
+        parser.add_argument("--concurrency", type=int, default=200)
+        parser.add_argument("--requests", type=int, default=5000)
+        parser.add_argument("--warmup", type=int, default=200)
+
+    def handle(self, *args, **options) -> None:
+        targets = parse_pairs(options["target"], "--target")
+        pids = {
+            name: int(pid)
+            for name, pid in parse_pairs(options["pid"], "--pid").items()
+        }
+        try:
+            user = get_user_model().objects.get(email=options["email"])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"No user with email {options['email']}")
+        headers = {"Authorization": f"Bearer {AccessToken.for_user(user)}"}
+
+        self.stdout.write(
+            f"{'target':<10}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}"
+            f"{'errors':>8}{'peak RSS MB':>13}"
+        )
+        for name, base_url in targets.items():
+            url = base_url.rstrip("/") + options["path"]
+            if options["warmup"]:
+                asyncio.run(
+                    run_load(
+                        url,
+                        headers,
+                        options["concurrency"],
+                        options["warmup"],
+                    )
+                )
+            result = asyncio.run(
+                benchmark(
+                    url,
+                    headers,
+                    pids.get(name),
+                    options["concurrency"],
+                    options["requests"],
+                )
+            )
+            peak_rss = result["peak_rss"]
+            self.stdout.write(
+                f"{name:<10}{result['rps']:>10.1f}{result['p50']:>10.1f}"
+                f"{result['p99']:>10.1f}{result['errors']:>8}"
+                f"{'-' if peak_rss is None else f'{peak_rss:.1f}':>13}"
+            )
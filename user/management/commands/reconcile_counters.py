@@ -0,0 +1,79 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from user.models import Comment, Like, Post
+
+
+def count_of(model, field: str, **filters) -> Coalesce:
+    """Correlated `COUNT(*)` of `model` rows pointing at the outer row"""
+    rows = model.objects.filter(**{field: OuterRef("pk")}, **filters)
+    rows = rows.order_by().values(field).annotate(total=Count("pk"))
+    return Coalesce(Subquery(rows.values("total")), 0)
+
+
+def reconcile(model, counters: dict, batch_size: int, using=None) -> int:
+    """Rewrite drifted counters in primary key order, batch by batch"""
+    objects = model.objects.db_manager(using)
+    drift = Q()
+    for field in counters:
+        drift |= ~Q(**{field: F(f"actual_{field}")})
+    actual = {f"actual_{field}": value for field, value in counters.items()}
+
+    repaired = 0
+    last_pk = 0
+    while True:
+        batch = list(
+            objects.filter(pk__gt=last_pk)
+            .order_by("pk")
+            .values_list("pk", flat=True)[:batch_size]
+        )
+        if not batch:
+            return repaired
+        last_pk = batch[-1]
+
+        drifted = list(
+            objects.filter(pk__in=batch)
+            .annotate(**actual)
+            .filter(drift)
+            .values_list("pk", flat=True)
+        )
+        if drifted:
+            repaired += objects.filter(pk__in=drifted).update(
+                **counters
+            )
+
+
+class Command(BaseCommand):
+    help = "Recompute denormalized counters and repair any drift"
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options) -> None:
+        # Likes and comments sit on the shard of their post.
+        posts = sum(
+            reconcile(
+                Post,
+                {
+                    "likes_count": count_of(Like, "post", is_liked=True),
+                    "comments_count": count_of(Comment, "post"),
+                },
+                options["batch_size"],
+                using=shard.db,
+            )
+            for shard in Post.objects.all().per_shard()
+        )
+        follow = get_user_model().user_follow.through
+        users = reconcile(
+            get_user_model(),
+            {
+                "followers_count": count_of(follow, "to_user"),
+                "following_count": count_of(follow, "from_user"),
+            },
+            options["batch_size"],
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f"Repaired {posts} posts, {users} users")
+        )
@@ -0,0 +1,109 @@
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+
+from user.models import Post, ShardBucket
+from user.sharding import (
+    SHARD_MAP_KEY,
+    default_shard,
+    get_shard_map,
+    group_by_shard,
+    move_posts,
+)
+
+
+def plan_buckets(current: dict, aliases: list, bucket_count: int) -> dict:
+    """Spread buckets evenly over `aliases`, moving as few as possible"""
+    quota = -(-bucket_count // len(aliases))
+    load = Counter()
+    plan = {}
+    unplaced = []
+    for bucket in range(bucket_count):
+        alias = current.get(bucket)
+        if alias in aliases and load[alias] < quota:
+            plan[bucket] = alias
+            load[alias] += 1
+        else:
+            unplaced.append(bucket)
+    for bucket in unplaced:
+        alias = min(aliases, key=lambda alias: load[alias])
+        plan[bucket] = alias
+        load[alias] += 1
+    return plan
+
+
+class Command(BaseCommand):
+    help = (
+        "Assign author buckets to DATABASE_SHARDS and move posts, with "
+        "their comments and likes, to the shard of their author. Restart "
+        "the web and Celery workers afterwards, so none keeps writing "
+        "with the old bucket map."
+    )
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options) -> None:
+        shards = settings.DATABASE_SHARDS
+        if not shards:
+            raise CommandError("DATABASE_SHARDS is empty.")
+
+        # Buckets keep the shard they are read from now where they can.
+        current = get_shard_map()
+        current = {
+            bucket: current.get(bucket) or default_shard(bucket)
+            for bucket in range(settings.SHARD_BUCKETS)
+        }
+        plan = plan_buckets(current, shards, settings.SHARD_BUCKETS)
+        ShardBucket.objects.using("default").bulk_create(
+            [
+                ShardBucket(bucket=bucket, alias=alias)
+                for bucket, alias in plan.items()
+            ],
+            update_conflicts=True,
+            unique_fields=["bucket"],
+            update_fields=["alias"],
+        )
+        cache.delete(SHARD_MAP_KEY)
+        moved_buckets = sum(
+            current[bucket] != alias for bucket, alias in plan.items()
+        )
+        self.stdout.write(f"Reassigned {moved_buckets} buckets")
+
+        # New writes follow the new map already; rows are then moved from
+        # wherever they are, "default" included when sharding starts.
+        batch_size = options["batch_size"]
+        moved = Counter()
+        for source in ["default", *shards]:
+            last_pk = 0
+            while True:
+                posts = list(
+                    Post.objects.using(source)
+                    .filter(pk__gt=last_pk)
+                    .order_by("pk")[:batch_size]
+                )
+                if not posts:
+                    break
+                last_pk = posts[-1].pk
+
+                author_ids = {post.user_id for post in posts}
+                for target, user_ids in group_by_shard(author_ids).items():
+                    if target == source:
+                        continue
+                    user_ids = set(user_ids)
+                    misplaced = [
+                        post for post in posts if post.user_id in user_ids
+                    ]
+                    move_posts(misplaced, source, target)
+                    moved[source, target] += len(misplaced)
+
+        for (source, target), count in sorted(moved.items()):
+            self.stdout.write(f"Moved {count} posts from {source} to {target}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Resharded {sum(moved.values())} posts over "
+                f"{len(shards)} shards"
+            )
+        )
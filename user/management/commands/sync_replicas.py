@@ -0,0 +1,32 @@
+import sqlite3
+from contextlib import closing
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the primary SQLite database into the SQLite files standing "
+        "in for read replicas"
+    )
+
+    def handle(self, *args, **options) -> None:
+        primary = connections["default"]
+        aliases = [primary.alias, *settings.DATABASE_REPLICAS]
+        if any(connections[alias].vendor != "sqlite" for alias in aliases):
+            raise CommandError("Only SQLite stand-in replicas can be synced.")
+
+        primary.ensure_connection()
+        for alias in settings.DATABASE_REPLICAS:
+            name = str(connections[alias].settings_dict["NAME"])
+            with closing(sqlite3.connect(name)) as replica:
+                primary.connection.backup(replica)
+            self.stdout.write(f"Copied {primary.alias} to {alias} ({name})")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Synced {len(settings.DATABASE_REPLICAS)} replicas"
+            )
+        )
@@ -0,0 +1,88 @@
+# Generated by Django 4.2.3 on 2026-10-17 07:14
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+BATCH_SIZE = 1000
+
+
+def fill_timelines(apps, schema_editor) -> None:
+    db_alias = schema_editor.connection.alias
+    Post = apps.get_model("user", "Post")
+    TimelineEntry = apps.get_model("user", "TimelineEntry")
+    Follow = apps.get_model("user", "User").user_follow.through
+
+    followers = {}
+    follows = Follow.objects.using(db_alias)
+    for follower_id, followed_id in follows.values_list(
+        "from_user_id", "to_user_id"
+    ):
+        followers.setdefault(followed_id, []).append(follower_id)
+
+    entries = []
+    posts = Post.objects.using(db_alias).values_list(
+        "id", "user_id", "created_at"
+    )
+    for post_id, user_id, created_at in posts.iterator():
+        for owner_id in [user_id, *followers.get(user_id, [])]:
+            entries.append(
+                TimelineEntry(
+                    owner_id=owner_id, post_id=post_id, created_at=created_at
+                )
+            )
+        if len(entries) >= BATCH_SIZE:
+            TimelineEntry.objects.using(db_alias).bulk_create(entries)
+            entries = []
+    TimelineEntry.objects.using(db_alias).bulk_create(entries)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("user", "0008_alter_user_image"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TimelineEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created_at", models.DateTimeField()),
+                (
+                    "owner",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="timeline",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "post",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="timeline_entries",
+                        to="user.post",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-created_at"],
+                "indexes": [
+                    models.Index(
+                        fields=["owner", "-created_at"],
+                        name="timeline_owner_created_idx",
+                    )
+                ],
+                "unique_together": {("owner", "post")},
+            },
+        ),
+        migrations.RunPython(fill_timelines, migrations.RunPython.noop),
+    ]
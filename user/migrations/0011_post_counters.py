@@ -0,0 +1,41 @@
+# Generated by Django 4.2.3 on 2026-10-17 07:17
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_subquery(model, **filters):
+    rows = model.objects.filter(post=OuterRef("pk"), **filters).order_by()
+    return Coalesce(
+        Subquery(rows.values("post").annotate(total=Count("pk")).values("total")),
+        0,
+    )
+
+
+def fill_counters(apps, schema_editor) -> None:
+    Post = apps.get_model("user", "Post")
+    Post.objects.using(schema_editor.connection.alias).update(
+        likes_count=count_subquery(apps.get_model("user", "Like"), is_liked=True),
+        comments_count=count_subquery(apps.get_model("user", "Comment")),
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("user", "0010_post_user_keyset_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="comments_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="post",
+            name="likes_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.3 on 2026-10-17 07:18
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor) -> None:
+    User = apps.get_model("user", "User")
+    Follow = User.user_follow.through
+
+    def count_follows(field):
+        follows = Follow.objects.filter(**{field: OuterRef("pk")}).order_by()
+        follows = follows.values(field).annotate(total=Count("pk"))
+        return Coalesce(Subquery(follows.values("total")), 0)
+
+    User.objects.using(schema_editor.connection.alias).update(
+        followers_count=count_follows("to_user"),
+        following_count=count_follows("from_user"),
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("user", "0011_post_counters"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="followers_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="user",
+            name="following_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,92 @@
+# Generated by Django 4.2.3 on 2026-10-17 07:19
+
+import re
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+BATCH_SIZE = 1000
+
+# Frozen copy of user.models.extract_hashtags as of this migration.
+HASHTAG_MAX_LENGTH = 60
+HASHTAG_IN_TEXT = re.compile(r"#(\w+)")
+HASHTAG_WORD = re.compile(r"\w+")
+
+
+def extract_hashtags(hashtag: str, text: str) -> set[str]:
+    names = HASHTAG_WORD.findall(hashtag or "")
+    names += HASHTAG_IN_TEXT.findall(text or "")
+    return {name.lower()[:HASHTAG_MAX_LENGTH] for name in names}
+
+
+def index_hashtags(apps, schema_editor) -> None:
+    db_alias = schema_editor.connection.alias
+    Post = apps.get_model("user", "Post")
+    Hashtag = apps.get_model("user", "Hashtag")
+    PostTag = Post.tags.through
+
+    post_tags = {
+        post_id: extract_hashtags(hashtag, text)
+        for post_id, hashtag, text in Post.objects.using(db_alias)
+        .values_list("id", "hashtag", "text")
+        .iterator()
+    }
+    names = set().union(*post_tags.values())
+    Hashtag.objects.using(db_alias).bulk_create(
+        [Hashtag(name=name) for name in names], batch_size=BATCH_SIZE
+    )
+    tag_ids = dict(Hashtag.objects.using(db_alias).values_list("name", "id"))
+    PostTag.objects.using(db_alias).bulk_create(
+        [
+            PostTag(post_id=post_id, hashtag_id=tag_ids[name])
+            for post_id, tags in post_tags.items()
+            for name in tags
+        ],
+        batch_size=BATCH_SIZE,
+    )
+
+    counts = PostTag.objects.filter(hashtag=OuterRef("pk")).order_by()
+    counts = counts.values("hashtag").annotate(total=Count("pk"))
+    Hashtag.objects.using(db_alias).update(posts_count=Coalesce(Subquery(counts.values("total")), 0))
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("user", "0012_user_follow_counters"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Hashtag",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=60, unique=True)),
+                ("posts_count", models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                "ordering": ["-posts_count", "id"],
+                "indexes": [
+                    models.Index(
+                        fields=["-posts_count", "id"], name="hashtag_popularity_idx"
+                    )
+                ],
+            },
+        ),
+        migrations.AddField(
+            model_name="post",
+            name="tags",
+            field=models.ManyToManyField(
+                blank=True, related_name="posts", to="user.hashtag"
+            ),
+        ),
+        migrations.RunPython(index_hashtags, migrations.RunPython.noop),
+    ]
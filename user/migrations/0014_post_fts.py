@@ -0,0 +1,74 @@
+from django.db import migrations
+
+# The search index SQL as this migration shipped it, frozen so later
+# changes to user.search don't rewrite history.
+POST_FTS_TABLE = "user_post_fts"
+
+POST_FTS_TRIGGERS = (
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {POST_FTS_TABLE}_ai
+    AFTER INSERT ON user_post BEGIN
+        INSERT INTO {POST_FTS_TABLE} (rowid, text, hashtag)
+        VALUES (new.id, new.text, new.hashtag);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {POST_FTS_TABLE}_ad
+    AFTER DELETE ON user_post BEGIN
+        INSERT INTO {POST_FTS_TABLE} ({POST_FTS_TABLE}, rowid, text, hashtag)
+        VALUES ('delete', old.id, old.text, old.hashtag);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {POST_FTS_TABLE}_au
+    AFTER UPDATE OF text, hashtag ON user_post BEGIN
+        INSERT INTO {POST_FTS_TABLE} ({POST_FTS_TABLE}, rowid, text, hashtag)
+        VALUES ('delete', old.id, old.text, old.hashtag);
+        INSERT INTO {POST_FTS_TABLE} (rowid, text, hashtag)
+        VALUES (new.id, new.text, new.hashtag);
+    END
+    """,
+)
+
+POST_FTS_CREATE = (
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {POST_FTS_TABLE} USING fts5(
+        text,
+        hashtag,
+        content='user_post',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    *POST_FTS_TRIGGERS,
+    f"INSERT INTO {POST_FTS_TABLE} ({POST_FTS_TABLE}) VALUES ('rebuild')",
+)
+
+POST_FTS_DROP = (
+    f"DROP TRIGGER IF EXISTS {POST_FTS_TABLE}_ai",
+    f"DROP TRIGGER IF EXISTS {POST_FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {POST_FTS_TABLE}_au",
+    f"DROP TABLE IF EXISTS {POST_FTS_TABLE}",
+)
+
+
+def create_post_fts(apps, schema_editor) -> None:
+    if schema_editor.connection.vendor == "sqlite":
+        for statement in POST_FTS_CREATE:
+            schema_editor.execute(statement)
+
+
+def drop_post_fts(apps, schema_editor) -> None:
+    if schema_editor.connection.vendor == "sqlite":
+        for statement in POST_FTS_DROP:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("user", "0013_hashtag"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_post_fts, drop_post_fts),
+    ]
@@ -0,0 +1,56 @@
+from django.db import migrations
+
+# The user search index SQL as of this migration, frozen so later
+# changes to user.search don't rewrite history.
+USER_FTS_COLUMNS = "username, first_name, last_name"
+USER_FTS_INSERT = (
+    f"INSERT INTO user_user_fts (rowid, {USER_FTS_COLUMNS}) "
+    "VALUES (new.id, new.username, new.first_name, new.last_name);"
+)
+USER_FTS_DELETE = (
+    f"INSERT INTO user_user_fts (user_user_fts, rowid, {USER_FTS_COLUMNS}) "
+    "VALUES ('delete', old.id, old.username, old.first_name, old.last_name);"
+)
+
+USER_FTS_CREATE = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS user_user_fts USING fts5("
+    f"{USER_FTS_COLUMNS}, content='user_user', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    "CREATE TRIGGER IF NOT EXISTS user_user_fts_ai AFTER INSERT ON user_user "
+    f"BEGIN {USER_FTS_INSERT} END",
+    "CREATE TRIGGER IF NOT EXISTS user_user_fts_ad AFTER DELETE ON user_user "
+    f"BEGIN {USER_FTS_DELETE} END",
+    "CREATE TRIGGER IF NOT EXISTS user_user_fts_au "
+    f"AFTER UPDATE OF {USER_FTS_COLUMNS} ON user_user "
+    f"BEGIN {USER_FTS_DELETE} {USER_FTS_INSERT} END",
+    "INSERT INTO user_user_fts (user_user_fts) VALUES ('rebuild')",
+)
+
+USER_FTS_DROP = (
+    "DROP TRIGGER IF EXISTS user_user_fts_ai",
+    "DROP TRIGGER IF EXISTS user_user_fts_ad",
+    "DROP TRIGGER IF EXISTS user_user_fts_au",
+    "DROP TABLE IF EXISTS user_user_fts",
+)
+
+
+def create_user_fts(apps, schema_editor) -> None:
+    if schema_editor.connection.vendor == "sqlite":
+        for statement in USER_FTS_CREATE:
+            schema_editor.execute(statement)
+
+
+def drop_user_fts(apps, schema_editor) -> None:
+    if schema_editor.connection.vendor == "sqlite":
+        for statement in USER_FTS_DROP:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("user", "0014_post_fts"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_user_fts, drop_user_fts),
+    ]
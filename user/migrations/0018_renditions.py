@@ -0,0 +1,22 @@
+# Generated by Django 4.2.3 on 2026-10-17 07:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("user", "0017_follow"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="renditions",
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="user",
+            name="renditions",
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+    ]
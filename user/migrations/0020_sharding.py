@@ -0,0 +1,143 @@
+# Generated by Django 4.2.3 on 2026-10-17 08:29
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# The post search index SQL as of this migration, frozen so later
+# changes to user.search don't rewrite history.
+POST_FTS_COLUMNS = "text, hashtag"
+POST_FTS_INSERT = (
+    f"INSERT INTO user_post_fts (rowid, {POST_FTS_COLUMNS}) "
+    "VALUES (new.id, new.text, new.hashtag);"
+)
+POST_FTS_DELETE = (
+    f"INSERT INTO user_post_fts (user_post_fts, rowid, {POST_FTS_COLUMNS}) "
+    "VALUES ('delete', old.id, old.text, old.hashtag);"
+)
+POST_FTS_CREATE = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS user_post_fts "
+    f"USING fts5({POST_FTS_COLUMNS}, content='user_post', "
+    "content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS user_post_fts_ai AFTER INSERT ON user_post "
+    f"BEGIN {POST_FTS_INSERT} END",
+    "CREATE TRIGGER IF NOT EXISTS user_post_fts_ad AFTER DELETE ON user_post "
+    f"BEGIN {POST_FTS_DELETE} END",
+    "CREATE TRIGGER IF NOT EXISTS user_post_fts_au "
+    f"AFTER UPDATE OF {POST_FTS_COLUMNS} ON user_post "
+    f"BEGIN {POST_FTS_DELETE} {POST_FTS_INSERT} END",
+    "INSERT INTO user_post_fts (user_post_fts) VALUES ('rebuild')",
+)
+
+
+def is_partition(alias) -> bool:
+    """Whether `alias` holds shards or archived posts, but no users"""
+    return (
+        alias in settings.DATABASE_SHARDS
+        or alias == settings.POST_ARCHIVE_DATABASE
+    )
+
+
+class AlterPartitionField(migrations.AlterField):
+    """Alter the field in the schema of shards and the archive only.
+
+    Their rows can't point at users on another database with a foreign
+    key constraint; "default" keeps its constraints.
+    """
+
+    def database_forwards(self, app_label, schema_editor, *args) -> None:
+        if is_partition(schema_editor.connection.alias):
+            super().database_forwards(app_label, schema_editor, *args)
+
+    def database_backwards(self, app_label, schema_editor, *args) -> None:
+        if is_partition(schema_editor.connection.alias):
+            super().database_backwards(app_label, schema_editor, *args)
+
+
+def create_post_fts(apps, schema_editor) -> None:
+    # Safe to rerun after SQLite rebuilds user_post without its triggers.
+    connection = schema_editor.connection
+    if connection.vendor == "sqlite" and is_partition(connection.alias):
+        for statement in POST_FTS_CREATE:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("user", "0019_upload"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ShardBucket",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("bucket", models.PositiveIntegerField(unique=True)),
+                ("alias", models.CharField(max_length=60)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="ShardSequence",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=100, unique=True)),
+                ("last_id", models.BigIntegerField(default=0)),
+            ],
+        ),
+        AlterPartitionField(
+            model_name="comment",
+            name="user",
+            field=models.ForeignKey(
+                db_constraint=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="comments",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        AlterPartitionField(
+            model_name="like",
+            name="user",
+            field=models.ForeignKey(
+                db_constraint=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="likes",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        AlterPartitionField(
+            model_name="post",
+            name="tags",
+            field=models.ManyToManyField(
+                blank=True, db_constraint=False, related_name="posts", to="user.hashtag"
+            ),
+        ),
+        # Rebuilding user_post drops the triggers of its search index.
+        migrations.RunPython(migrations.RunPython.noop, create_post_fts),
+        AlterPartitionField(
+            model_name="post",
+            name="user",
+            field=models.ForeignKey(
+                db_constraint=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="posts",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.RunPython(create_post_fts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,124 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# The post search triggers as of this migration, frozen so later changes
+# to user.search don't rewrite history.
+POST_FTS_COLUMNS = "text, hashtag"
+POST_FTS_INSERT = (
+    f"INSERT INTO user_post_fts (rowid, {POST_FTS_COLUMNS}) "
+    "VALUES (new.id, new.text, new.hashtag);"
+)
+POST_FTS_DELETE = (
+    f"INSERT INTO user_post_fts (user_post_fts, rowid, {POST_FTS_COLUMNS}) "
+    "VALUES ('delete', old.id, old.text, old.hashtag);"
+)
+POST_FTS_TRIGGERS = (
+    "CREATE TRIGGER IF NOT EXISTS user_post_fts_ai AFTER INSERT ON user_post "
+    f"BEGIN {POST_FTS_INSERT} END",
+    "CREATE TRIGGER IF NOT EXISTS user_post_fts_ad AFTER DELETE ON user_post "
+    f"BEGIN {POST_FTS_DELETE} END",
+    "CREATE TRIGGER IF NOT EXISTS user_post_fts_au "
+    f"AFTER UPDATE OF {POST_FTS_COLUMNS} ON user_post "
+    f"BEGIN {POST_FTS_DELETE} {POST_FTS_INSERT} END",
+)
+
+
+def is_partition(alias) -> bool:
+    """Whether `alias` holds shards or archived posts, but no users"""
+    return (
+        alias in settings.DATABASE_SHARDS
+        or alias == settings.POST_ARCHIVE_DATABASE
+    )
+
+
+def has_foreign_key(schema_editor, table: str, column: str) -> bool:
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, table)
+    return any(
+        constraint["foreign_key"] and constraint["columns"] == [column]
+        for constraint in constraints.values()
+    )
+
+
+class RestorePrimaryForeignKey(migrations.AlterField):
+    """Put back a foreign key constraint 0020 used to drop everywhere.
+
+    Shards and the archive stay without it, and so do databases which
+    never lost it.
+    """
+
+    def database_forwards(
+        self, app_label, schema_editor, from_state, to_state
+    ) -> None:
+        if is_partition(schema_editor.connection.alias):
+            return
+        model = to_state.apps.get_model(app_label, self.model_name)
+        field = model._meta.get_field(self.name)
+        if field.many_to_many:
+            table = field.remote_field.through._meta.db_table
+            column = field.m2m_reverse_name()
+        else:
+            table, column = model._meta.db_table, field.column
+        if not has_foreign_key(schema_editor, table, column):
+            super().database_forwards(
+                app_label, schema_editor, from_state, to_state
+            )
+
+    def database_backwards(self, *args) -> None:
+        # The constraint holds on "default" either way.
+        pass
+
+
+def create_post_fts_triggers(apps, schema_editor) -> None:
+    # SQLite drops the triggers whenever it rebuilds user_post.
+    if schema_editor.connection.vendor == "sqlite":
+        for statement in POST_FTS_TRIGGERS:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("user", "0020_sharding"),
+    ]
+
+    operations = [
+        RestorePrimaryForeignKey(
+            model_name="comment",
+            name="user",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="comments",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        RestorePrimaryForeignKey(
+            model_name="like",
+            name="user",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="likes",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        RestorePrimaryForeignKey(
+            model_name="post",
+            name="tags",
+            field=models.ManyToManyField(
+                blank=True, related_name="posts", to="user.hashtag"
+            ),
+        ),
+        RestorePrimaryForeignKey(
+            model_name="post",
+            name="user",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="posts",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.RunPython(
+            create_post_fts_triggers, migrations.RunPython.noop
+        ),
+    ]
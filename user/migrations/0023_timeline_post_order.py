@@ -0,0 +1,23 @@
+# Generated by Django 4.2.3 on 2026-10-17 10:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("user", "0022_primary_foreign_keys"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="timelineentry",
+            name="timeline_owner_created_idx",
+        ),
+        migrations.AddIndex(
+            model_name="timelineentry",
+            index=models.Index(
+                fields=["owner", "-created_at", "-post"],
+                name="timeline_owner_created_idx",
+            ),
+        ),
+    ]
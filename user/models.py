@@ -1,13 +1,32 @@
 import os
+import re
 import uuid
 
 from django.conf import settings
 from django.contrib.auth.base_user import BaseUserManager
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import connections, models, router, transaction
+from django.db.models import (
+    Case,
+    Count,
+    F,
+    IntegerField,
+    OuterRef,
+    Subquery,
+    Value,
+    When,
+)
+from django.db.models.functions import Coalesce, Greatest
 from django.utils.text import slugify
 from django.utils.translation import gettext as _
 
+from user.sharding import (
+    ShardedManager,
+    ShardedQuerySet,
+    reserve_ids,
+    sharding_enabled,
+)
+
 
 class UserManager(BaseUserManager):
     """Define a model manager for User model with no username field."""
@@ -30,6 +49,39 @@ class UserManager(BaseUserManager):
         extra_fields.setdefault("is_superuser", False)
         return self._create_user(email, password, **extra_fields)
 
+    def _count_follows(self, field: str) -> Coalesce:
+        follows = self.model.user_follow.through.objects.filter(
+            **{field: OuterRef("pk")}
+        )
+        follows = follows.order_by().values(field).annotate(total=Count("pk"))
+        return Coalesce(Subquery(follows.values("total")), 0)
+
+    def with_follow_counts(self):
+        """Annotate exact follow counts, for admin and bulk contexts."""
+        return self.get_queryset().annotate(
+            live_followers_count=self._count_follows("to_user"),
+            live_following_count=self._count_follows("from_user"),
+        )
+
+    def update_follow_counts(
+        self, follower_ids, followed_ids, delta: int
+    ) -> None:
+        """Shift stored counters after followers (un)followed followed users.
+
+        One side is expected to hold a single id, as it does for every
+        follow, unfollow or batch of either.
+        """
+        self.filter(pk__in=follower_ids).update(
+            following_count=Greatest(
+                F("following_count") + delta * len(followed_ids), 0
+            )
+        )
+        self.filter(pk__in=followed_ids).update(
+            followers_count=Greatest(
+                F("followers_count") + delta * len(follower_ids), 0
+            )
+        )
+
     def create_superuser(self, email, password, **extra_fields):
         """Create and save a SuperUser with the given email and password."""
         extra_fields.setdefault("is_staff", True)
@@ -63,24 +115,95 @@ class User(AbstractUser):
     bio = models.TextField(blank=True)
     other_details = models.TextField(blank=True)
     image = models.ImageField(null=True, blank=True, upload_to=user_image_file_path)
+    renditions = models.JSONField(null=True, blank=True, editable=False)
     user_follow = models.ManyToManyField(
-        "User", blank=True, related_name="user_followers", symmetrical=False
+        "User",
+        through="Follow",
+        through_fields=("from_user", "to_user"),
+        blank=True,
+        related_name="user_followers",
+        symmetrical=False,
     )
-
-    @property
-    def followers_count(self):
-        return self.user_followers.count()
-
-    @property
-    def following_count(self):
-        return self.user_follow.count()
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
 
     class Meta:
         ordering = ["first_name", "last_name"]
+        indexes = [
+            models.Index(
+                fields=["first_name", "last_name", "id"],
+                name="user_name_id_idx",
+            ),
+        ]
 
     def __str__(self) -> str:
         return f"{self.first_name} {self.last_name}"
 
+    def delete(self, using=None, keep_parents=False):
+        # Posts go through their queryset first, so their comments and
+        # likes are deleted in bulk rather than by the cascade.
+        using = using or router.db_for_write(User, instance=self)
+        with transaction.atomic(using=using):
+            Post.objects.using(using).filter(user=self.pk).delete()
+            return super().delete(using, keep_parents)
+
+
+class Follow(models.Model):
+    """`from_user` follows `to_user` since `created_at`"""
+
+    from_user = models.ForeignKey(
+        User, related_name="+", on_delete=models.CASCADE
+    )
+    to_user = models.ForeignKey(
+        User, related_name="+", on_delete=models.CASCADE
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "user_user_user_follow"
+        unique_together = ("from_user", "to_user")
+        indexes = [
+            models.Index(
+                fields=["from_user", "-created_at", "-id"],
+                name="follow_following_idx",
+            ),
+            models.Index(
+                fields=["to_user", "-created_at", "-id"],
+                name="follow_followers_idx",
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.from_user_id} -> {self.to_user_id}"
+
+
+HASHTAG_MAX_LENGTH = 60
+HASHTAG_IN_TEXT = re.compile(r"#(\w+)")
+HASHTAG_WORD = re.compile(r"\w+")
+
+
+def extract_hashtags(hashtag: str, text: str) -> set[str]:
+    """Collect lowercase tags from the hashtag field and #words in text."""
+    names = HASHTAG_WORD.findall(hashtag or "")
+    names += HASHTAG_IN_TEXT.findall(text or "")
+    return {name.lower()[:HASHTAG_MAX_LENGTH] for name in names}
+
+
+class Hashtag(models.Model):
+    name = models.CharField(max_length=HASHTAG_MAX_LENGTH, unique=True)
+    posts_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["-posts_count", "id"]
+        indexes = [
+            models.Index(
+                fields=["-posts_count", "id"], name="hashtag_popularity_idx"
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"#{self.name}"
+
 
 def post_image_file_path(instance, filename) -> str:
     _, extension = os.path.splitext(filename)
@@ -89,6 +212,51 @@ def post_image_file_path(instance, filename) -> str:
     return os.path.join("media/uploads/users/posts", filename)
 
 
+def delete_replies(using: str, posts) -> None:
+    """Delete the comments and likes of `posts` in one query each.
+
+    The cascade would load every row and send its signals; the
+    `post_delete` receivers of comments and likes are skipped on purpose,
+    as they only shift the counters and bump the cache versions of posts
+    which are going away too, and whose own `post_delete` bumps them.
+    """
+    for model in (Comment, Like):
+        model.objects.using(using).filter(post__in=posts)._raw_delete(using)
+
+
+class PostQuerySet(ShardedQuerySet):
+    def delete(self):
+        with transaction.atomic(using=self.db):
+            delete_replies(self.db, self.values("pk"))
+            return super().delete()
+
+
+class PostManager(models.Manager.from_queryset(PostQuerySet)):
+    def update_counter(self, post_id: int, field: str, delta: int) -> int:
+        """Atomically shift a denormalized counter, never below zero"""
+        posts = self.filter(pk=post_id)
+        if delta < 0:
+            posts = posts.filter(**{f"{field}__gte": -delta})
+        return posts.update(**{field: F(field) + delta})
+
+    def shift_counters(self, field: str, deltas: dict[int, int]) -> int:
+        """Shift a counter of many posts by per-post deltas in one UPDATE"""
+        deltas = {post_id: delta for post_id, delta in deltas.items() if delta}
+        if not deltas:
+            return 0
+        shift = Case(
+            *[
+                When(pk=post_id, then=Value(delta))
+                for post_id, delta in deltas.items()
+            ],
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+        return self.filter(pk__in=deltas).update(
+            **{field: Greatest(F(field) + shift, 0)}
+        )
+
+
 class Post(models.Model):
     hashtag = models.CharField(max_length=60, blank=True)
     text = models.CharField(max_length=255)
@@ -99,17 +267,58 @@ class Post(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True)
     media_image = models.ImageField(null=True, upload_to=post_image_file_path)
+    renditions = models.JSONField(null=True, blank=True, editable=False)
+    likes_count = models.PositiveIntegerField(default=0)
+    comments_count = models.PositiveIntegerField(default=0)
+    tags = models.ManyToManyField(Hashtag, related_name="posts", blank=True)
 
-    @property
-    def comments_count(self):
-        return self.comments.count()
-
-    @property
-    def likes_count(self):
-        return self.likes.filter(is_liked=True).count()
+    objects = PostManager()
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(
+                fields=["-created_at", "-id"], name="post_created_id_idx"
+            ),
+        ]
+
+    def hashtag_ids(self) -> list[int]:
+        """Ids of the linked hashtags, which may live on another database"""
+        links = self.tags.through.objects.using(self._state.db)
+        return list(
+            links.filter(post=self).values_list("hashtag", flat=True)
+        )
+
+    def sync_hashtags(self) -> None:
+        """Point `tags` at the hashtags found in the post and keep counts."""
+        names = extract_hashtags(self.hashtag, self.text)
+        current = dict(
+            Hashtag.objects.filter(pk__in=self.hashtag_ids()).values_list(
+                "name", "id"
+            )
+        )
+
+        removed = [pk for name, pk in current.items() if name not in names]
+        if removed:
+            self.tags.remove(*removed)
+            Hashtag.objects.filter(pk__in=removed).update(
+                posts_count=Greatest(F("posts_count") - 1, 0)
+            )
+
+        added = names - current.keys()
+        if added:
+            Hashtag.objects.bulk_create(
+                [Hashtag(name=name) for name in added], ignore_conflicts=True
+            )
+            tags = Hashtag.objects.filter(name__in=added)
+            self.tags.add(*tags)
+            tags.update(posts_count=F("posts_count") + 1)
+
+    def delete(self, using=None, keep_parents=False):
+        using = using or router.db_for_write(Post, instance=self)
+        with transaction.atomic(using=using):
+            delete_replies(using, [self.pk])
+            return super().delete(using, keep_parents)
 
 
 class Comment(models.Model):
@@ -124,13 +333,72 @@ class Comment(models.Model):
     text = models.CharField(max_length=255)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = ShardedManager()
+
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(
+                fields=["post", "-created_at", "-id"],
+                name="comment_post_created_idx",
+            ),
+        ]
 
     def __str__(self) -> str:
         return self.text
 
 
+class LikeManager(ShardedManager):
+    def toggle(self, post_id: int, user_id: int) -> bool:
+        """Like a post, or flip an existing like, in one upsert statement.
+
+        Returns the new `is_liked`. Needs SQLite 3.35+ or PostgreSQL.
+        """
+        table = self.model._meta.db_table
+        columns = ["post_id", "user_id", "is_liked"]
+        values = [post_id, user_id, True]
+        if sharding_enabled():
+            columns.insert(0, "id")
+            values.insert(0, reserve_ids(self.model, 1)[0])
+        db = self._db or router.db_for_write(self.model)
+        with connections[db].cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {table} ({", ".join(columns)})
+                VALUES ({", ".join(["%s"] * len(values))})
+                ON CONFLICT (post_id, user_id)
+                DO UPDATE SET is_liked = NOT {table}.is_liked
+                RETURNING is_liked
+                """,
+                values,
+            )
+            return bool(cursor.fetchone()[0])
+
+    def set_many(self, user_id: int, states: dict[int, bool]) -> dict:
+        """Upsert likes of `user_id` for many posts at once.
+
+        Returns the change of each post's like count.
+        """
+        previous = dict(
+            self.filter(user=user_id, post__in=states).values_list(
+                "post", "is_liked"
+            )
+        )
+        self.bulk_create(
+            [
+                self.model(post_id=post_id, user_id=user_id, is_liked=liked)
+                for post_id, liked in states.items()
+            ],
+            update_conflicts=True,
+            unique_fields=["post", "user"],
+            update_fields=["is_liked"],
+        )
+        return {
+            post_id: int(liked) - int(previous.get(post_id, False))
+            for post_id, liked in states.items()
+        }
+
+
 class Like(models.Model):
     post = models.ForeignKey(
         Post, related_name="likes", on_delete=models.CASCADE
@@ -142,5 +410,112 @@ class Like(models.Model):
     )
     is_liked = models.BooleanField()
 
+    objects = LikeManager()
+
     class Meta:
         unique_together = ("post", "user")
+
+
+class TimelineEntry(models.Model):
+    """Materialized home timeline row: `post` is visible in `owner`'s feed"""
+
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        related_name="timeline",
+        on_delete=models.CASCADE,
+    )
+    post = models.ForeignKey(
+        Post, related_name="timeline_entries", on_delete=models.CASCADE
+    )
+    created_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ["-created_at"]
+        unique_together = ("owner", "post")
+        indexes = [
+            models.Index(
+                fields=["owner", "-created_at", "-post"],
+                name="timeline_owner_created_idx",
+            ),
+        ]
+
+
+class Upload(models.Model):
+    """A resumable upload; `file` is its content-addressed storage name"""
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        related_name="uploads",
+        on_delete=models.CASCADE,
+    )
+    size = models.PositiveBigIntegerField()
+    offset = models.PositiveBigIntegerField(default=0)
+    sha256 = models.CharField(max_length=64, blank=True, db_index=True)
+    file = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    def __str__(self) -> str:
+        return str(self.id)
+
+    @property
+    def is_complete(self) -> bool:
+        return self.completed_at is not None
+
+
+class ShardBucket(models.Model):
+    """Directory entry: posts of authors in `bucket` live on `alias`"""
+
+    bucket = models.PositiveIntegerField(unique=True)
+    alias = models.CharField(max_length=60)
+
+    def __str__(self) -> str:
+        return f"{self.bucket} -> {self.alias}"
+
+
+class ShardSequenceManager(models.Manager):
+    def reserve(self, name: str, count: int, get_floor) -> int:
+        """Advance sequence `name` by `count` ids and return the last one.
+
+        A missing sequence starts right above `get_floor()`.
+        """
+        table = self.model._meta.db_table
+        db = self._db or router.db_for_write(self.model)
+        with connections[db].cursor() as cursor:
+            cursor.execute(
+                f"""
+                UPDATE {table} SET last_id = last_id + %s
+                WHERE name = %s
+                RETURNING last_id
+                """,
+                [count, name],
+            )
+            row = cursor.fetchone()
+            if row is None:
+                cursor.execute(
+                    f"""
+                    INSERT INTO {table} (name, last_id) VALUES (%s, %s)
+                    ON CONFLICT (name)
+                    DO UPDATE SET last_id = {table}.last_id + %s
+                    RETURNING last_id
+                    """,
+                    [name, get_floor() + count, count],
+                )
+                row = cursor.fetchone()
+            return row[0]
+
+
+class ShardSequence(models.Model):
+    """Last id handed out for a sharded model, whichever shard took it"""
+
+    name = models.CharField(max_length=100, unique=True)
+    last_id = models.BigIntegerField(default=0)
+
+    objects = ShardSequenceManager()
+
+    def __str__(self) -> str:
+        return f"{self.name}: {self.last_id}"
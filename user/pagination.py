@@ -1,13 +1,273 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+from datetime import datetime
+from operator import attrgetter
 
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (
+    BasePagination,
+    PageNumberPagination,
+    _positive_int,
+)
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
-class UserPagination(PageNumberPagination):
+
+def ordering_field(queryset, path: str):
+    """Annotation of `queryset` named `path`, or the model field at the
+    end of a `__` separated ordering path
+    """
+    annotations = getattr(queryset.query, "annotations", {})
+    if path in annotations:
+        return annotations[path].output_field
+    model = queryset.model
+    *relations, name = path.split("__")
+    for relation in relations:
+        model = model._meta.get_field(relation).related_model
+    return model._meta.get_field(name)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Seek pagination over a fixed, unique ordering.
+
+    The cursor stores the ordering values of the boundary row, so every
+    page is a `WHERE (a, b) < (x, y) ORDER BY a, b LIMIT n` lookup that
+    can walk a matching index, with no COUNT and no OFFSET.
+    """
+
+    ordering = ("-created_at", "-id")
     page_size = 10
     page_size_query_param = "page_size"
     max_page_size = 100
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor"
+
+    def __init__(self, ordering=None) -> None:
+        if ordering is not None:
+            self.ordering = tuple(ordering)
+
+    def get_page_size(self, request) -> int:
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param],
+                strict=True,
+                cutoff=self.max_page_size,
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            payload = json.loads(urlsafe_b64decode(encoded.encode("ascii")))
+            values, reverse = payload["v"], bool(payload.get("r"))
+        except (BinasciiError, KeyError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return values, reverse
+
+    def clean_cursor_values(self, queryset, values) -> list:
+        """Coerce decoded values to the ordering fields, or reject them"""
+        cleaned = []
+        for name, value in zip(self.ordering, values):
+            # Only JSON scalars can come from `encode_cursor`, and
+            # integers must fit the 64-bit columns they are compared to.
+            if isinstance(value, bool) or not isinstance(
+                value, (str, int, float)
+            ):
+                raise NotFound(self.invalid_cursor_message)
+            if isinstance(value, int) and not -(2**63) <= value < 2**63:
+                raise NotFound(self.invalid_cursor_message)
+            if getattr(queryset, "model", None) is not None:
+                try:
+                    field = ordering_field(queryset, name.lstrip("-"))
+                    value = field.clean(value, None)
+                except (FieldDoesNotExist, ValidationError):
+                    raise NotFound(self.invalid_cursor_message)
+            cleaned.append(value)
+        return cleaned
+
+    def encode_cursor(self, obj, reverse: bool = False) -> str:
+        values = []
+        for field in self.ordering:
+            value = attrgetter(field.lstrip("-").replace("__", "."))(obj)
+            if isinstance(value, datetime):
+                value = value.isoformat()
+            values.append(value)
+        payload = json.dumps({"v": values, "r": int(reverse)})
+        cursor = urlsafe_b64encode(payload.encode("ascii")).decode("ascii")
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, cursor
+        )
+
+    def get_seek_filter(self, values, reverse: bool) -> Q:
+        """Build `(a, b, c) > (x, y, z)` as nested ANDs/ORs for the ORM"""
+        seek = Q()
+        equal = Q()
+        for field, value in zip(self.ordering, values):
+            descending = field.startswith("-")
+            name = field.lstrip("-")
+            lookup = "lt" if descending != reverse else "gt"
+            seek |= equal & Q(**{f"{name}__{lookup}": value})
+            equal &= Q(**{name: value})
+        return seek
+
+    def get_page_queryset(self, queryset, request):
+        """Return the sliced queryset for the requested page (one extra row)"""
+        self.page_size_value = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        values, self.reverse = self.decode_cursor(request)
+        self.has_position = values is not None
+
+        ordering = self.ordering
+        if self.reverse:
+            ordering = tuple(
+                field[1:] if field.startswith("-") else f"-{field}"
+                for field in ordering
+            )
+        queryset = queryset.order_by(*ordering)
+        if values is not None:
+            values = self.clean_cursor_values(queryset, values)
+            queryset = queryset.filter(
+                self.get_seek_filter(values, self.reverse)
+            )
+        return queryset[: self.page_size_value + 1]
+
+    def paginate_rows(self, rows) -> list:
+        """Trim the extra row fetched by `get_page_queryset` into links"""
+        has_more = len(rows) > self.page_size_value
+        page = list(rows[: self.page_size_value])
+        if self.reverse:
+            page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.has_position
+        self.page = page
+        return page
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.paginate_rows(
+            list(self.get_page_queryset(queryset, request))
+        )
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1])
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data) -> Response:
+        return Response(
+            {
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "results": data,
+            }
+        )
+
+    def get_paginated_response_schema(self, schema) -> dict:
+        return {
+            "type": "object",
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {
+                    "type": "string",
+                    "nullable": True,
+                    "format": "uri",
+                },
+                "results": schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view) -> list:
+        return [
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Keyset cursor; send it empty to opt in",
+                "schema": {"type": "string"},
+            },
+            {
+                "name": self.page_size_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Number of results to return per page.",
+                "schema": {"type": "integer"},
+            },
+        ]
 
 
-class PostPagination(PageNumberPagination):
+class CursorOptInPagination(PageNumberPagination):
+    """
+    Page number pagination by default, keyset pagination when the client
+    sends a `cursor` query param (empty for the first page).
+    """
+
     page_size = 10
     page_size_query_param = "page_size"
     max_page_size = 100
+    cursor_ordering = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if KeysetPagination.cursor_query_param in request.query_params:
+            self.keyset = KeysetPagination(ordering=self.cursor_ordering)
+            return self.keyset.paginate_queryset(queryset, request, view)
+
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data) -> Response:
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+
+        return super().get_paginated_response(data)
+
+    def get_schema_operation_parameters(self, view) -> list:
+        parameters = super().get_schema_operation_parameters(view)
+        keyset_parameters = KeysetPagination().get_schema_operation_parameters(
+            view
+        )
+        return parameters + keyset_parameters[:1]
+
+
+class UserPagination(CursorOptInPagination):
+    cursor_ordering = ("first_name", "last_name", "id")
+
+
+class PostPagination(CursorOptInPagination):
+    # Annotated by the feed from its timeline rows.
+    cursor_ordering = ("-feed_created_at", "-feed_post_id")
+
+
+class LikePagination(CursorOptInPagination):
+    """Liked posts stay unpaginated unless the client opts into cursors"""
+
+    page_size = None
+    page_size_query_param = None
+    cursor_ordering = ("-id",)
+
+
+class CommentPagination(KeysetPagination):
+    ordering = ("-created_at", "-id")
+
+
+class FollowPagination(KeysetPagination):
+    ordering = ("-created_at", "-id")
+
+
+class HashtagPagination(KeysetPagination):
+    ordering = ("-posts_count", "id")
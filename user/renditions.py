@@ -0,0 +1,94 @@
+"""
+Resized, EXIF-free renditions of uploaded images.
+
+Each rendition is stored next to the original as a JPEG and a WebP file;
+the model keeps their storage names in its `renditions` JSON field, along
+with the name of the source image they were made from.
+"""
+import io
+import os
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+# Longest edge in pixels of each rendition.
+RENDITION_SIZES = {"thumbnail": 160, "feed": 640, "full": 1600}
+JPEG_QUALITY = 85
+WEBP_QUALITY = 80
+
+
+def _encode(image: Image.Image, image_format: str) -> bytes:
+    output = io.BytesIO()
+    if image_format == "JPEG":
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        image.save(
+            output,
+            "JPEG",
+            quality=JPEG_QUALITY,
+            optimize=True,
+            progressive=True,
+        )
+    else:
+        image.save(output, "WEBP", quality=WEBP_QUALITY, method=4)
+    return output.getvalue()
+
+
+def make_renditions(name: str, storage=default_storage) -> dict:
+    """Render every size of the stored image `name`, return their names"""
+    with storage.open(name) as source:
+        image = Image.open(source)
+        # Bake the EXIF orientation into the pixels; saved copies carry no
+        # metadata at all.
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+
+    stem, _ = os.path.splitext(name)
+    renditions = {"source": name}
+    for rendition, size in RENDITION_SIZES.items():
+        resized = image.copy()
+        resized.thumbnail((size, size), Image.Resampling.LANCZOS)
+        files = {}
+        for extension, image_format in (("jpg", "JPEG"), ("webp", "WEBP")):
+            files[extension] = storage.save(
+                f"{stem}-{rendition}.{extension}",
+                ContentFile(_encode(resized, image_format)),
+            )
+        renditions[rendition] = {
+            "width": resized.width,
+            "height": resized.height,
+            **files,
+        }
+    return renditions
+
+
+def delete_renditions(renditions, storage=default_storage) -> None:
+    for rendition in RENDITION_SIZES:
+        for name in (renditions or {}).get(rendition, {}).values():
+            if isinstance(name, str):
+                storage.delete(name)
+
+
+def rendition_urls(renditions, request=None, storage=default_storage):
+    """Public URLs of stored renditions, or None while they are pending"""
+    if not renditions:
+        return None
+
+    def url(name: str) -> str:
+        location = storage.url(name)
+        if request is not None:
+            return request.build_absolute_uri(location)
+        return location
+
+    return {
+        rendition: {
+            "width": renditions[rendition]["width"],
+            "height": renditions[rendition]["height"],
+            "jpeg": url(renditions[rendition]["jpg"]),
+            "webp": url(renditions[rendition]["webp"]),
+        }
+        for rendition in RENDITION_SIZES
+        if rendition in renditions
+    }
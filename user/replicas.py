@@ -0,0 +1,114 @@
+"""
+Read replicas with read-your-writes stickiness.
+
+Views using ReplicaReadMixin pick one replica per safe request and
+ReplicaRouter sends that request's ORM reads to it; writes always go
+to "default". After a user sends a write, their requests stay on the
+primary for REPLICA_PIN_SECONDS, long enough for replicas to catch up.
+"""
+import random
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.decorators import sync_and_async_middleware
+from django.utils.functional import SimpleLazyObject
+from rest_framework.permissions import SAFE_METHODS
+
+PIN_KEY = "replica-pin:{}"
+
+# Alias of the replica the current request reads from, if any.
+read_alias = ContextVar("read_alias", default=None)
+
+
+def pin_to_primary(user_id) -> None:
+    cache.set(PIN_KEY.format(user_id), True, settings.REPLICA_PIN_SECONDS)
+
+
+async def apin_to_primary(user_id) -> None:
+    await cache.aset(
+        PIN_KEY.format(user_id), True, settings.REPLICA_PIN_SECONDS
+    )
+
+
+def is_pinned(user_id) -> bool:
+    return user_id is not None and bool(cache.get(PIN_KEY.format(user_id)))
+
+
+def choose_replica(request, pinned: bool):
+    if pinned or request.method not in SAFE_METHODS:
+        return None
+    if not settings.DATABASE_REPLICAS:
+        return None
+    return random.choice(settings.DATABASE_REPLICAS)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return True
+
+
+class ReplicaReadMixin:
+    """Send the ORM reads of safe requests to one replica"""
+
+    def dispatch(self, request, *args, **kwargs):
+        token = read_alias.set(None)
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            read_alias.reset(token)
+
+    def initial(self, request, *args, **kwargs) -> None:
+        super().initial(request, *args, **kwargs)
+        pinned = is_pinned(request.user.id)
+        read_alias.set(choose_replica(request, pinned))
+
+    def get_snapshot_timeout(self):
+        # A lagging replica may render data older than the versions its
+        # response is cached under: keep it only as long as the lag.
+        if read_alias.get() is None:
+            return super().get_snapshot_timeout()
+        return settings.REPLICA_PIN_SECONDS
+
+
+def get_writer_id(request):
+    """Id of the user a DRF view authenticated, without loading a session"""
+    user = request.__dict__.get("user")
+    if user is None or isinstance(user, SimpleLazyObject):
+        return None
+    return user.id
+
+
+@sync_and_async_middleware
+def replica_pin_middleware(get_response):
+    """Pin users to the primary after each write request they send"""
+    if iscoroutinefunction(get_response):
+
+        async def middleware(request):
+            response = await get_response(request)
+            writer_id = get_writer_id(request)
+            if request.method not in SAFE_METHODS and writer_id:
+                await apin_to_primary(writer_id)
+            return response
+
+    else:
+
+        def middleware(request):
+            response = get_response(request)
+            writer_id = get_writer_id(request)
+            if request.method not in SAFE_METHODS and writer_id:
+                pin_to_primary(writer_id)
+            return response
+
+    return middleware
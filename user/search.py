@@ -0,0 +1,125 @@
+import heapq
+import re
+
+from django.contrib.auth import get_user_model
+from django.db import connection, connections
+from django.db.models import Q
+
+from user.models import Post
+from user.sharding import group_by_shard
+
+SEARCH_TOKEN = re.compile(r"\w+")
+
+
+# SQLite FTS5 tables kept in sync with their content tables by the
+# triggers the migrations create.
+POST_FTS_TABLE = "user_post_fts"
+USER_FTS_TABLE = "user_user_fts"
+
+
+def fts_query(query: str) -> str:
+    """Quote every word of the query and match it as a prefix"""
+    return " ".join(f'"{token}"*' for token in SEARCH_TOKEN.findall(query))
+
+
+def search_post_ids(query: str, owner_id: int, limit: int) -> list[int]:
+    """Ids of posts in `owner_id`'s timeline matching `query`, best first"""
+    match = fts_query(query)
+    if not match:
+        return []
+
+    if connection.vendor != "sqlite":
+        return list(
+            Post.objects.filter(
+                timeline_entries__owner=owner_id, text__icontains=query
+            ).values_list("id", flat=True)[:limit]
+        )
+
+    table = POST_FTS_TABLE
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT {table}.rowid
+            FROM {table}
+            JOIN user_timelineentry AS timeline
+                ON timeline.post_id = {table}.rowid
+            WHERE {table} MATCH %s AND timeline.owner_id = %s
+            ORDER BY bm25({table}, 1.0, 2.0)
+            LIMIT %s
+            """,
+            [match, owner_id, limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def search_shard_post_ids(query: str, author_ids, limit: int) -> list:
+    """(shard, id) of posts by `author_ids` matching `query`, best first.
+
+    Each shard ranks its own matches; BM25 weights are per shard, so the
+    merged order is close to, not exactly, a single index's order.
+    """
+    match = fts_query(query)
+    if not match:
+        return []
+
+    table = POST_FTS_TABLE
+    hits = []
+    for alias, user_ids in group_by_shard(author_ids).items():
+        shard = connections[alias]
+        if shard.vendor != "sqlite":
+            posts = Post.objects.using(alias).filter(
+                user__in=user_ids, text__icontains=query
+            )
+            hits += [
+                (0.0, alias, post_id)
+                for post_id in posts.values_list("id", flat=True)[:limit]
+            ]
+            continue
+
+        authors = ", ".join(["%s"] * len(user_ids))
+        with shard.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT bm25({table}, 1.0, 2.0), {table}.rowid
+                FROM {table}
+                JOIN user_post AS post ON post.id = {table}.rowid
+                WHERE {table} MATCH %s AND post.user_id IN ({authors})
+                ORDER BY 1
+                LIMIT %s
+                """,
+                [match, *user_ids, limit],
+            )
+            hits += [(rank, alias, post_id) for rank, post_id in cursor]
+    best = heapq.nsmallest(limit, hits)
+    return [(alias, post_id) for _, alias, post_id in best]
+
+
+def search_user_ids(query: str, limit: int) -> list[int]:
+    """Ids of users whose names match `query` as a prefix, best first"""
+    match = fts_query(query)
+    if not match:
+        return []
+
+    if connection.vendor != "sqlite":
+        return list(
+            get_user_model()
+            .objects.filter(
+                Q(username__istartswith=query)
+                | Q(first_name__istartswith=query)
+                | Q(last_name__istartswith=query)
+            )
+            .values_list("id", flat=True)[:limit]
+        )
+
+    table = USER_FTS_TABLE
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT rowid FROM {table}
+            WHERE {table} MATCH %s
+            ORDER BY bm25({table}, 2.0, 1.0, 1.0)
+            LIMIT %s
+            """,
+            [match, limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
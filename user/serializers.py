@@ -1,11 +1,62 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model, authenticate
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
+from rest_framework_simplejwt import serializers as jwt_serializers
 
-from user.models import Post, Comment, Like
+from user.models import Post, Comment, Like, Hashtag, Follow, Upload
+from user.renditions import rendition_urls
+from user.token_blacklist import RefreshToken
 
+LATEST_COMMENTS_COUNT = 3
+LATEST_FOLLOWS_COUNT = 5
+BULK_FOLLOW_LIMIT = 100
+BULK_LIKE_LIMIT = 100
+
+
+class RenditionsField(serializers.ReadOnlyField):
+    """URLs of the resized copies of an image, null until they are ready"""
+
+    def to_representation(self, value):
+        return rendition_urls(value, self.context.get("request"))
+
+
+class CompletedUploadField(serializers.PrimaryKeyRelatedField):
+    def get_queryset(self):
+        request = self.context.get("request")
+        if request is None or not request.user.is_authenticated:
+            return Upload.objects.none()
+        return Upload.objects.filter(
+            user=request.user, completed_at__isnull=False
+        )
+
+
+class UploadReferenceMixin:
+    """Let clients set an image field to a finished upload's id"""
+
+    upload_fields = {}
+
+    def get_fields(self):
+        fields = super().get_fields()
+        for upload_field, image_field in self.upload_fields.items():
+            if image_field in fields and not fields[image_field].read_only:
+                fields[upload_field] = CompletedUploadField(
+                    write_only=True, required=False
+                )
+        return fields
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        for upload_field, image_field in self.upload_fields.items():
+            upload = attrs.pop(upload_field, None)
+            if upload is not None:
+                attrs[image_field] = upload.file
+        return attrs
+
+
+class UserSerializer(UploadReferenceMixin, serializers.ModelSerializer):
+    upload_fields = {"image_upload": "image"}
 
-class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = get_user_model()
         fields = (
@@ -42,6 +93,8 @@ class UserSerializer(serializers.ModelSerializer):
 
 
 class UserListSerializer(UserSerializer):
+    renditions = RenditionsField()
+
     class Meta:
         model = get_user_model()
         fields = (
@@ -50,14 +103,17 @@ class UserListSerializer(UserSerializer):
             "first_name",
             "last_name",
             "image",
+            "renditions",
             "followers_count",
             "following_count",
         )
+        read_only_fields = ("followers_count", "following_count")
 
 
 class UserDetailSerializer(UserSerializer):
-    user_follow = serializers.StringRelatedField(many=True)
-    user_followers = serializers.StringRelatedField(many=True)
+    renditions = RenditionsField()
+    user_follow = serializers.SerializerMethodField()
+    user_followers = serializers.SerializerMethodField()
 
     class Meta:
         model = get_user_model()
@@ -65,13 +121,45 @@ class UserDetailSerializer(UserSerializer):
             "id",
             "username",
             "image",
+            "renditions",
             "first_name",
             "last_name",
             "bio",
             "other_details",
+            "followers_count",
+            "following_count",
             "user_follow",
             "user_followers",
         )
+        read_only_fields = ("followers_count", "following_count")
+
+    @staticmethod
+    def latest_follows(side: str, other: str, user_id: int) -> list[str]:
+        """Newest few users on one side of the follow graph"""
+        follows = (
+            Follow.objects.filter(**{side: user_id})
+            .select_related(other)
+            .order_by("-created_at", "-id")[:LATEST_FOLLOWS_COUNT]
+        )
+        return [str(getattr(follow, other)) for follow in follows]
+
+    def get_user_follow(self, obj) -> list[str]:
+        return self.latest_follows("from_user", "to_user", obj.id)
+
+    def get_user_followers(self, obj) -> list[str]:
+        return self.latest_follows("to_user", "from_user", obj.id)
+
+
+class FollowerSerializer(serializers.ModelSerializer):
+    user = UserListSerializer(source="from_user", read_only=True)
+
+    class Meta:
+        model = Follow
+        fields = ("id", "user", "created_at")
+
+
+class FollowingSerializer(FollowerSerializer):
+    user = UserListSerializer(source="to_user", read_only=True)
 
 
 class UserFollowSerializer(UserSerializer):
@@ -83,6 +171,14 @@ class UserFollowSerializer(UserSerializer):
         )
 
 
+class BulkFollowSerializer(serializers.Serializer):
+    user_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=BULK_FOLLOW_LIMIT,
+    )
+
+
 class AuthTokenSerializer(serializers.Serializer):
     email = serializers.EmailField()
     password = serializers.CharField()
@@ -105,7 +201,13 @@ class AuthTokenSerializer(serializers.Serializer):
         return attrs
 
 
-class PostSerializer(serializers.ModelSerializer):
+class TokenRefreshSerializer(jwt_serializers.TokenRefreshSerializer):
+    token_class = RefreshToken
+
+
+class PostSerializer(UploadReferenceMixin, serializers.ModelSerializer):
+    upload_fields = {"media_upload": "media_image"}
+
     class Meta:
         model = Post
         fields = ("id", "hashtag", "text", "user", "media_image")
@@ -115,6 +217,7 @@ class PostListSerializer(PostSerializer):
     user_username = serializers.CharField(
         source="user.username", read_only=True
     )
+    renditions = RenditionsField()
 
     class Meta:
         model = Post
@@ -123,14 +226,16 @@ class PostListSerializer(PostSerializer):
             "user_username",
             "text",
             "media_image",
+            "renditions",
             "hashtag",
             "likes_count",
             "comments_count",
         )
+        read_only_fields = ("likes_count", "comments_count")
 
 
 class PostDetailSerializer(PostListSerializer):
-    comments = serializers.StringRelatedField(many=True)
+    comments = serializers.SerializerMethodField()
 
     class Meta:
         model = Post
@@ -139,10 +244,20 @@ class PostDetailSerializer(PostListSerializer):
             "user_username",
             "text",
             "media_image",
+            "renditions",
             "hashtag",
             "likes_count",
+            "comments_count",
             "comments",
         )
+        read_only_fields = ("likes_count", "comments_count")
+
+    def get_comments(self, obj) -> list[str]:
+        """Newest comments only; the rest are paged at /comments/"""
+        comments = obj.comments.order_by("-created_at", "-id").values_list(
+            "text", flat=True
+        )
+        return list(comments[:LATEST_COMMENTS_COUNT])
 
 
 class CommentSerializer(serializers.ModelSerializer):
@@ -151,15 +266,56 @@ class CommentSerializer(serializers.ModelSerializer):
         fields = ("id", "text")
 
 
+class CommentListSerializer(CommentSerializer):
+    user_username = serializers.CharField(
+        source="user.username", read_only=True
+    )
+
+    class Meta:
+        model = Comment
+        fields = ("id", "user_username", "text", "created_at")
+
+
 class LikeSerializer(serializers.ModelSerializer):
     class Meta:
         model = Like
         fields = ("id", "is_liked")
 
 
+class LikeStateSerializer(serializers.Serializer):
+    post = serializers.IntegerField(min_value=1)
+    is_liked = serializers.BooleanField()
+
+
+class BulkLikeSerializer(serializers.Serializer):
+    likes = LikeStateSerializer(
+        many=True, allow_empty=False, max_length=BULK_LIKE_LIMIT
+    )
+
+
 class LikeListSerializer(serializers.ModelSerializer):
     post = PostSerializer(many=False, read_only=True)
 
     class Meta:
         model = Like
         fields = ("id", "user", "post")
+
+
+class UploadSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Upload
+        fields = ("id", "size", "offset", "sha256", "completed_at")
+        read_only_fields = ("id", "offset", "sha256", "completed_at")
+
+    def validate_size(self, size: int) -> int:
+        if not 0 < size <= settings.UPLOAD_MAX_SIZE:
+            raise ValidationError(
+                f"Size must be between 1 and {settings.UPLOAD_MAX_SIZE} bytes."
+            )
+        return size
+
+
+class HashtagSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Hashtag
+        fields = ("id", "name", "posts_count")
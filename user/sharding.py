@@ -0,0 +1,335 @@
+"""
+Sharding of posts, and of the comments and likes on them, by author.
+
+Users, follows and hashtags stay on "default". With DATABASE_SHARDS set,
+each author hashes into one of SHARD_BUCKETS buckets and each bucket
+lives on one shard, as recorded in the ShardBucket directory that
+`reshard` rewrites. A post is stored on its author's shard, together
+with its comments, likes and hashtag links, so a like and the counter
+it shifts commit in one transaction. Ids come from ShardSequence rows
+on "default", so they stay unique wherever rows are moved.
+
+Posts moved to POST_ARCHIVE_DATABASE take their comments, likes and
+links along the same way, so the router treats the archive as one more
+partition.
+
+Without DATABASE_SHARDS nothing here changes where a query goes.
+"""
+import heapq
+from itertools import islice
+from operator import attrgetter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models, transaction
+from django.db.models import Max
+
+from user.caching import get_post_author, remember_post_author
+from user.replicas import read_alias
+
+SHARD_MAP_KEY = "shard-map"
+# Models stored on the shard of the author of their post.
+SHARDED_MODELS = {"user.Post", "user.Comment", "user.Like", "user.Post_tags"}
+
+
+def sharding_enabled() -> bool:
+    return bool(settings.DATABASE_SHARDS)
+
+
+def partition_aliases() -> list[str]:
+    """Databases besides "default" that hold posts: shards and archive"""
+    archive = settings.POST_ARCHIVE_DATABASE
+    return [*settings.DATABASE_SHARDS, *([archive] if archive else [])]
+
+
+def is_sharded(model) -> bool:
+    return model._meta.label in SHARDED_MODELS
+
+
+def bucket_of(user_id: int) -> int:
+    return int(user_id) % settings.SHARD_BUCKETS
+
+
+def default_shard(bucket: int) -> str:
+    """Shard of a bucket `reshard` has not placed yet"""
+    shards = settings.DATABASE_SHARDS
+    return shards[bucket % len(shards)]
+
+
+def get_shard_map() -> dict[int, str]:
+    """Bucket to shard assignments recorded by `reshard`"""
+    from user.models import ShardBucket
+
+    shard_map = cache.get(SHARD_MAP_KEY)
+    if shard_map is None:
+        shard_map = dict(
+            ShardBucket.objects.using("default").values_list(
+                "bucket", "alias"
+            )
+        )
+        cache.set(SHARD_MAP_KEY, shard_map, settings.SHARD_MAP_CACHE_TIMEOUT)
+    return shard_map
+
+
+def group_by_shard(user_ids) -> dict[str, list[int]]:
+    """Split user ids by the shard holding their posts"""
+    if not sharding_enabled():
+        return {"default": list(user_ids)} if user_ids else {}
+
+    shard_map = get_shard_map()
+    groups = {}
+    for user_id in user_ids:
+        bucket = bucket_of(user_id)
+        alias = shard_map.get(bucket) or default_shard(bucket)
+        groups.setdefault(alias, []).append(user_id)
+    return groups
+
+
+def shard_for(user_id) -> str:
+    """Alias of the database holding the posts of `user_id`"""
+    if not sharding_enabled():
+        return "default"
+    bucket = bucket_of(user_id)
+    return get_shard_map().get(bucket) or default_shard(bucket)
+
+
+def shard_of_post(post_id):
+    """Alias of the database holding post `post_id`, None if none does"""
+    from user.models import Post
+
+    if not sharding_enabled():
+        return "default"
+
+    author_id = get_post_author(post_id)
+    if author_id is None:
+        for alias in settings.DATABASE_SHARDS:
+            author_id = (
+                Post.objects.using(alias)
+                .filter(pk=post_id)
+                .values_list("user", flat=True)
+                .first()
+            )
+            if author_id is not None:
+                remember_post_author(post_id, author_id)
+                break
+        else:
+            return None
+    return shard_for(author_id)
+
+
+def shard_of(instance) -> str:
+    """Alias of the shard a row of a sharded model belongs on"""
+    if instance._meta.label == "user.Post":
+        return shard_for(instance.user_id)
+
+    post_field = instance._meta.get_field("post")
+    if post_field.is_cached(instance):
+        post = post_field.get_cached_value(instance)
+        return post._state.db or shard_of(post)
+    return shard_of_post(instance.post_id) or "default"
+
+
+def highest_id(model) -> int:
+    aliases = {"default", *partition_aliases()}
+    return max(
+        model._base_manager.using(alias).aggregate(top=Max("pk"))["top"] or 0
+        for alias in aliases
+    )
+
+
+def reserve_ids(model, count: int) -> range:
+    """Take `count` ids of a sharded model, unique across all shards"""
+    from user.models import ShardSequence
+
+    # A new sequence continues above the ids handed out before sharding.
+    last_id = ShardSequence.objects.reserve(
+        model._meta.label, count, lambda: highest_id(model)
+    )
+    return range(last_id - count + 1, last_id + 1)
+
+
+def with_users(queryset):
+    """Load the user of each row, by a join unless the rows are sharded"""
+    if queryset.db in partition_aliases():
+        return queryset.prefetch_related("user")
+    return queryset.select_related("user")
+
+
+def move_posts(posts: list, source: str, target: str) -> None:
+    """Copy posts with their comments, likes and hashtag links, then
+    delete them from `source`. Copies ignore rows already there, so an
+    interrupted move is finished by running it again.
+    """
+    from user.models import Comment, Like, Post, TimelineEntry
+
+    post_ids = [post.pk for post in posts]
+    comments = list(Comment.objects.using(source).filter(post__in=post_ids))
+    likes = list(Like.objects.using(source).filter(post__in=post_ids))
+    links = Post.tags.through.objects.using(source).filter(post__in=post_ids)
+    tags = [
+        Post.tags.through(post_id=post_id, hashtag_id=hashtag_id)
+        for post_id, hashtag_id in links.values_list("post", "hashtag")
+    ]
+
+    with transaction.atomic(using=target):
+        Post.objects.using(target).bulk_create(posts, ignore_conflicts=True)
+        Comment.objects.using(target).bulk_create(
+            comments, ignore_conflicts=True
+        )
+        Like.objects.using(target).bulk_create(likes, ignore_conflicts=True)
+        Post.tags.through.objects.using(target).bulk_create(
+            tags, ignore_conflicts=True
+        )
+
+    # The rows live on in `target`: delete without signals, which would
+    # release hashtags and shift counters. Timelines only cover posts on
+    # "default" and have no use for the moved ones.
+    with transaction.atomic(using=source):
+        for rows in (
+            TimelineEntry.objects.using(source).filter(post__in=post_ids),
+            links,
+            Like.objects.using(source).filter(post__in=post_ids),
+            Comment.objects.using(source).filter(post__in=post_ids),
+            Post.objects.using(source).filter(pk__in=post_ids),
+        ):
+            rows._raw_delete(source)
+
+
+class ShardRouter:
+    """
+    Keep sharded rows, and the rows related to them, on their shard or
+    in the archive
+    """
+
+    def db_for_read(self, model, **hints):
+        instance = hints.get("instance")
+        if instance is None:
+            return None
+        if instance._state.db not in partition_aliases():
+            return None
+        if is_sharded(model):
+            return instance._state.db
+        # Shards and the archive hold no users or hashtags, only their ids.
+        return read_alias.get() or "default"
+
+    def db_for_write(self, model, **hints):
+        instance = hints.get("instance")
+        if instance is None:
+            return None
+        partitioned = instance._state.db in partition_aliases()
+        if not is_sharded(model):
+            return "default" if partitioned else None
+        if not sharding_enabled():
+            return instance._state.db if partitioned else None
+        if isinstance(instance, model) and instance._state.adding:
+            return shard_of(instance)
+        if is_sharded(type(instance)):
+            return instance._state.db
+        return None
+
+
+class ShardedQuerySet(models.QuerySet):
+    """
+    QuerySet of a sharded model. Rows created without `using()` are
+    written to the shard of their author, with ids from ShardSequence.
+    """
+
+    def for_owner(self, user_id):
+        """Rows on the shard holding the posts of `user_id`"""
+        return self.using(shard_for(user_id))
+
+    def per_shard(self) -> list:
+        """This queryset once per shard; just itself without sharding"""
+        if not sharding_enabled():
+            return [self]
+        return [self.using(alias) for alias in settings.DATABASE_SHARDS]
+
+    def create(self, **kwargs):
+        if self._db is not None or not sharding_enabled():
+            return super().create(**kwargs)
+        obj = self.model(**kwargs)
+        self._for_write = True
+        # Without `using`, the router picks the shard from the instance.
+        obj.save(force_insert=True)
+        return obj
+
+    def bulk_create(self, objs, *args, **kwargs):
+        if not sharding_enabled():
+            return super().bulk_create(objs, *args, **kwargs)
+
+        objs = list(objs)
+        new_objs = [obj for obj in objs if obj.pk is None]
+        if new_objs:
+            ids = reserve_ids(self.model, len(new_objs))
+            for obj, pk in zip(new_objs, ids):
+                obj.pk = pk
+        if self._db is not None:
+            return super().bulk_create(objs, *args, **kwargs)
+
+        by_shard = {}
+        for obj in objs:
+            by_shard.setdefault(shard_of(obj), []).append(obj)
+        for alias, shard_objs in by_shard.items():
+            super(ShardedQuerySet, self.using(alias)).bulk_create(
+                shard_objs, *args, **kwargs
+            )
+        return objs
+
+
+ShardedManager = models.Manager.from_queryset(ShardedQuerySet)
+
+
+class MergedQuerySet:
+    """
+    Read-only union of one queryset per shard, kept in `ordering`.
+
+    Supports what the paginators use: ordering, filtering, counting and
+    slicing. A slice fetches up to its end from every shard and merges
+    the sorted streams, so deep offsets cost as much on every shard;
+    keyset cursors keep each shard's read to one page.
+    """
+
+    ordered = True
+
+    def __init__(self, querysets, ordering) -> None:
+        self.ordering = tuple(ordering)
+        descending = {field.startswith("-") for field in self.ordering}
+        if len(descending) != 1:
+            raise ValueError("Shards merge on one sort direction only.")
+        self.reverse = descending.pop()
+        self.querysets = [
+            queryset.order_by(*self.ordering) for queryset in querysets
+        ]
+        self.model = self.querysets[0].model if self.querysets else None
+        self.query = self.querysets[0].query if self.querysets else None
+        self.sort_key = attrgetter(
+            *(field.lstrip("-").replace("__", ".") for field in self.ordering)
+        )
+
+    def order_by(self, *ordering):
+        return MergedQuerySet(self.querysets, ordering)
+
+    def filter(self, *args, **kwargs):
+        return MergedQuerySet(
+            [queryset.filter(*args, **kwargs) for queryset in self.querysets],
+            self.ordering,
+        )
+
+    def count(self) -> int:
+        return sum(queryset.count() for queryset in self.querysets)
+
+    def __getitem__(self, key: slice) -> list:
+        start, stop = key.start or 0, key.stop
+        querysets = self.querysets
+        if stop is not None:
+            querysets = [queryset[:stop] for queryset in querysets]
+        rows = heapq.merge(
+            *querysets, key=self.sort_key, reverse=self.reverse
+        )
+        return list(islice(rows, start, stop))
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def __len__(self) -> int:
+        return len(self[:])
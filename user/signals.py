@@ -0,0 +1,253 @@
+from functools import partial
+
+from django.contrib.auth.models import Group
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+
+from user import caching, follow_graph
+from user.models import Comment, Hashtag, Like, Post, TimelineEntry, User
+from user.sharding import partition_aliases, reserve_ids, sharding_enabled
+from user.tasks import (
+    backfill_timeline,
+    fan_out_post,
+    generate_renditions,
+    prune_timeline,
+)
+
+
+def update_post_counter(instance, field: str, delta: int) -> None:
+    """Shift a counter of the post a like or comment belongs to"""
+    posts = Post.objects.db_manager(instance._state.db)
+    posts.update_counter(instance.post_id, field, delta)
+    bump_post_of(instance)
+
+
+def bump_post_of(instance) -> None:
+    """Bump the cache versions of the post a like or comment belongs to"""
+    author_id = caching.get_post_author(instance.post_id)
+    if author_id is None:
+        author_id = instance.post.user_id
+    caching.bump_post(instance.post_id, author_id, using=instance._state.db)
+
+
+@receiver(pre_save, sender=Post)
+@receiver(pre_save, sender=Comment)
+@receiver(pre_save, sender=Like)
+def assign_shard_id(sender, instance, **kwargs) -> None:
+    # Shards can't hand out ids themselves; ids must stay unique when
+    # rows move between them.
+    if instance.pk is None and sharding_enabled():
+        instance.pk = reserve_ids(sender, 1)[0]
+
+
+@receiver(post_save, sender=Post)
+def fan_out_new_post(sender, instance, created, using, **kwargs) -> None:
+    if created:
+        caching.remember_post_author(instance.id, instance.user_id)
+        # Sharded feeds are merged from the authors' shards on read.
+        if not sharding_enabled():
+            # The author's own timeline gets the post in its transaction;
+            # followers' once it commits, as workers can't see it before.
+            TimelineEntry.objects.db_manager(using).create(
+                owner_id=instance.user_id,
+                post=instance,
+                created_at=instance.created_at,
+            )
+            transaction.on_commit(
+                partial(fan_out_post.delay, instance.id), using=using
+            )
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def bump_post(sender, instance, using, **kwargs) -> None:
+    caching.bump_post(instance.id, instance.user_id, using=using)
+
+
+def bump_auth(user_ids) -> None:
+    """Drop cached authentication of users whose permissions changed"""
+    caching.bump(*map(caching.auth_scope, user_ids))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def bump_auth_user(sender, instance, **kwargs) -> None:
+    bump_auth([instance.pk])
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+def bump_auth_permissions(
+    sender, instance, action, reverse, pk_set, **kwargs
+) -> None:
+    if not reverse:
+        if action.startswith("post_"):
+            bump_auth([instance.pk])
+        return
+
+    # `instance` is a group or permission and `pk_set` holds user ids.
+    if action == "pre_clear":
+        instance._auth_user_ids = set(
+            instance.user_set.values_list("pk", flat=True)
+        )
+    elif action == "post_clear":
+        bump_auth(instance.__dict__.pop("_auth_user_ids", ()))
+    elif action in ("post_add", "post_remove"):
+        bump_auth(pk_set)
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+def bump_group_permissions(
+    sender, instance, action, reverse, pk_set, **kwargs
+) -> None:
+    if reverse and action == "pre_clear":
+        instance._auth_group_ids = set(
+            instance.group_set.values_list("pk", flat=True)
+        )
+        return
+    if not action.startswith("post_"):
+        return
+
+    if not reverse:
+        group_ids = {instance.pk}
+    elif action == "post_clear":
+        group_ids = instance.__dict__.pop("_auth_group_ids", set())
+    else:
+        group_ids = pk_set
+    bump_auth(
+        User.objects.filter(groups__in=group_ids)
+        .values_list("pk", flat=True)
+        .distinct()
+    )
+
+
+@receiver(post_delete, sender=User)
+def delete_sharded_rows(sender, instance, **kwargs) -> None:
+    """Cascade a user's deletion to the shards and the archive, which
+    have no users
+    """
+    for alias in partition_aliases():
+        Comment.objects.using(alias).filter(user=instance.pk).delete()
+        Like.objects.using(alias).filter(user=instance.pk).delete()
+        Post.objects.using(alias).filter(user=instance.pk).delete()
+
+
+@receiver(post_save, sender=User)
+def bump_user(sender, instance, created, **kwargs) -> None:
+    if created:
+        return
+    # Names of a user are embedded in the profiles of their follow graph.
+    related_ids = follow_graph.following_ids(instance.id)
+    related_ids |= follow_graph.follower_ids(instance.id)
+    caching.bump(
+        caching.user_scope(instance.id),
+        caching.author_scope(instance.id),
+        *map(caching.user_scope, related_ids),
+    )
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=User)
+def queue_renditions(sender, instance, using, **kwargs) -> None:
+    field = "media_image" if sender is Post else "image"
+    image = getattr(instance, field)
+    if image and (instance.renditions or {}).get("source") != image.name:
+        transaction.on_commit(
+            partial(
+                generate_renditions.delay,
+                instance._meta.label,
+                instance.pk,
+                field,
+            ),
+            using=using,
+        )
+
+
+@receiver(post_save, sender=Post)
+def index_hashtags(sender, instance, **kwargs) -> None:
+    instance.sync_hashtags()
+
+
+@receiver(pre_delete, sender=Post)
+def release_hashtags(sender, instance, **kwargs) -> None:
+    Hashtag.objects.filter(pk__in=instance.hashtag_ids()).update(
+        posts_count=Greatest(F("posts_count") - 1, 0)
+    )
+
+
+def follow_graph_changed(follower_ids, followed_ids, delta: int) -> None:
+    """Propagate follows (delta=1) or unfollows (delta=-1) between users.
+
+    Keeps stored counters, the cached follow graph and the followers'
+    timelines in line with the follow table. One side is expected to
+    hold a single id.
+    """
+    User.objects.update_follow_counts(follower_ids, followed_ids, delta)
+    follow_graph.invalidate(follower_ids, followed_ids)
+    caching.bump(*map(caching.user_scope, {*follower_ids, *followed_ids}))
+
+    if sharding_enabled():
+        return
+    task = backfill_timeline if delta > 0 else prune_timeline
+    for follower_id in follower_ids:
+        transaction.on_commit(
+            partial(task.delay, follower_id, list(followed_ids))
+        )
+
+
+@receiver(m2m_changed, sender=User.user_follow.through)
+def sync_follows(sender, instance, action, reverse, pk_set, **kwargs) -> None:
+    if action in ("pre_remove", "pre_clear"):
+        # Only rows that exist now are about to be deleted.
+        related = instance.user_followers if reverse else instance.user_follow
+        linked = related.values_list("id", flat=True)
+        if action == "pre_remove":
+            linked = linked.filter(id__in=pk_set)
+        instance._unlinked_follow_ids = set(linked)
+        return
+
+    if action == "post_add":
+        linked, delta = pk_set, 1
+    elif action in ("post_remove", "post_clear"):
+        linked = instance.__dict__.pop("_unlinked_follow_ids", set())
+        delta = -1
+    else:
+        return
+
+    if linked:
+        if reverse:
+            follow_graph_changed(linked, {instance.id}, delta)
+        else:
+            follow_graph_changed({instance.id}, linked, delta)
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, **kwargs) -> None:
+    if created:
+        update_post_counter(instance, "comments_count", 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs) -> None:
+    update_post_counter(instance, "comments_count", -1)
+
+
+@receiver(post_save, sender=Like)
+def count_new_like(sender, instance, created, **kwargs) -> None:
+    if created and instance.is_liked:
+        update_post_counter(instance, "likes_count", 1)
+
+
+@receiver(post_delete, sender=Like)
+def count_deleted_like(sender, instance, **kwargs) -> None:
+    if instance.is_liked:
+        update_post_counter(instance, "likes_count", -1)
@@ -1,7 +1,27 @@
-from user.models import Post, User
+from collections import Counter
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+
+from user import caching
+from user.caching import bump_posts
+from user.follow_graph import follower_ids
+from user.like_buffer import get_buffer
+from user.models import Like, Post, User, TimelineEntry
+from user.renditions import delete_renditions, make_renditions
+from user.sharding import move_posts, shard_of_post
 
 from celery import shared_task
 
+TIMELINE_BATCH_SIZE = 1000
+LIKE_BUFFER_FLUSH_SIZE = 5000
+TOKEN_CLEANUP_BATCH_SIZE = 1000
+ARCHIVE_BATCH_SIZE = 500
+
 
 @shared_task
 def create_post(user_id: int) -> int:
@@ -9,4 +29,181 @@ def create_post(user_id: int) -> int:
     text = f"New post from user: {user.username}"
     hashtag = "celery"
     Post.objects.create(user=user, text=text, hashtag=hashtag)
-    return Post.objects.count()
+    return sum(posts.count() for posts in Post.objects.all().per_shard())
+
+
+@shared_task
+def fan_out_post(post_id: int) -> int:
+    """Push a new post into the timelines of its author and followers"""
+    post = Post.objects.filter(id=post_id).only("user", "created_at").first()
+    if post is None:
+        return 0
+
+    owner_ids = [post.user_id, *follower_ids(post.user_id)]
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(
+                owner_id=owner_id, post_id=post.id, created_at=post.created_at
+            )
+            for owner_id in owner_ids
+        ],
+        batch_size=TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    # Feeds cached since the post was saved don't have it yet.
+    caching.bump(*map(caching.user_scope, owner_ids))
+    return len(owner_ids)
+
+
+@shared_task
+def backfill_timeline(follower_id: int, followed_ids: list[int]) -> int:
+    """Copy existing posts of newly followed users into follower's timeline"""
+    posts = Post.objects.filter(user__in=followed_ids).values_list(
+        "id", "created_at"
+    )
+    entries = [
+        TimelineEntry(
+            owner_id=follower_id, post_id=post_id, created_at=created_at
+        )
+        for post_id, created_at in posts
+    ]
+    TimelineEntry.objects.bulk_create(
+        entries, batch_size=TIMELINE_BATCH_SIZE, ignore_conflicts=True
+    )
+    caching.bump(caching.user_scope(follower_id))
+    return len(entries)
+
+
+@shared_task
+def prune_timeline(follower_id: int, followed_ids: list[int]) -> int:
+    """Drop posts of unfollowed users from follower's timeline"""
+    deleted, _ = TimelineEntry.objects.filter(
+        owner=follower_id, post__user__in=followed_ids
+    ).delete()
+    caching.bump(caching.user_scope(follower_id))
+    return deleted
+
+
+@shared_task
+def flush_like_buffer(limit: int = LIKE_BUFFER_FLUSH_SIZE) -> int:
+    """Apply buffered like states in bulk and shift the like counters"""
+    buffer = get_buffer()
+    pending = buffer.drain(limit)
+    if not pending:
+        return 0
+
+    post_ids = {post_id for states in pending.values() for post_id in states}
+    authors = {}
+    shard_post_ids = {}
+    for posts in Post.objects.filter(id__in=post_ids).per_shard():
+        shard_authors = dict(posts.values_list("id", "user"))
+        authors.update(shard_authors)
+        shard_post_ids[posts.db] = set(shard_authors)
+    user_ids = set(
+        User.objects.filter(id__in=pending).values_list("id", flat=True)
+    )
+    deltas = Counter()
+    try:
+        # One transaction per shard. Should a later one fail, released
+        # states are set again by an idempotent upsert, with no new delta.
+        for db, db_post_ids in shard_post_ids.items():
+            db_deltas = Counter()
+            with transaction.atomic(using=db):
+                for user_id, states in pending.items():
+                    states = {
+                        post_id: is_liked
+                        for post_id, is_liked in states.items()
+                        if post_id in db_post_ids
+                    }
+                    if user_id in user_ids and states:
+                        db_deltas.update(
+                            Like.objects.db_manager(db).set_many(
+                                user_id, states
+                            )
+                        )
+                Post.objects.db_manager(db).shift_counters(
+                    "likes_count", db_deltas
+                )
+            deltas.update(db_deltas)
+    except Exception:
+        # Leave drained states to the next run instead of losing them.
+        buffer.release(pending)
+        raise
+    buffer.ack(pending)
+
+    bump_posts(
+        {
+            post_id: authors[post_id]
+            for post_id, delta in deltas.items()
+            if delta
+        }
+    )
+    return sum(map(len, pending.values()))
+
+
+@shared_task
+def generate_renditions(model_label: str, pk: int, field: str) -> bool:
+    """Render resized copies of an uploaded image and record them"""
+    model = apps.get_model(model_label)
+    objects = model.objects
+    if model is Post:
+        objects = objects.db_manager(shard_of_post(pk))
+    instance = objects.filter(pk=pk).first()
+    if instance is None or not getattr(instance, field):
+        return False
+
+    name = getattr(instance, field).name
+    renditions = make_renditions(name)
+    # Only record them if the image was not replaced in the meantime.
+    updated = objects.filter(pk=pk, **{field: name}).update(
+        renditions=renditions
+    )
+    if not updated:
+        delete_renditions(renditions)
+        return False
+
+    delete_renditions(instance.renditions)
+    if model is Post:
+        caching.bump_post(pk, instance.user_id)
+    else:
+        caching.bump(caching.user_scope(pk))
+    return True
+
+
+@shared_task
+def flush_expired_tokens(batch_size: int = TOKEN_CLEANUP_BATCH_SIZE) -> int:
+    """Delete expired outstanding and blacklisted tokens in small batches"""
+    expired = OutstandingToken.objects.filter(expires_at__lt=timezone.now())
+    deleted = 0
+    while True:
+        # One short transaction per batch keeps the write lock brief.
+        with transaction.atomic():
+            ids = list(expired.values_list("id", flat=True)[:batch_size])
+            if not ids:
+                return deleted
+            OutstandingToken.objects.filter(id__in=ids).delete()
+        deleted += len(ids)
+
+
+@shared_task
+def archive_old_posts(batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """Move posts older than POST_ARCHIVE_AFTER_DAYS, with their comments
+    and likes, to the archive database in batches
+    """
+    archive = settings.POST_ARCHIVE_DATABASE
+    if archive is None:
+        return 0
+
+    cutoff = timezone.now() - timedelta(days=settings.POST_ARCHIVE_AFTER_DAYS)
+    archived = 0
+    for posts in Post.objects.filter(created_at__lt=cutoff).per_shard():
+        source = posts.db
+        while True:
+            batch = list(posts.order_by("created_at", "id")[:batch_size])
+            if not batch:
+                break
+            # Each batch commits on its own, keeping write locks brief.
+            move_posts(batch, source, archive)
+            bump_posts({post.id: post.user_id for post in batch})
+            archived += len(batch)
+    return archived
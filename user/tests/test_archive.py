@@ -0,0 +1,175 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from user.models import Comment, Hashtag, Like, Post
+from user.sharding import shard_for
+from user.tasks import archive_old_posts
+
+ARCHIVE = "archive"
+SHARDS = ["shard1", "shard2"]
+POST_URL = reverse("user:post-list")
+
+
+def detail_url(post_id) -> str:
+    return reverse("user:post-detail", args=[post_id])
+
+
+@override_settings(POST_ARCHIVE_DATABASE=ARCHIVE, POST_ARCHIVE_AFTER_DAYS=30)
+class ArchiveTests(TestCase):
+    databases = {"default", ARCHIVE, *SHARDS}
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user, self.author = [
+            get_user_model().objects.create_user(
+                email=f"{name}@test.com",
+                password="user1234",
+                username=name,
+            )
+            for name in ("user", "author")
+        ]
+        self.user.user_follow.add(self.author)
+        self.client.force_authenticate(self.user)
+
+    def create_posts(self) -> None:
+        with self.captureOnCommitCallbacks(execute=True):
+            self.old_posts = [
+                Post.objects.create(user=self.author, text=f"old {i}")
+                for i in range(3)
+            ]
+            self.new_post = Post.objects.create(user=self.author, text="new")
+        old_ids = [post.id for post in self.old_posts]
+        for posts in Post.objects.filter(pk__in=old_ids).per_shard():
+            posts.update(created_at=timezone.now() - timedelta(days=60))
+        self.old_post = self.old_posts[0]
+        Comment.objects.create(
+            post=self.old_post, user=self.user, text="comment"
+        )
+        Like.objects.create(post=self.old_post, user=self.user, is_liked=True)
+
+    def test_archive_moves_old_posts_in_batches(self) -> None:
+        self.create_posts()
+
+        archived = archive_old_posts(batch_size=2)
+
+        self.assertEqual(archived, 3)
+        self.assertCountEqual(
+            Post.objects.using(ARCHIVE).values_list("id", flat=True),
+            [post.id for post in self.old_posts],
+        )
+        self.assertEqual(list(Post.objects.all()), [self.new_post])
+        self.assertEqual(Comment.objects.using(ARCHIVE).count(), 1)
+        self.assertEqual(Like.objects.using(ARCHIVE).count(), 1)
+        self.assertFalse(Comment.objects.exists())
+        self.assertFalse(Like.objects.exists())
+        self.assertEqual(archive_old_posts(), 0)
+
+    def test_feed_lists_only_hot_posts(self) -> None:
+        self.create_posts()
+        self.client.get(POST_URL)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            archive_old_posts()
+        response = self.client.get(POST_URL)
+
+        self.assertEqual(
+            [post["id"] for post in response.data["results"]],
+            [self.new_post.id],
+        )
+
+    def test_detail_falls_back_to_archive(self) -> None:
+        self.create_posts()
+        archive_old_posts()
+
+        response = self.client.get(detail_url(self.old_post.id))
+        comments = self.client.get(detail_url(self.old_post.id) + "comments/")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["comments"], ["comment"])
+        self.assertEqual(response.data["likes_count"], 1)
+        self.assertEqual(
+            [comment["text"] for comment in comments.data["results"]],
+            ["comment"],
+        )
+
+    def test_archived_posts_of_unfollowed_users_are_hidden(self) -> None:
+        self.create_posts()
+        archive_old_posts()
+        self.user.user_follow.remove(self.author)
+
+        response = self.client.get(detail_url(self.old_post.id))
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_archived_posts_are_read_only(self) -> None:
+        self.create_posts()
+        archive_old_posts()
+
+        response = self.client.post(detail_url(self.old_post.id) + "like/")
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(Like.objects.using(ARCHIVE).count(), 1)
+
+    def test_creator_can_edit_and_delete_archived_posts(self) -> None:
+        self.create_posts()
+        self.old_post.text = "old #news"
+        self.old_post.save()
+        archive_old_posts()
+        self.client.force_authenticate(self.author)
+
+        response1 = self.client.patch(
+            detail_url(self.old_post.id), {"text": "edited #news"}
+        )
+        response2 = self.client.delete(detail_url(self.old_post.id))
+
+        self.assertEqual(response1.status_code, status.HTTP_200_OK)
+        self.assertEqual(response2.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(Hashtag.objects.get(name="news").posts_count, 0)
+        self.assertFalse(
+            Post.objects.using(ARCHIVE).filter(pk=self.old_post.pk).exists()
+        )
+        for model in (Comment, Like):
+            rows = model.objects.using(ARCHIVE).filter(post=self.old_post)
+            self.assertFalse(rows.exists())
+
+    def test_archive_moves_posts_off_shards(self) -> None:
+        with self.settings(DATABASE_SHARDS=SHARDS):
+            self.create_posts()
+            shard = shard_for(self.author.id)
+
+            archived = archive_old_posts()
+            response = self.client.get(detail_url(self.old_post.id))
+
+            self.assertEqual(archived, 3)
+            self.assertEqual(
+                list(Post.objects.using(shard).values_list("id", flat=True)),
+                [self.new_post.id],
+            )
+            self.assertEqual(Comment.objects.using(ARCHIVE).count(), 1)
+            self.assertEqual(response.data["comments"], ["comment"])
+
+    def test_deleting_a_user_deletes_their_archived_rows(self) -> None:
+        self.create_posts()
+        archive_old_posts()
+
+        self.user.delete()
+        archived_posts = Post.objects.using(ARCHIVE).count()
+        self.author.delete()
+
+        self.assertEqual(archived_posts, 3)
+        self.assertFalse(Comment.objects.using(ARCHIVE).exists())
+        self.assertFalse(Like.objects.using(ARCHIVE).exists())
+        self.assertFalse(Post.objects.using(ARCHIVE).exists())
+
+    @override_settings(POST_ARCHIVE_DATABASE=None)
+    def test_archiving_is_off_without_archive_database(self) -> None:
+        self.create_posts()
+
+        self.assertEqual(archive_old_posts(), 0)
+        self.assertEqual(Post.objects.count(), 4)
@@ -0,0 +1,118 @@
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.test import AsyncRequestFactory, TestCase
+from rest_framework import status
+from rest_framework_simplejwt.tokens import AccessToken
+
+from user.async_views import as_async_view
+from user.models import Like, Post
+from user.throttling import UserRateThrottle
+from user.views import LikeList, PostViewSet, UserViewSet
+
+post_list = as_async_view(
+    PostViewSet,
+    {"get": "list", "post": "create"},
+    basename="post",
+    detail=False,
+)
+post_detail = as_async_view(
+    PostViewSet, {"get": "retrieve"}, basename="post", detail=True
+)
+user_detail = as_async_view(
+    UserViewSet, {"get": "retrieve"}, basename="user", detail=True
+)
+liked_posts = as_async_view(LikeList)
+
+
+def call(view, request, **kwargs):
+    return async_to_sync(view)(request, **kwargs)
+
+
+class AsyncReadViewTests(TestCase):
+    def setUp(self) -> None:
+        self.factory = AsyncRequestFactory()
+        self.user = get_user_model().objects.create_user(
+            email="user@test.com",
+            password="user1234",
+            username="user_username",
+            first_name="user_first_name",
+            last_name="user_last_name",
+        )
+        self.headers = {
+            "authorization": f"Bearer {AccessToken.for_user(self.user)}"
+        }
+        self.post = Post.objects.create(user=self.user, text="text")
+
+    def get(self, path: str, **headers):
+        return self.factory.get(path, headers={**self.headers, **headers})
+
+    def test_post_detail_served_from_cache(self) -> None:
+        path = f"/api/user/posts/{self.post.id}/"
+        pk = str(self.post.id)
+
+        response1 = call(post_detail, self.get(path), pk=pk)
+        response2 = call(post_detail, self.get(path), pk=pk)
+        with self.assertNumQueries(0):
+            response3 = call(post_detail, self.get(path), pk=pk)
+            response4 = call(
+                post_detail,
+                self.get(path, if_none_match=response3["ETag"]),
+                pk=pk,
+            )
+
+        self.assertEqual(response1.status_code, status.HTTP_200_OK)
+        self.assertEqual(response1.data["text"], "text")
+        self.assertEqual(response2.data, response1.data)
+        self.assertEqual(response3.content, response2.content)
+        self.assertEqual(response4.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_feed_and_profile(self) -> None:
+        response1 = call(post_list, self.get("/api/user/posts/"))
+        response2 = call(
+            user_detail,
+            self.get(f"/api/user/users/{self.user.id}/"),
+            pk=str(self.user.id),
+        )
+
+        self.assertEqual(response1.data["count"], 1)
+        self.assertEqual(response2.data["username"], "user_username")
+
+    def test_liked_posts_use_async_orm(self) -> None:
+        Like.objects.create(user=self.user, post=self.post, is_liked=True)
+        call(post_list, self.get("/api/user/posts/"))
+
+        with self.assertNumQueries(1):
+            response = call(liked_posts, self.get("/api/user/liked-posts/"))
+
+        self.assertEqual(
+            [like["post"]["id"] for like in response.data], [self.post.id]
+        )
+
+    def test_unauthenticated_request_rejected(self) -> None:
+        response = call(post_list, self.factory.get("/api/user/posts/"))
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_read_path_is_throttled(self) -> None:
+        with mock.patch.dict(
+            UserRateThrottle.THROTTLE_RATES, {"user": "1/min"}
+        ):
+            response1 = call(post_list, self.get("/api/user/posts/"))
+            response2 = call(post_list, self.get("/api/user/posts/"))
+
+        self.assertEqual(response1.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response2.status_code, status.HTTP_429_TOO_MANY_REQUESTS
+        )
+
+    def test_writes_use_sync_view(self) -> None:
+        request = self.factory.post(
+            "/api/user/posts/", {"text": "new"}, headers=self.headers
+        )
+
+        response = call(post_list, request)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(Post.objects.filter(text="new").exists())
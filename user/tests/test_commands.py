@@ -0,0 +1,101 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from user.models import Post, Comment, Like
+
+
+class ReconcileCountersTests(TestCase):
+    def setUp(self) -> None:
+        self.user = get_user_model().objects.create_user(
+            email="user@test.com",
+            password="user1234",
+            username="user_username",
+            first_name="user_first_name",
+            last_name="user_last_name",
+        )
+        self.post = Post.objects.create(text="post", user=self.user)
+
+    def test_counters_follow_likes_and_comments(self) -> None:
+        like = Like.objects.create(
+            post=self.post, user=self.user, is_liked=True
+        )
+        comment = Comment.objects.create(
+            post=self.post, user=self.user, text="comment"
+        )
+        self.post.refresh_from_db()
+        self.assertEqual(
+            (self.post.likes_count, self.post.comments_count), (1, 1)
+        )
+
+        like.delete()
+        comment.delete()
+        self.post.refresh_from_db()
+        self.assertEqual(
+            (self.post.likes_count, self.post.comments_count), (0, 0)
+        )
+
+    def test_reconcile_repairs_drift(self) -> None:
+        Like.objects.create(post=self.post, user=self.user, is_liked=True)
+        Post.objects.filter(pk=self.post.pk).update(
+            likes_count=7, comments_count=3
+        )
+        out = StringIO()
+
+        call_command("reconcile_counters", batch_size=1, stdout=out)
+
+        self.post.refresh_from_db()
+        self.assertEqual(
+            (self.post.likes_count, self.post.comments_count), (1, 0)
+        )
+        self.assertIn("Repaired 1 posts, 0 users", out.getvalue())
+
+    def test_reconcile_repairs_follow_counters(self) -> None:
+        other = get_user_model().objects.create_user(
+            email="other@test.com", password="other1234", username="other"
+        )
+        self.user.user_follow.add(other)
+        get_user_model().objects.update(followers_count=5, following_count=5)
+
+        call_command("reconcile_counters", stdout=StringIO())
+
+        counts = get_user_model().objects.with_follow_counts().values_list(
+            "followers_count",
+            "following_count",
+            "live_followers_count",
+            "live_following_count",
+        )
+        self.assertCountEqual(counts, [(0, 1, 0, 1), (1, 0, 1, 0)])
+
+
+class FollowCountersTests(TestCase):
+    def setUp(self) -> None:
+        self.users = [
+            get_user_model().objects.create_user(
+                email=f"user{i}@test.com",
+                password="user1234",
+                username=f"user{i}",
+            )
+            for i in range(3)
+        ]
+
+    def counts(self) -> list:
+        return [
+            (user.followers_count, user.following_count)
+            for user in get_user_model().objects.order_by("id")
+        ]
+
+    def test_follow_and_unfollow_shift_counters(self) -> None:
+        first, second, third = self.users
+        first.user_follow.add(second, third)
+        third.user_followers.add(second)
+        self.assertEqual(self.counts(), [(0, 2), (1, 1), (2, 0)])
+
+        first.user_follow.remove(second, second)
+        second.user_follow.remove(first)
+        self.assertEqual(self.counts(), [(0, 1), (0, 1), (2, 0)])
+
+        third.user_followers.clear()
+        self.assertEqual(self.counts(), [(0, 0), (0, 0), (0, 0)])
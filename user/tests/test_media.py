@@ -0,0 +1,85 @@
+import tempfile
+from pathlib import Path
+
+from django.test import TestCase, override_settings
+from rest_framework import status
+
+HASHED_NAME = "media/uploads/sha256/ab/cd/" + "abcd" * 16 + ".jpg"
+PLAIN_NAME = "media/uploads/users/avatar.jpg"
+CONTENT = bytes(range(256)) * 4
+
+
+class MediaServingTests(TestCase):
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        media_settings = override_settings(MEDIA_ROOT=directory.name)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        for name in (HASHED_NAME, PLAIN_NAME):
+            path = Path(directory.name) / name
+            path.parent.mkdir(parents=True)
+            path.write_bytes(CONTENT)
+
+    def test_serves_file_with_validators(self) -> None:
+        response = self.client.get("/media/" + PLAIN_NAME)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(b"".join(response.streaming_content), CONTENT)
+        self.assertEqual(response["Content-Type"], "image/jpeg")
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertIn("no-cache", response["Cache-Control"])
+
+    def test_hashed_names_are_immutable(self) -> None:
+        response = self.client.get("/media/" + HASHED_NAME)
+
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertIn("max-age=31536000", response["Cache-Control"])
+
+    def test_if_none_match_answers_not_modified(self) -> None:
+        etag = self.client.get("/media/" + PLAIN_NAME)["ETag"]
+
+        response = self.client.get(
+            "/media/" + PLAIN_NAME, HTTP_IF_NONE_MATCH=etag
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_range_requests(self) -> None:
+        url = "/media/" + PLAIN_NAME
+
+        response1 = self.client.get(url, HTTP_RANGE="bytes=10-19")
+        response2 = self.client.get(url, HTTP_RANGE="bytes=-4")
+        response3 = self.client.get(url, HTTP_RANGE="bytes=5000-")
+
+        self.assertEqual(response1.status_code, 206)
+        self.assertEqual(response1["Content-Range"], "bytes 10-19/1024")
+        self.assertEqual(
+            b"".join(response1.streaming_content), CONTENT[10:20]
+        )
+        self.assertEqual(b"".join(response2.streaming_content), CONTENT[-4:])
+        self.assertEqual(response3.status_code, 416)
+        self.assertEqual(response3["Content-Range"], "bytes */1024")
+
+    def test_stale_if_range_sends_whole_file(self) -> None:
+        response = self.client.get(
+            "/media/" + PLAIN_NAME,
+            HTTP_RANGE="bytes=0-9",
+            HTTP_IF_RANGE='"stale"',
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    @override_settings(MEDIA_SENDFILE="x-accel-redirect")
+    def test_accel_redirect_offloads_bytes(self) -> None:
+        response = self.client.get("/media/" + HASHED_NAME)
+
+        self.assertEqual(
+            response["X-Accel-Redirect"], "/protected-media/" + HASHED_NAME
+        )
+        self.assertEqual(response.content, b"")
+
+    def test_paths_outside_media_root_not_found(self) -> None:
+        response = self.client.get("/media/../settings.py")
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
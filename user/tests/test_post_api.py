@@ -1,16 +1,32 @@
+import io
+import json
+import tempfile
+from base64 import urlsafe_b64encode
+from pathlib import Path
+from unittest import mock
+
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
 from django.urls import reverse, reverse_lazy
 from rest_framework import status
+from PIL import Image
 from rest_framework.test import APIClient
 
-from user.models import User, Post, Comment, Like
+from user.like_buffer import get_buffer
+from user.models import User, Post, Comment, Like, Hashtag
 from user.serializers import (
     PostListSerializer,
     PostDetailSerializer,
 )
+from user.tasks import fan_out_post, flush_like_buffer
 
 POST_URL = reverse("user:post-list")
+HASHTAG_URL = reverse("user:hashtags")
+SEARCH_URL = reverse("user:post-search")
+BULK_LIKE_URL = reverse("user:post-bulk-like")
+LIKED_POSTS_URL = reverse("user:liked-posts")
 
 
 def test_user(**params) -> User:
@@ -101,7 +117,8 @@ class AuthenticatedUserApiTests(TestCase):
         new_user = test_user(username="spider")
         new_user.user_followers.add(self.user)
         post1 = test_post(text="post", hashtag="post", user=self.user)
-        post2 = test_post(text="new_post", hashtag="new", user=new_user)
+        with self.captureOnCommitCallbacks(execute=True):
+            post2 = test_post(text="new_post", hashtag="new", user=new_user)
         serializer1 = PostListSerializer(post1)
         serializer2 = PostListSerializer(post2)
 
@@ -137,7 +154,8 @@ class AuthenticatedUserApiTests(TestCase):
     def test_update_someone_post(self) -> None:
         new_user = test_user()
         new_user.user_followers.add(self.user)
-        post = test_post(user=new_user)
+        with self.captureOnCommitCallbacks(execute=True):
+            post = test_post(user=new_user)
         url = detail_url(post.id)
         payload = {"text": "changed text"}
 
@@ -148,7 +166,8 @@ class AuthenticatedUserApiTests(TestCase):
     def test_comment_post(self) -> None:
         new_user = test_user()
         new_user.user_followers.add(self.user)
-        post = test_post(user=new_user)
+        with self.captureOnCommitCallbacks(execute=True):
+            post = test_post(user=new_user)
         test_comment(post=post, user=self.user)
         test_comment(text="another comment", post=post, user=self.user)
         url = detail_url(post.id)
@@ -161,10 +180,51 @@ class AuthenticatedUserApiTests(TestCase):
             response.data["comments"], serializer.data["comments"]
         )
 
+    def test_detail_embeds_newest_comments_only(self) -> None:
+        post = test_post(user=self.user)
+        for i in range(5):
+            test_comment(text=f"comment {i}", post=post, user=self.user)
+
+        response = self.client.get(detail_url(post.id))
+
+        self.assertEqual(response.data["comments_count"], 5)
+        self.assertEqual(
+            response.data["comments"], ["comment 4", "comment 3", "comment 2"]
+        )
+
+    def test_comments_endpoint_pages_newest_first(self) -> None:
+        post = test_post(user=self.user)
+        comments = [
+            test_comment(text=f"comment {i}", post=post, user=self.user)
+            for i in range(5)
+        ]
+        url = detail_url(post.id) + "comments/"
+
+        response1 = self.client.get(url, {"page_size": 2})
+        with self.assertNumQueries(2):
+            response2 = self.client.get(response1.data["next"])
+        response3 = self.client.get(response2.data["next"])
+
+        pages = [response1, response2, response3]
+        ids = [item["id"] for page in pages for item in page.data["results"]]
+        self.assertEqual(ids, [comment.id for comment in reversed(comments)])
+        self.assertEqual(
+            response1.data["results"][0]["user_username"], self.user.username
+        )
+        self.assertIsNone(response3.data["next"])
+
+    def test_comments_of_unseen_post_not_found(self) -> None:
+        post = test_post(user=test_user())
+
+        response = self.client.get(detail_url(post.id) + "comments/")
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
     def test_like_post(self) -> None:
         new_user = test_user()
         new_user.user_followers.add(self.user)
-        post1 = test_post(user=new_user)
+        with self.captureOnCommitCallbacks(execute=True):
+            post1 = test_post(user=new_user)
         post2 = test_post(user=self.user)
         test_like(post=post1, user=new_user)
         test_like(post=post1, user=self.user)
@@ -182,6 +242,460 @@ class AuthenticatedUserApiTests(TestCase):
         self.assertEqual(response1.data["likes_count"], post1_likes)
         self.assertEqual(response2.data["likes_count"], post2_likes)
 
+    def test_feed_includes_posts_of_followed_users_only(self) -> None:
+        followed = test_user(username="followed")
+        stranger = test_user(email="stranger@test.com", username="stranger")
+        self.user.user_follow.add(followed)
+        with self.captureOnCommitCallbacks(execute=True):
+            post1 = test_post(user=followed)
+            post2 = test_post(user=stranger)
+
+        response = self.client.get(POST_URL)
+
+        ids = [post["id"] for post in response.data["results"]]
+        self.assertIn(post1.id, ids)
+        self.assertNotIn(post2.id, ids)
+
+    def test_follow_backfills_and_unfollow_prunes_feed(self) -> None:
+        followed = test_user(username="followed")
+        post = test_post(user=followed)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.user_follow.add(followed)
+        response1 = self.client.get(POST_URL)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.user_follow.remove(followed)
+        response2 = self.client.get(POST_URL)
+
+        self.assertEqual(response1.data["results"][0]["id"], post.id)
+        self.assertEqual(response2.data["results"], [])
+
+    def test_cursor_pagination_walks_feed(self) -> None:
+        posts = [test_post(text=f"post {i}", user=self.user) for i in range(5)]
+        expected = [post.id for post in reversed(posts)]
+
+        response1 = self.client.get(POST_URL, {"cursor": "", "page_size": 2})
+        response2 = self.client.get(response1.data["next"])
+        response3 = self.client.get(response2.data["next"])
+        response4 = self.client.get(response3.data["previous"])
+
+        self.assertNotIn("count", response1.data)
+        self.assertIsNone(response1.data["previous"])
+        self.assertIsNone(response3.data["next"])
+        pages = [response1, response2, response3]
+        ids = [post["id"] for page in pages for post in page.data["results"]]
+        self.assertEqual(ids, expected)
+        self.assertEqual(response4.data["results"], response2.data["results"])
+
+    def test_invalid_cursor(self) -> None:
+        response = self.client.get(POST_URL, {"cursor": "not-a-cursor"})
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_cursor_values_must_match_ordering_fields(self) -> None:
+        test_post(user=self.user)
+        payloads = [
+            {"v": [{"a": 1}, 1]},
+            {"v": ["2023-01-01T00:00:00+00:00", [1]]},
+            {"v": ["not-a-date", 1]},
+            {"v": ["2023-01-01T00:00:00+00:00", 2**70]},
+            {"v": ["2023-01-01T00:00:00+00:00", True]},
+        ]
+
+        for payload in payloads:
+            cursor = urlsafe_b64encode(json.dumps(payload).encode())
+            response = self.client.get(
+                POST_URL, {"cursor": cursor.decode("ascii")}
+            )
+
+            self.assertEqual(
+                response.status_code, status.HTTP_404_NOT_FOUND, payload
+            )
+
+    def test_like_action_toggles_counter(self) -> None:
+        post = test_post(user=self.user)
+        url = detail_url(post.id) + "like/"
+
+        self.client.post(url)
+        post.refresh_from_db()
+        likes_after_like = post.likes_count
+        self.client.post(url)
+        post.refresh_from_db()
+
+        self.assertEqual(likes_after_like, 1)
+        self.assertEqual(post.likes_count, 0)
+        self.assertFalse(Like.objects.get(post=post).is_liked)
+
+    def test_like_toggle_is_single_upsert(self) -> None:
+        post = test_post(user=self.user)
+
+        with self.assertNumQueries(1):
+            is_liked1 = Like.objects.toggle(post.id, self.user.id)
+        is_liked2 = Like.objects.toggle(post.id, self.user.id)
+        is_liked3 = Like.objects.toggle(post.id, self.user.id)
+
+        self.assertEqual(
+            [is_liked1, is_liked2, is_liked3], [True, False, True]
+        )
+        self.assertEqual(Like.objects.filter(post=post).count(), 1)
+
+    def test_bulk_like_applies_states_and_counters(self) -> None:
+        stranger = test_user()
+        post1 = test_post(user=self.user)
+        post2 = test_post(user=self.user)
+        post3 = test_post(user=self.user)
+        unseen = test_post(user=stranger)
+        test_like(post=post2, user=self.user)
+        test_like(post=post2, user=stranger)
+        payload = {
+            "likes": [
+                {"post": post1.id, "is_liked": True},
+                {"post": post2.id, "is_liked": False},
+                {"post": post3.id, "is_liked": False},
+                {"post": unseen.id, "is_liked": True},
+            ]
+        }
+
+        response = self.client.post(BULK_LIKE_URL, payload, format="json")
+        counts = dict(Post.objects.values_list("id", "likes_count"))
+
+        self.assertEqual(
+            response.data["applied"], [post1.id, post2.id, post3.id]
+        )
+        self.assertEqual(counts[post1.id], 1)
+        self.assertEqual(counts[post2.id], 1)
+        self.assertEqual(counts[post3.id], 0)
+        self.assertEqual(counts[unseen.id], 0)
+        self.assertFalse(
+            Like.objects.get(post=post2, user=self.user).is_liked
+        )
+
+    def test_bulk_like_rejects_oversized_batch(self) -> None:
+        payload = {
+            "likes": [{"post": i, "is_liked": True} for i in range(1, 102)]
+        }
+
+        response = self.client.post(BULK_LIKE_URL, payload, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_hashtags_extracted_from_text_and_field(self) -> None:
+        post = test_post(
+            text="Hot #Summer day #sun", hashtag="Beach", user=self.user
+        )
+
+        response = self.client.get(POST_URL, {"hashtag": "#SUMMER"})
+
+        self.assertEqual(
+            set(post.tags.values_list("name", flat=True)),
+            {"beach", "summer", "sun"},
+        )
+        self.assertEqual(response.data["results"][0]["id"], post.id)
+
+    def test_hashtag_counts_follow_edits_and_deletes(self) -> None:
+        post = test_post(text="#sun", hashtag="beach", user=self.user)
+        test_post(text="#sun again", user=self.user)
+
+        post.hashtag = ""
+        post.save()
+        counts1 = dict(Hashtag.objects.values_list("name", "posts_count"))
+        post.delete()
+        counts2 = dict(Hashtag.objects.values_list("name", "posts_count"))
+
+        self.assertEqual(counts1, {"beach": 0, "sun": 2})
+        self.assertEqual(counts2, {"beach": 0, "sun": 1})
+
+    def test_hashtag_autocomplete_by_prefix(self) -> None:
+        test_post(text="#sunset #sun #moon", user=self.user)
+        test_post(text="#sun", user=self.user)
+
+        response = self.client.get(HASHTAG_URL, {"q": "SU"})
+
+        self.assertEqual(
+            [tag["name"] for tag in response.data["results"]],
+            ["sun", "sunset"],
+        )
+
+    def test_search_ranks_matches_in_feed(self) -> None:
+        stranger = test_user(username="stranger")
+        post1 = test_post(text="Sunny day at the beach", user=self.user)
+        post2 = test_post(text="Sunset", hashtag="sunny", user=self.user)
+        test_post(text="Rainy day", user=self.user)
+        test_post(text="Sunny too", user=stranger)
+
+        response = self.client.get(SEARCH_URL, {"q": "sunn"})
+
+        self.assertEqual(
+            [post["id"] for post in response.data], [post2.id, post1.id]
+        )
+
+    def test_search_follows_post_edits(self) -> None:
+        post = test_post(text="old words", user=self.user)
+        post.text = "new words"
+        post.save()
+
+        response1 = self.client.get(SEARCH_URL, {"q": "old"})
+        response2 = self.client.get(SEARCH_URL, {"q": "new"})
+
+        self.assertEqual(response1.data, [])
+        self.assertEqual(response2.data[0]["id"], post.id)
+
+    def test_unchanged_feed_answers_not_modified(self) -> None:
+        test_post(user=self.user)
+        etag = self.client.get(POST_URL)["ETag"]
+
+        with self.assertNumQueries(0):
+            response = self.client.get(POST_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response["ETag"], etag)
+
+    def test_feed_etag_changes_after_writes(self) -> None:
+        followed = test_user(username="followed")
+        post = test_post(user=self.user)
+        self.user.user_follow.add(followed)
+        etag1 = self.client.get(POST_URL)["ETag"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(detail_url(post.id) + "like/")
+        etag2 = self.client.get(POST_URL)["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            test_post(user=followed)
+        response = self.client.get(POST_URL, HTTP_IF_NONE_MATCH=etag2)
+
+        self.assertNotEqual(etag1, etag2)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["count"], 2)
+
+    def test_feed_refreshed_once_post_is_fanned_out(self) -> None:
+        followed = test_user(username="followed")
+        self.user.user_follow.add(followed)
+        with mock.patch("user.signals.fan_out_post"):
+            with self.captureOnCommitCallbacks(execute=True):
+                post = test_post(user=followed)
+        response1 = self.client.get(POST_URL)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            fan_out_post(post.id)
+        response2 = self.client.get(POST_URL)
+
+        self.assertEqual(response1.data["results"], [])
+        self.assertEqual(response2.data["results"][0]["id"], post.id)
+
+    def test_fan_out_queued_on_commit(self) -> None:
+        with mock.patch("user.signals.fan_out_post") as task:
+            with self.captureOnCommitCallbacks() as callbacks:
+                post = test_post(user=self.user)
+            task.delay.assert_not_called()
+            for callback in callbacks:
+                callback()
+
+        task.delay.assert_called_once_with(post.id)
+        self.assertEqual(self.client.get(POST_URL).data["count"], 1)
+
+    def test_retrieve_post_served_from_cache(self) -> None:
+        post = test_post(user=self.user)
+        self.client.get(detail_url(post.id))
+
+        with self.assertNumQueries(0):
+            response1 = self.client.get(detail_url(post.id))
+        with self.captureOnCommitCallbacks(execute=True):
+            test_comment(post=post, user=self.user)
+        response2 = self.client.get(detail_url(post.id))
+
+        self.assertEqual(response1.data["id"], post.id)
+        self.assertNotEqual(response1["ETag"], response2["ETag"])
+
+    def test_post_version_bumped_on_commit(self) -> None:
+        post = test_post(user=self.user)
+        etag1 = self.client.get(detail_url(post.id))["ETag"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            test_comment(post=post, user=self.user)
+            etag2 = self.client.get(detail_url(post.id))["ETag"]
+        etag3 = self.client.get(detail_url(post.id))["ETag"]
+
+        self.assertEqual(etag1, etag2)
+        self.assertNotEqual(etag2, etag3)
+
+
+class BufferedLikeApiTests(TestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = test_user()
+        self.client.force_authenticate(self.user)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        buffer_settings = override_settings(
+            LIKE_BUFFER_ENABLED=True,
+            LIKE_BUFFER_PATH=Path(directory.name) / "likes.sqlite3",
+            REDIS_URL=None,
+        )
+        buffer_settings.enable()
+        self.addCleanup(buffer_settings.disable)
+
+    def test_likes_are_buffered_until_flush(self) -> None:
+        post1 = test_post(user=self.user)
+        post2 = test_post(user=self.user)
+        test_like(post=post2, user=self.user)
+
+        self.client.post(detail_url(post1.id) + "like/")
+        self.client.post(detail_url(post1.id) + "like/")
+        response = self.client.post(detail_url(post1.id) + "like/")
+        self.client.post(detail_url(post2.id) + "like/")
+        rows_before_flush = Like.objects.filter(post=post1).count()
+        flushed = flush_like_buffer()
+        post1.refresh_from_db()
+        post2.refresh_from_db()
+
+        self.assertTrue(response.data["is_liked"])
+        self.assertEqual(rows_before_flush, 0)
+        self.assertEqual(flushed, 2)
+        self.assertEqual(post1.likes_count, 1)
+        self.assertEqual(post2.likes_count, 0)
+        self.assertEqual(flush_like_buffer(), 0)
+
+    def test_failed_flush_keeps_newer_likes(self) -> None:
+        post = test_post(user=self.user)
+        self.client.post(detail_url(post.id) + "like/")
+
+        def unlike_and_fail(*args, **kwargs):
+            self.client.post(
+                BULK_LIKE_URL,
+                {"likes": [{"post": post.id, "is_liked": False}]},
+                format="json",
+            )
+            raise RuntimeError
+
+        with mock.patch.object(
+            type(Post.objects), "shift_counters", side_effect=unlike_and_fail
+        ):
+            with self.assertRaises(RuntimeError):
+                flush_like_buffer()
+
+        self.assertEqual(get_buffer().pending(self.user.id), {post.id: False})
+
+    def test_likes_stay_pending_while_flushing(self) -> None:
+        post = test_post(user=self.user)
+        self.client.post(detail_url(post.id) + "like/")
+        set_many = type(Like.objects).set_many
+        responses = []
+
+        # Before the flush writes the likes, as other connections see it.
+        def unlike_during_flush(manager, *args):
+            like_url = detail_url(post.id) + "like/"
+            responses.append(self.client.get(LIKED_POSTS_URL))
+            responses.append(self.client.post(like_url))
+            return set_many(manager, *args)
+
+        with mock.patch.object(
+            type(Like.objects),
+            "set_many",
+            autospec=True,
+            side_effect=unlike_during_flush,
+        ):
+            flush_like_buffer()
+        pending = get_buffer().pending(self.user.id)
+        flush_like_buffer()
+        post.refresh_from_db()
+
+        liked, unliked = responses
+        self.assertEqual(
+            [like["post"]["id"] for like in liked.data], [post.id]
+        )
+        self.assertFalse(unliked.data["is_liked"])
+        self.assertEqual(pending, {post.id: False})
+        self.assertEqual(post.likes_count, 0)
+        self.assertEqual(get_buffer().pending(self.user.id), {})
+
+    def test_liked_posts_reflect_pending_likes(self) -> None:
+        post1 = test_post(user=self.user)
+        post2 = test_post(user=self.user)
+        test_like(post=post2, user=self.user)
+
+        self.client.post(
+            BULK_LIKE_URL,
+            {
+                "likes": [
+                    {"post": post1.id, "is_liked": True},
+                    {"post": post2.id, "is_liked": False},
+                ]
+            },
+            format="json",
+        )
+        response = self.client.get(LIKED_POSTS_URL)
+
+        self.assertEqual(
+            [like["post"]["id"] for like in response.data], [post1.id]
+        )
+
+
+def test_image(size=(1200, 800), orientation=None) -> SimpleUploadedFile:
+    image = Image.new("RGB", size, "red")
+    exif = Image.Exif()
+    exif[0x010F] = "PhoneMaker"
+    if orientation:
+        exif[0x0112] = orientation
+    output = io.BytesIO()
+    image.save(output, "JPEG", exif=exif)
+    return SimpleUploadedFile(
+        "photo.jpg", output.getvalue(), content_type="image/jpeg"
+    )
+
+
+class PostImageRenditionTests(TestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = test_user()
+        self.client.force_authenticate(self.user)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        media_settings = override_settings(MEDIA_ROOT=directory.name)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+    def test_upload_generates_renditions(self) -> None:
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                POST_URL,
+                {"text": "photo", "media_image": test_image()},
+                format="multipart",
+            )
+
+        post = Post.objects.get()
+        response = self.client.get(POST_URL)
+
+        renditions = response.data["results"][0]["renditions"]
+        self.assertEqual(post.renditions["source"], post.media_image.name)
+        self.assertEqual(
+            (renditions["thumbnail"]["width"], renditions["feed"]["width"]),
+            (160, 640),
+        )
+        self.assertEqual(renditions["full"]["width"], 1200)
+        self.assertTrue(renditions["feed"]["webp"].endswith("-feed.webp"))
+        self.assertTrue(renditions["feed"]["jpeg"].startswith("http"))
+
+    def test_renditions_are_upright_and_strip_exif(self) -> None:
+        with self.captureOnCommitCallbacks(execute=True):
+            post = test_post(
+                user=self.user, media_image=test_image(orientation=6)
+            )
+        post.refresh_from_db()
+
+        with default_storage.open(post.renditions["feed"]["jpg"]) as file:
+            image = Image.open(file)
+            image.load()
+
+        self.assertEqual(image.size, (427, 640))
+        self.assertEqual(len(image.getexif()), 0)
+
+    def test_post_without_image_has_no_renditions(self) -> None:
+        test_post(user=self.user)
+
+        response = self.client.get(POST_URL)
+
+        self.assertIsNone(response.data["results"][0]["renditions"])
+
 
 class AdminMovieSessionApiTest(TestCase):
     def setUp(self) -> None:
@@ -0,0 +1,361 @@
+import json
+import os
+import re
+from pathlib import Path
+from unittest import skipUnless
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import get_resolver, reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from user import token_blacklist
+from user.models import (
+    Comment,
+    Follow,
+    Hashtag,
+    Like,
+    Post,
+    TimelineEntry,
+    Upload,
+)
+
+PASSWORD = "user1234"
+
+# Queries each route may run, whatever the number of rows behind it:
+# (route name, method) -> (object in the url, request data, queries).
+QUERY_BUDGETS = {
+    ("api-root", "get"): (None, None, 0),
+    ("create", "post"): (
+        None,
+        {
+            "email": "new@test.com",
+            "password": PASSWORD,
+            "username": "new",
+            "first_name": "new",
+            "last_name": "new",
+        },
+        3,
+    ),
+    ("token_obtain_pair", "post"): (
+        None,
+        {"email": "viewer@test.com", "password": PASSWORD},
+        2,
+    ),
+    ("token_refresh", "post"): (
+        None,
+        lambda test: {"refresh": str(test.refresh)},
+        2,
+    ),
+    ("manage", "get"): (None, None, 1),
+    ("manage", "patch"): (None, {"bio": "bio"}, 4),
+    ("logout", "post"): (
+        None,
+        lambda test: {"refresh_token": str(test.refresh)},
+        7,
+    ),
+    ("liked-posts", "get"): (None, None, 1),
+    ("hashtags", "get"): (None, {"q": "su"}, 1),
+    ("post-list", "get"): (None, None, 4),
+    # Fan-out inserts the followers' timeline rows in batches of 333.
+    ("post-list", "post"): (None, {"text": "new #sun"}, {10: 10, 1000: 13}),
+    ("post-detail", "get"): ("post", None, 3),
+    ("post-detail", "patch"): ("post", {"text": "edited #sun"}, 5),
+    ("post-detail", "delete"): ("post", None, 13),
+    ("post-add-comment", "post"): ("post", {"text": "comment"}, 3),
+    ("post-comments", "get"): ("post", None, 2),
+    ("post-like", "post"): ("post", None, 5),
+    ("post-bulk-like", "post"): (
+        None,
+        lambda test: {
+            "likes": [
+                {"post": post_id, "is_liked": False}
+                for post_id in test.post_ids[:5]
+            ]
+        },
+        6,
+    ),
+    ("post-search", "get"): (None, {"q": "sunny"}, 2),
+    ("user-list", "get"): (None, None, 2),
+    ("user-detail", "get"): ("user", None, 3),
+    ("user-follow", "patch"): ("stranger", None, 10),
+    ("user-unfollow", "patch"): ("user", None, 10),
+    ("user-bulk-follow", "post"): (
+        None,
+        lambda test: {"user_ids": [test.stranger.id]},
+        9,
+    ),
+    ("user-bulk-unfollow", "post"): (
+        None,
+        lambda test: {"user_ids": test.user_ids[:5]},
+        8,
+    ),
+    ("user-followers", "get"): ("viewer", None, 2),
+    ("user-following", "get"): ("viewer", None, 2),
+    ("user-search", "get"): (None, {"q": "first"}, 2),
+    ("upload-list", "post"): (None, {"size": 10}, 1),
+    ("upload-detail", "get"): ("upload", None, 1),
+}
+# Plan steps reading a seeded table row by row, which no read may take.
+FULL_SCANS = {
+    f"{step} {model._meta.db_table}"
+    for step in ("SCAN", "SCAN TABLE")
+    for model in (
+        get_user_model(),
+        Follow,
+        Post,
+        Post.tags.through,
+        Comment,
+        Like,
+        TimelineEntry,
+    )
+}
+# Sorting every matching row to return a page defeats keyset pagination.
+TEMP_SORT = "USE TEMP B-TREE FOR ORDER BY"
+PAGINATED = re.compile(r" ORDER BY .+ LIMIT \d+( OFFSET \d+)?$")
+# Routes allowed to sort a page anyway: route name -> why.
+SORTED_PAGES = {
+    "hashtags": "ranks the few hashtags sharing a prefix by popularity",
+}
+# Plans each read route is expected to take, by seeded size. Rewrite
+# them with RECORD_QUERY_PLANS=1 and review the diff.
+QUERY_PLANS_PATH = Path(__file__).with_name("query_plans.json")
+
+
+def explain(sql: str) -> list[str]:
+    """Steps of the plan SQLite picks for `sql`"""
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+        return [row[-1] for row in cursor.fetchall()]
+
+
+class QueryBudgetTests:
+    """
+    Request every route against `size` seeded users, each with a post
+    the viewer follows, likes and comments on, and hold it to its budget
+    """
+
+    size = None
+    # Failures print the offending queries and plans whole.
+    maxDiff = None
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        user_model = get_user_model()
+        cls.viewer = user_model.objects.create_user(
+            email="viewer@test.com",
+            password=PASSWORD,
+            username="viewer",
+            first_name="viewer",
+            last_name="viewer",
+        )
+        cls.stranger = user_model.objects.create_user(
+            email="stranger@test.com",
+            password=PASSWORD,
+            username="stranger",
+        )
+        users = user_model.objects.bulk_create(
+            user_model(
+                email=f"user{i}@test.com",
+                password=cls.viewer.password,
+                username=f"user{i}",
+                first_name=f"first{i}",
+                last_name="last",
+                followers_count=1,
+                following_count=1,
+            )
+            for i in range(cls.size)
+        )
+        cls.user, cls.user_ids = users[0], [user.id for user in users]
+        Follow.objects.bulk_create(
+            follow
+            for user in users
+            for follow in (
+                Follow(from_user=cls.viewer, to_user=user),
+                Follow(from_user=user, to_user=cls.viewer),
+            )
+        )
+        user_model.objects.filter(pk=cls.viewer.pk).update(
+            followers_count=cls.size, following_count=cls.size
+        )
+
+        cls.post = Post.objects.create(user=cls.viewer, text="own #sun")
+        posts = Post.objects.bulk_create(
+            Post(
+                user=user,
+                text=f"sunny post {i} #sun",
+                likes_count=1,
+                comments_count=1,
+            )
+            for i, user in enumerate(users)
+        )
+        cls.post_ids = [post.id for post in posts]
+        sun = Hashtag.objects.get(name="sun")
+        Hashtag.objects.filter(pk=sun.pk).update(posts_count=cls.size + 1)
+        Post.tags.through.objects.bulk_create(
+            Post.tags.through(post=post, hashtag=sun) for post in posts
+        )
+        created_at = dict(
+            Post.objects.filter(pk__in=cls.post_ids).values_list(
+                "id", "created_at"
+            )
+        )
+        TimelineEntry.objects.bulk_create(
+            TimelineEntry(
+                owner=cls.viewer, post=post, created_at=created_at[post.id]
+            )
+            for post in posts
+        )
+
+        Comment.objects.bulk_create(
+            comment
+            for user, post in zip(users, posts)
+            for comment in (
+                Comment(post=cls.post, user=user, text="comment"),
+                Comment(post=post, user=cls.viewer, text="comment"),
+            )
+        )
+        Like.objects.bulk_create(
+            like
+            for user, post in zip(users, posts)
+            for like in (
+                Like(post=cls.post, user=user, is_liked=True),
+                Like(post=post, user=cls.viewer, is_liked=True),
+            )
+        )
+        Post.objects.filter(pk=cls.post.pk).update(
+            likes_count=cls.size, comments_count=cls.size
+        )
+        cls.upload = Upload.objects.create(user=cls.viewer, size=10)
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+        self.refresh = RefreshToken.for_user(self.viewer)
+
+    def route_url(self, name: str, obj) -> str:
+        if obj is None:
+            return reverse(f"user:{name}")
+        return reverse(f"user:{name}", args=[getattr(self, obj).pk])
+
+    def request(self, name: str, method: str):
+        """Send the request budgeted for `name` and `method`, caches cold"""
+        obj, data, _ = QUERY_BUDGETS[name, method]
+        if callable(data):
+            data = data(self)
+        for alias in settings.CACHES:
+            caches[alias].clear()
+        token_blacklist._local.update(filter=None, built_at=0.0)
+        return getattr(self.client, method)(
+            self.route_url(name, obj), data, format="json"
+        )
+
+    def test_every_route_has_a_budget(self) -> None:
+        names = {
+            name
+            for name in get_resolver().namespace_dict["user"][1].reverse_dict
+            if isinstance(name, str)
+        }
+
+        self.assertEqual(names, {name for name, _ in QUERY_BUDGETS})
+
+    def test_routes_stay_within_query_budget(self) -> None:
+        for (name, method), (_, _, budget) in QUERY_BUDGETS.items():
+            with self.subTest(route=name, method=method):
+                # Every request starts from the seeded rows. Work queued
+                # for after the commit counts too.
+                with transaction.atomic():
+                    with CaptureQueriesContext(connection) as queries:
+                        with self.captureOnCommitCallbacks(execute=True):
+                            response = self.request(name, method)
+                    transaction.set_rollback(True)
+
+                if isinstance(budget, dict):
+                    budget = budget[self.size]
+                self.assertLess(response.status_code, 400, response.data)
+                self.assertEqual(
+                    len(queries),
+                    budget,
+                    "\n".join(query["sql"] for query in queries),
+                )
+
+    def test_bulk_post_delete_stays_within_query_budget(self) -> None:
+        posts = Post.objects.filter(user=self.viewer)
+
+        with CaptureQueriesContext(connection) as queries:
+            posts.delete()
+
+        self.assertEqual(
+            len(queries), 12, "\n".join(query["sql"] for query in queries)
+        )
+        self.assertFalse(Comment.objects.filter(post=self.post).exists())
+        self.assertFalse(Like.objects.filter(post=self.post).exists())
+
+    def read_plans(self) -> dict:
+        """SELECTs of every read route, mapped to their plans, by route"""
+        plans = {}
+        for name, method in QUERY_BUDGETS:
+            if method != "get":
+                continue
+            with CaptureQueriesContext(connection) as queries:
+                self.request(name, method)
+            plans[name] = {
+                query["sql"]: explain(query["sql"])
+                for query in queries
+                if query["sql"].startswith("SELECT")
+            }
+        return plans
+
+    @skipUnless(connection.vendor == "sqlite", "Reads SQLite plans.")
+    def test_reads_do_not_scan_seeded_tables(self) -> None:
+        for name, plans in self.read_plans().items():
+            with self.subTest(route=name):
+                scans = {
+                    sql: plan
+                    for sql, plan in plans.items()
+                    if FULL_SCANS.intersection(plan)
+                }
+                self.assertEqual(scans, {})
+
+    @skipUnless(connection.vendor == "sqlite", "Reads SQLite plans.")
+    def test_pages_are_read_in_index_order(self) -> None:
+        for name, plans in self.read_plans().items():
+            if name in SORTED_PAGES:
+                continue
+            with self.subTest(route=name):
+                sorts = {
+                    sql: plan
+                    for sql, plan in plans.items()
+                    if PAGINATED.search(sql) and TEMP_SORT in plan
+                }
+                self.assertEqual(sorts, {})
+
+    @skipUnless(connection.vendor == "sqlite", "Reads SQLite plans.")
+    def test_reads_take_recorded_plans(self) -> None:
+        plans = {
+            name: list(route_plans.values())
+            for name, route_plans in self.read_plans().items()
+        }
+        recorded = {}
+        if QUERY_PLANS_PATH.exists():
+            recorded = json.loads(QUERY_PLANS_PATH.read_text())
+
+        if os.environ.get("RECORD_QUERY_PLANS"):
+            recorded[str(self.size)] = plans
+            QUERY_PLANS_PATH.write_text(
+                json.dumps(recorded, indent=2, sort_keys=True) + "\n"
+            )
+        self.assertEqual(plans, recorded.get(str(self.size)))
+
+
+class SmallQueryBudgetTests(QueryBudgetTests, TestCase):
+    size = 10
+
+
+class LargeQueryBudgetTests(QueryBudgetTests, TestCase):
+    size = 1000
@@ -0,0 +1,137 @@
+import copy
+import time
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.test import AsyncRequestFactory, TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from user.async_views import as_async_view
+from user.models import Post, TimelineEntry
+from user.replicas import ReplicaRouter, pin_to_primary, read_alias
+from user.views import UserViewSet
+
+REPLICAS = ["replica1", "replica2"]
+POST_URL = reverse("user:post-list")
+USER_URL = reverse("user:user-list")
+USER_UPDATE_URL = reverse("user:manage")
+
+
+def detail_url(user_id) -> str:
+    return reverse("user:user-detail", args=[user_id])
+
+
+def first_name(response) -> str:
+    """First name of the only user in a user list response"""
+    (user,) = response.data["results"]
+    return user["first_name"]
+
+
+@override_settings(DATABASE_REPLICAS=REPLICAS)
+class ReplicaRoutingTests(TestCase):
+    databases = {"default", *REPLICAS}
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="user@test.com",
+            password="user1234",
+            username="user_username",
+            first_name="primary",
+            last_name="user_last_name",
+        )
+        self.client.force_authenticate(self.user)
+        # Each replica holds a lagging copy of the user.
+        for alias in REPLICAS:
+            replica_user = copy.copy(self.user)
+            replica_user.first_name = alias
+            get_user_model().objects.using(alias).bulk_create([replica_user])
+
+    def test_reads_go_to_a_replica(self) -> None:
+        response = self.client.get(USER_URL)
+
+        self.assertIn(first_name(response), REPLICAS)
+
+    def test_feed_reads_from_a_replica(self) -> None:
+        post = Post.objects.create(user=self.user, text="primary")
+        for alias in REPLICAS:
+            replica_post = copy.copy(post)
+            replica_post.text = alias
+            Post.objects.using(alias).bulk_create([replica_post])
+            TimelineEntry.objects.using(alias).bulk_create(
+                TimelineEntry.objects.filter(post=post)
+            )
+
+        response = self.client.get(POST_URL)
+
+        self.assertIn(response.data["results"][0]["text"], REPLICAS)
+
+    def test_replica_responses_expire_with_their_etag(self) -> None:
+        with override_settings(REPLICA_PIN_SECONDS=0.05):
+            response1 = self.client.get(detail_url(self.user.id))
+            etag = response1["ETag"]
+            response2 = self.client.get(
+                detail_url(self.user.id), HTTP_IF_NONE_MATCH=etag
+            )
+            time.sleep(0.1)
+            response3 = self.client.get(
+                detail_url(self.user.id), HTTP_IF_NONE_MATCH=etag
+            )
+
+        self.assertIn(response1.data["first_name"], REPLICAS)
+        self.assertEqual(response2.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response3.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response3["ETag"], etag)
+
+    def test_writer_sticks_to_primary(self) -> None:
+        self.client.patch(USER_UPDATE_URL, {"bio": "new bio"})
+
+        response1 = self.client.get(USER_URL)
+        response2 = self.client.get(detail_url(self.user.id))
+
+        self.assertEqual(first_name(response1), "primary")
+        self.assertEqual(response2.data["bio"], "new bio")
+
+    def test_async_reads_go_to_a_replica(self) -> None:
+        user_list = as_async_view(
+            UserViewSet, {"get": "list"}, basename="user", detail=False
+        )
+        request = AsyncRequestFactory().get(
+            USER_URL,
+            headers={
+                "authorization": f"Bearer {AccessToken.for_user(self.user)}"
+            },
+        )
+
+        response = async_to_sync(user_list)(request)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(USER_UPDATE_URL, {"bio": "new bio"})
+        pinned_response = async_to_sync(user_list)(request)
+
+        self.assertIn(first_name(response), REPLICAS)
+        self.assertEqual(first_name(pinned_response), "primary")
+
+    def test_pin_expires(self) -> None:
+        with override_settings(REPLICA_PIN_SECONDS=0.01):
+            pin_to_primary(self.user.id)
+            time.sleep(0.05)
+
+        response = self.client.get(USER_URL)
+
+        self.assertIn(first_name(response), REPLICAS)
+
+    def test_writes_always_go_to_primary(self) -> None:
+        router = ReplicaRouter()
+        token = read_alias.set("replica1")
+        try:
+            write_db = router.db_for_write(Post)
+            read_db = router.db_for_read(Post)
+        finally:
+            read_alias.reset(token)
+
+        self.assertEqual(write_db, "default")
+        self.assertEqual(read_db, "replica1")
+        self.assertIsNone(router.db_for_read(Post))
@@ -0,0 +1,238 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from user.management.commands.reshard import plan_buckets
+from user.models import Comment, Hashtag, Like, Post, TimelineEntry
+from user.sharding import shard_for
+
+SHARDS = ["shard1", "shard2"]
+ALIASES = ["default", *SHARDS]
+POST_URL = reverse("user:post-list")
+SEARCH_URL = reverse("user:post-search")
+LIKED_POSTS_URL = reverse("user:liked-posts")
+
+
+def detail_url(post_id) -> str:
+    return reverse("user:post-detail", args=[post_id])
+
+
+def aliases_of(model, **filters) -> list[str]:
+    """Aliases of the databases holding rows of `model` that match"""
+    return [
+        alias
+        for alias in ALIASES
+        if model.objects.using(alias).filter(**filters).exists()
+    ]
+
+
+@override_settings(DATABASE_SHARDS=SHARDS)
+class ShardingTests(TestCase):
+    databases = set(ALIASES)
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        # Consecutive ids fall into buckets on different shards.
+        self.user, self.author = [
+            get_user_model().objects.create_user(
+                email=f"{name}@test.com",
+                password="user1234",
+                username=name,
+                first_name=name,
+                last_name="last_name",
+            )
+            for name in ("user", "author")
+        ]
+        self.user.user_follow.add(self.author)
+        self.client.force_authenticate(self.user)
+
+    def test_posts_are_stored_on_author_shard(self) -> None:
+        response = self.client.post(POST_URL, {"text": "own #news"})
+        post = Post.objects.create(user=self.author, text="followed")
+
+        self.assertNotEqual(shard_for(self.user.id), shard_for(self.author.id))
+        self.assertEqual(
+            aliases_of(Post, pk=response.data["id"]), [shard_for(self.user.id)]
+        )
+        self.assertEqual(aliases_of(Post, pk=post.id), [post._state.db])
+        self.assertEqual(post._state.db, shard_for(self.author.id))
+        self.assertNotEqual(post.id, response.data["id"])
+        self.assertEqual(Hashtag.objects.get(name="news").posts_count, 1)
+
+    def test_feed_merges_posts_of_all_shards(self) -> None:
+        posts = [
+            Post.objects.create(user=user, text=f"post {i}")
+            for i, user in enumerate([self.user, self.author] * 3)
+        ]
+        expected = [post.id for post in reversed(posts)]
+
+        response = self.client.get(POST_URL, {"page_size": 4})
+        ids = []
+        url, params = POST_URL, {"cursor": "", "page_size": 4}
+        while url:
+            page = self.client.get(url, params)
+            ids += [post["id"] for post in page.data["results"]]
+            url, params = page.data["next"], None
+
+        self.assertEqual(response.data["count"], 6)
+        self.assertEqual(
+            [post["id"] for post in response.data["results"]], expected[:4]
+        )
+        self.assertEqual(ids, expected)
+
+    def test_feed_filters_by_hashtag_across_shards(self) -> None:
+        tagged = [
+            Post.objects.create(user=user, text="#sun")
+            for user in (self.user, self.author)
+        ]
+        Post.objects.create(user=self.author, text="#rain")
+
+        response = self.client.get(POST_URL, {"hashtag": "sun"})
+
+        self.assertCountEqual(
+            [post["id"] for post in response.data["results"]],
+            [post.id for post in tagged],
+        )
+
+    def test_likes_and_comments_stay_with_their_post(self) -> None:
+        post = Post.objects.create(user=self.author, text="followed")
+
+        self.client.post(detail_url(post.id) + "like/")
+        self.client.post(
+            detail_url(post.id) + "add_comment/", {"text": "comment"}
+        )
+        response = self.client.get(detail_url(post.id))
+        liked = self.client.get(LIKED_POSTS_URL)
+
+        self.assertEqual(aliases_of(Like, post=post.id), [post._state.db])
+        self.assertEqual(aliases_of(Comment, post=post.id), [post._state.db])
+        self.assertEqual(response.data["likes_count"], 1)
+        self.assertEqual(response.data["comments"], ["comment"])
+        self.assertEqual(
+            [like["post"]["id"] for like in liked.data], [post.id]
+        )
+
+    def test_malformed_post_id_is_not_found(self) -> None:
+        response = self.client.get(detail_url("abc"))
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_search_covers_all_shards(self) -> None:
+        posts = [
+            Post.objects.create(user=user, text="sunny day")
+            for user in (self.user, self.author)
+        ]
+
+        response = self.client.get(SEARCH_URL, {"q": "sunny"})
+
+        self.assertCountEqual(
+            [post["id"] for post in response.data],
+            [post.id for post in posts],
+        )
+
+    def test_deleting_user_deletes_sharded_rows(self) -> None:
+        post = Post.objects.create(user=self.author, text="followed")
+        Comment.objects.create(post=post, user=self.user, text="comment")
+
+        self.user.delete()
+
+        self.assertEqual(aliases_of(Comment, post=post.id), [])
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+
+
+@override_settings(DATABASE_SHARDS=SHARDS)
+class ReshardTests(TestCase):
+    databases = set(ALIASES)
+
+    def setUp(self) -> None:
+        self.users = [
+            get_user_model().objects.create_user(
+                email=f"user{i}@test.com",
+                password="user1234",
+                username=f"user{i}",
+            )
+            for i in range(4)
+        ]
+        # Rows written before sharding was turned on.
+        with self.settings(DATABASE_SHARDS=[]):
+            self.posts = [
+                Post.objects.create(user=user, text="old #post")
+                for user in self.users
+            ]
+            Comment.objects.create(
+                post=self.posts[0], user=self.users[1], text="comment"
+            )
+            Like.objects.create(
+                post=self.posts[0], user=self.users[1], is_liked=True
+            )
+
+    def test_reshard_moves_rows_to_author_shards(self) -> None:
+        out = StringIO()
+
+        call_command("reshard", batch_size=3, stdout=out)
+        new_post = Post.objects.create(user=self.users[0], text="new")
+
+        for post in self.posts:
+            self.assertEqual(
+                aliases_of(Post, pk=post.id), [shard_for(post.user_id)]
+            )
+        shard = shard_for(self.users[0].id)
+        self.assertEqual(aliases_of(Comment, post=self.posts[0].id), [shard])
+        self.assertEqual(aliases_of(Like, post=self.posts[0].id), [shard])
+        self.assertEqual(
+            Post.objects.using(shard).get(pk=self.posts[0].id).hashtag_ids(),
+            [Hashtag.objects.get(name="post").id],
+        )
+        self.assertEqual(Hashtag.objects.get(name="post").posts_count, 4)
+        self.assertGreater(new_post.id, max(post.id for post in self.posts))
+        self.assertIn("Resharded 4 posts over 2 shards", out.getvalue())
+
+    def test_reshard_is_idempotent(self) -> None:
+        call_command("reshard", stdout=StringIO())
+        out = StringIO()
+
+        call_command("reshard", stdout=out)
+
+        self.assertIn("Reassigned 0 buckets", out.getvalue())
+        self.assertIn("Resharded 0 posts", out.getvalue())
+
+    def test_adding_a_shard_moves_its_share_of_buckets(self) -> None:
+        current = plan_buckets({}, SHARDS, 256)
+
+        plan = plan_buckets(current, [*SHARDS, "shard3"], 256)
+
+        moved = [bucket for bucket in plan if plan[bucket] != current[bucket]]
+        self.assertEqual(len(moved), 256 - 2 * 86)
+        self.assertTrue(all(plan[bucket] == "shard3" for bucket in moved))
+
+
+@override_settings(DATABASE_SHARDS=SHARDS)
+class ShardMigrationTests(TransactionTestCase):
+    databases = set(ALIASES)
+
+    def test_migrating_a_shard_leaves_default_alone(self) -> None:
+        # Rows written before the shard was added.
+        with self.settings(DATABASE_SHARDS=[]):
+            user, author = [
+                get_user_model().objects.create_user(
+                    email=f"{name}@test.com",
+                    password="user1234",
+                    username=name,
+                )
+                for name in ("user", "author")
+            ]
+            user.user_follow.add(author)
+            post = Post.objects.create(user=author, text="old #post")
+        call_command("migrate", "user", "0008", database="shard1", verbosity=0)
+
+        call_command("migrate", "user", database="shard1", verbosity=0)
+
+        self.assertEqual(aliases_of(Post, pk=post.pk), ["default"])
+        self.assertEqual(TimelineEntry.objects.filter(post=post).count(), 2)
+        self.assertFalse(TimelineEntry.objects.using("shard1").exists())
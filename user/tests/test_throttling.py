@@ -0,0 +1,81 @@
+from types import SimpleNamespace
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from user.models import Post
+from user.throttling import ScopedRateThrottle, UserRateThrottle
+
+WINDOW_START = 1_000_000 * 60
+
+
+class TenPerMinuteThrottle(UserRateThrottle):
+    rate = "10/min"
+
+
+class SlidingWindowThrottleTests(TestCase):
+    def setUp(self) -> None:
+        self.request = SimpleNamespace(
+            user=SimpleNamespace(is_authenticated=True, pk=1)
+        )
+
+    def hit(self, now: float) -> TenPerMinuteThrottle:
+        throttle = TenPerMinuteThrottle()
+        throttle.timer = lambda: now
+        throttle.allowed = throttle.allow_request(self.request, None)
+        return throttle
+
+    def test_previous_window_weighs_less_as_it_slides_out(self) -> None:
+        allowed1 = [self.hit(WINDOW_START + 50).allowed for _ in range(11)]
+        allowed2 = [self.hit(WINDOW_START + 63).allowed for _ in range(2)]
+        throttle = self.hit(WINDOW_START + 63)
+        allowed3 = [self.hit(WINDOW_START + 90).allowed for _ in range(5)]
+
+        self.assertEqual(allowed1, [True] * 10 + [False])
+        self.assertEqual(allowed2, [True, False])
+        self.assertAlmostEqual(throttle.wait(), 3)
+        self.assertEqual(allowed3, [True] * 4 + [False])
+
+    def test_full_current_window_waits_for_next_window(self) -> None:
+        for _ in range(10):
+            self.hit(WINDOW_START + 15)
+
+        throttle = self.hit(WINDOW_START + 15)
+
+        self.assertFalse(throttle.allowed)
+        self.assertEqual(throttle.wait(), 45)
+
+
+class ScopedThrottleTests(TestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="user@test.com",
+            password="user1234",
+            username="user_username",
+            first_name="user_first_name",
+            last_name="user_last_name",
+        )
+        self.client.force_authenticate(self.user)
+        self.post = Post.objects.create(user=self.user, text="text")
+
+    def test_write_actions_use_their_own_rate(self) -> None:
+        like_url = reverse("user:post-like", args=[self.post.id])
+        detail_url = reverse("user:post-detail", args=[self.post.id])
+
+        with mock.patch.dict(
+            ScopedRateThrottle.THROTTLE_RATES, {"like": "2/min"}
+        ):
+            responses = [self.client.post(like_url) for _ in range(3)]
+            response = self.client.get(detail_url)
+
+        self.assertEqual(
+            [response.status_code for response in responses],
+            [200, 200, status.HTTP_429_TOO_MANY_REQUESTS],
+        )
+        self.assertIn("Retry-After", responses[2])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
@@ -0,0 +1,140 @@
+import io
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from user.models import Post, Upload
+
+UPLOAD_URL = reverse("user:upload-list")
+POST_URL = reverse("user:post-list")
+USER_UPDATE_URL = reverse("user:manage")
+
+
+def detail_url(upload_id) -> str:
+    return reverse("user:upload-detail", args=[upload_id])
+
+
+def image_bytes(color="red") -> bytes:
+    output = io.BytesIO()
+    Image.new("RGB", (64, 48), color).save(output, "PNG")
+    return output.getvalue()
+
+
+class UploadApiTests(TestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="user@test.com",
+            password="user1234",
+            username="user_username",
+            first_name="user_first_name",
+            last_name="user_last_name",
+        )
+        self.client.force_authenticate(self.user)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        media_settings = override_settings(MEDIA_ROOT=directory.name)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+    def send_chunk(self, upload_id, offset: int, chunk: bytes):
+        return self.client.generic(
+            "PATCH",
+            detail_url(upload_id),
+            chunk,
+            content_type="application/offset+octet-stream",
+            HTTP_UPLOAD_OFFSET=str(offset),
+        )
+
+    def upload(self, content: bytes, chunk_size: int = 100) -> Upload:
+        response = self.client.post(UPLOAD_URL, {"size": len(content)})
+        upload_id = response.data["id"]
+        for offset in range(0, len(content), chunk_size):
+            self.send_chunk(
+                upload_id, offset, content[offset: offset + chunk_size]
+            )
+        return Upload.objects.get(id=upload_id)
+
+    def test_chunked_upload_resumes_from_offset(self) -> None:
+        content = image_bytes()
+        response = self.client.post(UPLOAD_URL, {"size": len(content)})
+        upload_id = response.data["id"]
+
+        self.send_chunk(upload_id, 0, content[:50])
+        response1 = self.client.get(detail_url(upload_id))
+        response2 = self.send_chunk(upload_id, 10, content[10:50])
+        response3 = self.send_chunk(upload_id, 50, content[50:])
+
+        self.assertEqual(response1.data["offset"], 50)
+        self.assertEqual(response2.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response3.status_code, status.HTTP_200_OK)
+        self.assertIsNotNone(response3.data["completed_at"])
+        upload = Upload.objects.get(id=upload_id)
+        with default_storage.open(upload.file) as file:
+            self.assertEqual(file.read(), content)
+        self.assertIn(upload.sha256, upload.file)
+
+    def test_stale_chunk_leaves_partial_file_alone(self) -> None:
+        content = image_bytes()
+        response = self.client.post(UPLOAD_URL, {"size": len(content)})
+        upload_id = response.data["id"]
+
+        self.send_chunk(upload_id, 0, content[:50])
+        response1 = self.send_chunk(upload_id, 10, b"x" * 40)
+        response2 = self.send_chunk(upload_id, 50, content[50:])
+
+        self.assertEqual(response1.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response2.status_code, status.HTTP_200_OK)
+        upload = Upload.objects.get(id=upload_id)
+        with default_storage.open(upload.file) as file:
+            self.assertEqual(file.read(), content)
+
+    def test_identical_uploads_share_one_file(self) -> None:
+        upload1 = self.upload(image_bytes())
+        upload2 = self.upload(image_bytes(), chunk_size=30)
+        upload3 = self.upload(image_bytes("blue"))
+
+        self.assertEqual(upload1.file, upload2.file)
+        self.assertNotEqual(upload1.file, upload3.file)
+
+    def test_non_image_upload_rejected(self) -> None:
+        response = self.client.post(UPLOAD_URL, {"size": 4})
+
+        response = self.send_chunk(response.data["id"], 0, b"text")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Upload.objects.exists())
+
+    def test_chunk_past_declared_size_rejected(self) -> None:
+        response = self.client.post(UPLOAD_URL, {"size": 4})
+
+        response = self.send_chunk(response.data["id"], 0, b"too long")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_post_and_profile_reference_finished_upload(self) -> None:
+        upload = self.upload(image_bytes())
+
+        self.client.post(
+            POST_URL, {"text": "photo", "media_upload": str(upload.id)}
+        )
+        self.client.patch(USER_UPDATE_URL, {"image_upload": str(upload.id)})
+        self.user.refresh_from_db()
+
+        self.assertEqual(Post.objects.get().media_image.name, upload.file)
+        self.assertEqual(self.user.image.name, upload.file)
+
+    def test_unfinished_upload_cannot_be_referenced(self) -> None:
+        response = self.client.post(UPLOAD_URL, {"size": 10})
+
+        response = self.client.post(
+            POST_URL, {"text": "photo", "media_upload": response.data["id"]}
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
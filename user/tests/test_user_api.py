@@ -1,14 +1,33 @@
+from datetime import timedelta
+
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group, Permission
+from django.core.cache import caches
 from django.test import TestCase
 from django.urls import reverse, reverse_lazy
+from django.utils import timezone
 from rest_framework import status
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.test import APIClient
-
+from rest_framework_simplejwt.token_blacklist.models import (
+    BlacklistedToken,
+    OutstandingToken,
+)
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from user import follow_graph, token_blacklist
+from user.authentication import CachedJWTAuthentication
 from user.models import User
 from user.serializers import UserListSerializer, UserDetailSerializer
+from user.tasks import flush_expired_tokens
 
 USER_URL = reverse("user:user-list")
 USER_UPDATE_URL = reverse("user:manage")
+USER_SEARCH_URL = reverse("user:user-search")
+BULK_FOLLOW_URL = reverse("user:user-bulk-follow")
+BULK_UNFOLLOW_URL = reverse("user:user-bulk-unfollow")
+LOGOUT_URL = reverse("user:logout")
+TOKEN_REFRESH_URL = reverse("user:token_refresh")
 
 
 def test_user(**params) -> User:
@@ -142,6 +161,310 @@ class AuthenticatedUserApiTests(TestCase):
         self.assertEqual(response1.status_code, status.HTTP_200_OK)
         self.assertIn(self.user.__str__(), response2.data["user_followers"])
 
+    def test_cursor_pagination_follows_user_ordering(self) -> None:
+        for i, first_name in enumerate(["Cid", "Ann", "Bob", "Ann"]):
+            test_user(
+                email=f"test{i}@test.com",
+                username=f"user{i}",
+                first_name=first_name,
+            )
+        users = get_user_model().objects.order_by(
+            "first_name", "last_name", "id"
+        )
+
+        response1 = self.client.get(USER_URL, {"cursor": "", "page_size": 3})
+        response2 = self.client.get(response1.data["next"])
+
+        ids = [
+            user["id"]
+            for response in (response1, response2)
+            for user in response.data["results"]
+        ]
+        self.assertEqual(ids, [user.id for user in users])
+        self.assertIsNone(response2.data["next"])
+
+    def test_search_users_by_name_prefix(self) -> None:
+        brad = test_user(username="bradp", first_name="Brad", last_name="Pitt")
+        test_user(
+            email="test2@test.com",
+            username="spider",
+            first_name="Peter",
+            last_name="Parker",
+        )
+        test_user(email="test3@test.com", username="brady", first_name="Tom")
+
+        response1 = self.client.get(USER_SEARCH_URL, {"q": "bra pi"})
+        response2 = self.client.get(USER_SEARCH_URL, {"q": "P"})
+
+        self.assertEqual([user["id"] for user in response1.data], [brad.id])
+        self.assertEqual(len(response2.data), 2)
+
+    def test_search_follows_profile_updates(self) -> None:
+        self.client.patch(USER_UPDATE_URL, {"first_name": "Zelda"})
+
+        response = self.client.get(USER_SEARCH_URL, {"q": "zel"})
+
+        self.assertEqual(
+            [user["id"] for user in response.data], [self.user.id]
+        )
+
+    def test_follow_graph_cache_tracks_follow_and_unfollow(self) -> None:
+        user = test_user()
+        url = detail_url(user.id)
+
+        self.assertFalse(follow_graph.is_following(self.user.id, user.id))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(url + "follow/")
+        follow_graph.following_ids(self.user.id)
+        with self.assertNumQueries(0):
+            self.assertTrue(
+                follow_graph.is_following(self.user.id, user.id)
+            )
+        self.assertEqual(follow_graph.follower_ids(user.id), {self.user.id})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(url + "unfollow/")
+
+        self.assertFalse(follow_graph.is_following(self.user.id, user.id))
+        self.assertEqual(follow_graph.follower_ids(user.id), set())
+
+    def test_follow_graph_cache_is_kept_until_commit(self) -> None:
+        user = test_user()
+        follow_graph.following_ids(self.user.id)
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.client.patch(detail_url(user.id) + "follow/")
+            following = follow_graph.following_ids(self.user.id)
+
+        self.assertTrue(callbacks)
+        self.assertEqual(following, set())
+        self.assertEqual(follow_graph.following_ids(self.user.id), {user.id})
+
+    def test_profile_etag_tracks_follows_and_updates(self) -> None:
+        user = test_user()
+        url = detail_url(user.id)
+        etag1 = self.client.get(url)["ETag"]
+
+        response1 = self.client.get(url, HTTP_IF_NONE_MATCH=etag1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(url + "follow/")
+        etag2 = self.client.get(url)["ETag"]
+        user.first_name = "Renamed"
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save()
+        response2 = self.client.get(url, HTTP_IF_NONE_MATCH=etag2)
+
+        self.assertEqual(response1.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertNotEqual(etag1, etag2)
+        self.assertEqual(response2.data["first_name"], "Renamed")
+
+    def test_followers_endpoint_pages_newest_first(self) -> None:
+        followers = [
+            test_user(email=f"f{i}@test.com", username=f"follower{i}")
+            for i in range(5)
+        ]
+        for follower in followers:
+            self.user.user_followers.add(follower)
+        url = detail_url(self.user.id) + "followers/"
+
+        response1 = self.client.get(url, {"page_size": 2})
+        with self.assertNumQueries(2):
+            response2 = self.client.get(response1.data["next"])
+        response3 = self.client.get(response2.data["next"])
+
+        pages = [response1, response2, response3]
+        usernames = [
+            item["user"]["username"]
+            for page in pages
+            for item in page.data["results"]
+        ]
+        self.assertEqual(
+            usernames, [follower.username for follower in reversed(followers)]
+        )
+        self.assertIsNone(response3.data["next"])
+
+    def test_following_endpoint_lists_followed_users(self) -> None:
+        followed = test_user()
+        self.client.patch(detail_url(followed.id) + "follow/")
+
+        response = self.client.get(detail_url(self.user.id) + "following/")
+
+        self.assertEqual(
+            [item["user"]["id"] for item in response.data["results"]],
+            [followed.id],
+        )
+
+    def test_bulk_follow_and_unfollow(self) -> None:
+        users = [
+            test_user(email=f"u{i}@test.com", username=f"user{i}")
+            for i in range(3)
+        ]
+        ids = [user.id for user in users]
+        self.client.patch(detail_url(ids[0]) + "follow/")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response1 = self.client.post(
+                BULK_FOLLOW_URL,
+                {"user_ids": [*ids, self.user.id, 9999]},
+                format="json",
+            )
+        following = set(follow_graph.following_ids(self.user.id))
+        with self.captureOnCommitCallbacks(execute=True):
+            response2 = self.client.post(
+                BULK_UNFOLLOW_URL, {"user_ids": ids[:2]}, format="json"
+            )
+        self.user.refresh_from_db()
+        users[2].refresh_from_db()
+
+        self.assertEqual(response1.data["followed"], ids[1:])
+        self.assertEqual(following, set(ids))
+        self.assertEqual(response2.data["unfollowed"], ids[:2])
+        self.assertEqual(follow_graph.following_ids(self.user.id), {ids[2]})
+        self.assertEqual(self.user.following_count, 1)
+        self.assertEqual(users[2].followers_count, 1)
+
+    def test_bulk_follow_rejects_oversized_batch(self) -> None:
+        response = self.client.post(
+            BULK_FOLLOW_URL, {"user_ids": list(range(1, 102))}, format="json"
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_detail_embeds_bounded_follow_lists(self) -> None:
+        for i in range(8):
+            self.user.user_followers.add(
+                test_user(email=f"f{i}@test.com", username=f"follower{i}")
+            )
+
+        response = self.client.get(detail_url(self.user.id))
+
+        self.assertEqual(response.data["followers_count"], 8)
+        self.assertEqual(len(response.data["user_followers"]), 5)
+        self.assertEqual(response.data["user_follow"], [])
+
+
+class CachedJWTAuthenticationTests(TestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = test_user()
+        self.authentication = CachedJWTAuthentication()
+        self.token = self.authentication.get_validated_token(
+            str(AccessToken.for_user(self.user))
+        )
+
+    def test_user_resolved_from_cache(self) -> None:
+        self.authentication.get_user(self.token)
+
+        with self.assertNumQueries(0):
+            user = self.authentication.get_user(self.token)
+
+        self.assertEqual(user, self.user)
+
+    def test_profile_update_invalidates_cached_user(self) -> None:
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}"
+        )
+        self.client.get(USER_UPDATE_URL)
+
+        self.client.patch(USER_UPDATE_URL, {"first_name": "Renamed"})
+        response = self.client.get(USER_UPDATE_URL)
+
+        self.assertEqual(response.data["first_name"], "Renamed")
+
+    def test_deactivated_user_rejected(self) -> None:
+        self.authentication.get_user(self.token)
+
+        self.user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+
+        with self.assertRaises(AuthenticationFailed):
+            self.authentication.get_user(self.token)
+
+    def test_permission_changes_invalidate_cached_user(self) -> None:
+        group = Group.objects.create(name="editors")
+        self.user.groups.add(group)
+        self.authentication.get_user(self.token)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            group.permissions.add(
+                Permission.objects.get(codename="add_post")
+            )
+
+        with self.assertNumQueries(1):
+            self.authentication.get_user(self.token)
+
+
+class TokenBlacklistTests(TestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = test_user()
+        self.client.force_authenticate(self.user)
+        # Caches are emptied per test; so must this process's filter be.
+        token_blacklist._local.update(filter=None, built_at=0.0, version=None)
+
+    def test_logged_out_refresh_token_rejected(self) -> None:
+        refresh = str(RefreshToken.for_user(self.user))
+
+        response1 = self.client.post(LOGOUT_URL, {"refresh_token": refresh})
+        response2 = self.client.post(TOKEN_REFRESH_URL, {"refresh": refresh})
+
+        self.assertEqual(response1.status_code, status.HTTP_205_RESET_CONTENT)
+        self.assertEqual(response2.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_logged_out_token_rejected_after_cache_loss(self) -> None:
+        refresh = str(RefreshToken.for_user(self.user))
+        token_blacklist.get_filter()
+
+        self.client.post(LOGOUT_URL, {"refresh_token": refresh})
+        for cache in caches.all():
+            cache.clear()
+        response = self.client.post(TOKEN_REFRESH_URL, {"refresh": refresh})
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_unrevoked_token_skips_database(self) -> None:
+        token_blacklist.get_filter()
+
+        with self.assertNumQueries(0):
+            blacklisted = token_blacklist.is_blacklisted("unrevoked-jti")
+
+        self.assertFalse(blacklisted)
+
+    def test_bloom_filter_has_no_false_negatives(self) -> None:
+        bloom = token_blacklist.BloomFilter.for_capacity(2000, 0.001)
+        jtis = [f"jti-{i}" for i in range(2000)]
+        for jti in jtis:
+            bloom.add(jti)
+
+        self.assertTrue(all(jti in bloom for jti in jtis))
+        self.assertNotIn("another-jti", bloom)
+
+    def test_expired_tokens_deleted_in_batches(self) -> None:
+        now = timezone.now()
+        for i in range(5):
+            token = OutstandingToken.objects.create(
+                user=self.user,
+                jti=f"expired-{i}",
+                token="token",
+                expires_at=now - timedelta(days=1),
+            )
+            BlacklistedToken.objects.create(token=token)
+        OutstandingToken.objects.create(
+            user=self.user,
+            jti="live",
+            token="token",
+            expires_at=now + timedelta(days=1),
+        )
+
+        deleted = flush_expired_tokens(batch_size=2)
+
+        self.assertEqual(deleted, 5)
+        self.assertEqual(
+            list(OutstandingToken.objects.values_list("jti", flat=True)),
+            ["live"],
+        )
+        self.assertFalse(BlacklistedToken.objects.exists())
+
 
 class AdminMovieSessionApiTest(TestCase):
     def setUp(self) -> None:
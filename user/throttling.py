@@ -0,0 +1,69 @@
+"""
+Sliding-window counter throttles on the shared "throttle" cache.
+
+Instead of DRF's per-key list of request timestamps, each key keeps one
+integer per fixed window. The request count over the last `duration`
+seconds is estimated from the current window plus the previous one,
+weighted by how much of it still overlaps the sliding window.
+"""
+from django.core.cache import caches
+from rest_framework import throttling
+
+
+class SlidingWindowThrottle(throttling.SimpleRateThrottle):
+    @property
+    def cache(self):
+        return caches["throttle"]
+
+    def allow_request(self, request, view) -> bool:
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        self.now = self.timer()
+        window, self.elapsed = divmod(self.now, self.duration)
+        current_key = f"{self.key}:{int(window)}"
+        previous_key = f"{self.key}:{int(window) - 1}"
+        counts = self.cache.get_many([previous_key, current_key])
+        self.previous = counts.get(previous_key, 0)
+        self.current = counts.get(current_key, 0)
+        weight = 1 - self.elapsed / self.duration
+        if self.previous * weight + self.current >= self.num_requests:
+            return self.throttle_failure()
+
+        # A window's counter is still read during the following window.
+        self.cache.add(current_key, 0, 2 * self.duration)
+        try:
+            self.cache.incr(current_key)
+        except ValueError:
+            self.cache.set(current_key, 1, 2 * self.duration)
+        return self.throttle_success()
+
+    def throttle_success(self) -> bool:
+        return True
+
+    def wait(self) -> float:
+        if self.current >= self.num_requests:
+            return self.duration - self.elapsed
+        # When the previous window's weight has dropped far enough.
+        free = (self.num_requests - self.current) / self.previous
+        return max(self.duration * (1 - free) - self.elapsed, 0)
+
+
+# The DRF class comes first so ScopedRateThrottle can pick the rate from
+# the view before the sliding window check runs.
+class AnonRateThrottle(throttling.AnonRateThrottle, SlidingWindowThrottle):
+    pass
+
+
+class UserRateThrottle(throttling.UserRateThrottle, SlidingWindowThrottle):
+    pass
+
+
+class ScopedRateThrottle(
+    throttling.ScopedRateThrottle, SlidingWindowThrottle
+):
+    """Throttles views and actions that set `throttle_scope`"""
@@ -0,0 +1,136 @@
+"""
+Bloom-filter front for the simplejwt token blacklist.
+
+Each process keeps a Bloom filter of blacklisted jtis, rebuilt from the
+database (and shared through the cache) every TOKEN_BLACKLIST_REFRESH
+seconds. Blacklisting a jti drops the shared filter and writes a
+short-lived cache key for the jti. A jti missing from the local filter is
+checked against that key and the version of the shared filter, so
+unrevoked tokens skip the database; should the cache have lost or
+replaced the filter, it is reloaded first. A hit is confirmed by the
+database to rule out false positives.
+"""
+import hashlib
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.tokens import RefreshToken as BaseRefreshToken
+
+FILTER_KEY = "token-blacklist:filter"
+VERSION_KEY = "token-blacklist:version"
+RECENT_KEY = "token-blacklist:jti:{}"
+
+
+class BloomFilter:
+    def __init__(self, size: int, hashes: int, bits=None) -> None:
+        self.size = size
+        self.hashes = hashes
+        self.bits = bytearray(bits or (size + 7) // 8)
+
+    @classmethod
+    def for_capacity(cls, capacity: int, error_rate: float) -> "BloomFilter":
+        capacity = max(capacity, 1024)
+        size = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        hashes = max(round(size / capacity * math.log(2)), 1)
+        return cls(size, hashes)
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hashes):
+            yield (first + i * second) % self.size
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(item)
+        )
+
+
+def build_filter() -> BloomFilter:
+    jtis = BlacklistedToken.objects.filter(
+        token__expires_at__gt=timezone.now()
+    ).values_list("token__jti", flat=True)
+    bloom = BloomFilter.for_capacity(
+        jtis.count(), settings.TOKEN_BLACKLIST_ERROR_RATE
+    )
+    for jti in jtis.iterator():
+        bloom.add(jti)
+    return bloom
+
+
+_local = {"filter": None, "built_at": 0.0, "version": None}
+
+
+def get_filter(reload: bool = False) -> BloomFilter:
+    """This process's filter, refreshed from the cache or the database"""
+    refresh = settings.TOKEN_BLACKLIST_REFRESH
+    age = time.monotonic() - _local["built_at"]
+    if not reload and _local["filter"] is not None and age < refresh:
+        return _local["filter"]
+
+    shared = cache.get(FILTER_KEY)
+    if shared is None:
+        built_at = time.time()
+        bloom = build_filter()
+        cache.set(
+            FILTER_KEY,
+            (built_at, bloom.size, bloom.hashes, bytes(bloom.bits)),
+            refresh,
+        )
+    else:
+        built_at, size, hashes, bits = shared
+        bloom = BloomFilter(size, hashes, bits)
+    cache.set(VERSION_KEY, built_at, refresh)
+    # Count the filter's age from when it was built, not loaded.
+    _local["filter"] = bloom
+    _local["built_at"] = time.monotonic() - (time.time() - built_at)
+    _local["version"] = built_at
+    return bloom
+
+
+def remember_blacklisted(jti: str) -> None:
+    # Covers the jti while a filter built before it may still be stored.
+    cache.set(
+        RECENT_KEY.format(jti), True, 3 * settings.TOKEN_BLACKLIST_REFRESH
+    )
+    cache.delete_many([FILTER_KEY, VERSION_KEY])
+
+
+def is_blacklisted(jti: str) -> bool:
+    bloom = get_filter()
+    if jti not in bloom:
+        recent_key = RECENT_KEY.format(jti)
+        found = cache.get_many([recent_key, VERSION_KEY])
+        if recent_key not in found:
+            # Without its version the local filter may predate revocations.
+            if found.get(VERSION_KEY) != _local["version"]:
+                bloom = get_filter(reload=True)
+            if jti not in bloom:
+                return False
+    return BlacklistedToken.objects.filter(token__jti=jti).exists()
+
+
+class RefreshToken(BaseRefreshToken):
+    """Refresh token checking the blacklist through the Bloom filter"""
+
+    def check_blacklist(self) -> None:
+        if is_blacklisted(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError(_("Token is blacklisted"))
+
+    def blacklist(self):
+        result = super().blacklist()
+        remember_blacklisted(self.payload[api_settings.JTI_CLAIM])
+        return result
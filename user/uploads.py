@@ -0,0 +1,119 @@
+"""
+Resumable chunked uploads into content-addressed media storage.
+
+Chunks are spooled from the request stream, then copied into a partial
+file on local disk by whichever request claimed their offset. Once the
+declared size has arrived, the file is hashed and stored under its
+SHA-256, so identical images share one file.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from PIL import Image, UnidentifiedImageError
+from rest_framework.exceptions import ValidationError
+
+from user.models import Upload
+
+READ_BLOCK_SIZE = 64 * 1024
+IMAGE_EXTENSIONS = {
+    "JPEG": ".jpg",
+    "PNG": ".png",
+    "GIF": ".gif",
+    "WEBP": ".webp",
+}
+
+
+def partial_path(upload: Upload) -> Path:
+    return Path(settings.MEDIA_ROOT) / "uploads" / "partial" / str(upload.id)
+
+
+def content_name(digest: str, extension: str) -> str:
+    return os.path.join(
+        "media/uploads/sha256", digest[:2], digest[2:4], digest + extension
+    )
+
+
+def append_chunk(upload: Upload, offset: int, stream, length: int) -> bool:
+    """Write `length` bytes of `stream` at `offset`.
+
+    Returns False if another request already moved the upload past
+    `offset`, in which case the client should re-check the offset.
+    """
+    with tempfile.SpooledTemporaryFile(READ_BLOCK_SIZE) as chunk:
+        remaining = length
+        while remaining:
+            block = stream.read(min(READ_BLOCK_SIZE, remaining))
+            if not block:
+                break
+            chunk.write(block)
+            remaining -= len(block)
+        if remaining:
+            raise ValidationError(
+                "Request body is shorter than Content-Length."
+            )
+
+        path = partial_path(upload)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Claim the offset before writing; the row stays locked until
+        # the chunk is in place, and the claim is undone if it fails.
+        with transaction.atomic():
+            claimed = Upload.objects.filter(
+                pk=upload.pk, offset=offset
+            ).update(offset=F("offset") + length)
+            if not claimed:
+                return False
+            chunk.seek(0)
+            with open(path, "r+b" if path.exists() else "wb") as partial:
+                partial.seek(offset)
+                shutil.copyfileobj(chunk, partial, READ_BLOCK_SIZE)
+    return True
+
+
+def image_extension(path: Path) -> str:
+    try:
+        with Image.open(path) as image:
+            image_format = image.format
+            image.verify()
+    except (UnidentifiedImageError, OSError, SyntaxError):
+        image_format = None
+    if image_format not in IMAGE_EXTENSIONS:
+        raise ValidationError("Upload is not a supported image.")
+    return IMAGE_EXTENSIONS[image_format]
+
+
+def finish(upload: Upload) -> Upload:
+    """Hash the complete upload and move it into content-addressed storage"""
+    path = partial_path(upload)
+    try:
+        extension = image_extension(path)
+        digest = hashlib.sha256()
+        with open(path, "rb") as partial:
+            for block in iter(lambda: partial.read(READ_BLOCK_SIZE), b""):
+                digest.update(block)
+        name = content_name(digest.hexdigest(), extension)
+        if not default_storage.exists(name):
+            with open(path, "rb") as partial:
+                stored = default_storage.save(name, File(partial))
+            if stored != name:
+                # Lost a race with an identical upload; keep theirs.
+                default_storage.delete(stored)
+    except ValidationError:
+        upload.delete()
+        raise
+    finally:
+        path.unlink(missing_ok=True)
+
+    upload.sha256 = digest.hexdigest()
+    upload.file = name
+    upload.completed_at = timezone.now()
+    upload.save(update_fields=["sha256", "file", "completed_at"])
+    return upload
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework import routers
 from rest_framework_simplejwt.views import (
@@ -5,6 +6,7 @@ from rest_framework_simplejwt.views import (
     TokenRefreshView,
 )
 
+from user.async_views import with_async_reads
 from user.views import (
     CreateUserView,
     ManageUserView,
@@ -12,11 +14,22 @@ from user.views import (
     PostViewSet,
     UserViewSet,
     LikeList,
+    HashtagList,
+    UploadViewSet,
 )
 
 router = routers.DefaultRouter()
 router.register("posts", PostViewSet)
 router.register("users", UserViewSet)
+router.register("uploads", UploadViewSet)
+
+ASYNC_READ_URLS = {
+    "post-list",
+    "post-detail",
+    "user-list",
+    "user-detail",
+    "liked-posts",
+}
 
 urlpatterns = [
     path("register/", CreateUserView.as_view(), name="create"),
@@ -25,7 +38,15 @@ urlpatterns = [
     path("me/", ManageUserView.as_view(), name="manage"),
     path("logout/", LogoutView.as_view(), name="logout"),
     path("liked-posts/", LikeList.as_view(), name="liked-posts"),
+    path("hashtags/", HashtagList.as_view(), name="hashtags"),
     path("", include(router.urls)),
 ]
 
+if settings.ASYNC_READ_VIEWS:
+    # Under ASGI, the hot read endpoints run as coroutines.
+    urlpatterns[-1:] = [
+        path("", include(with_async_reads(router.urls, ASYNC_READ_URLS)))
+    ]
+    urlpatterns = with_async_reads(urlpatterns, ASYNC_READ_URLS)
+
 app_name = "user"
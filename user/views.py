@@ -1,37 +1,95 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import F, Q
 from django.http import Http404
-from django.shortcuts import get_object_or_404
 from drf_spectacular.utils import extend_schema, OpenApiParameter
-from rest_framework import generics, status, viewsets
+from rest_framework import generics, mixins, status, viewsets
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.permissions import SAFE_METHODS, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.settings import api_settings
 from rest_framework.views import APIView
-from rest_framework_simplejwt.tokens import RefreshToken
 
-from user.models import Post, Comment, Like
-from user.pagination import UserPagination, PostPagination
+from user.caching import (
+    CachedResponseMixin,
+    author_scope,
+    bump_post,
+    bump_posts,
+    get_post_author,
+    post_scope,
+    remember_post_author,
+    user_scope,
+)
+from user.follow_graph import following_ids, is_following
+from user.like_buffer import get_buffer
+from user.models import Post, Comment, Like, Hashtag, Follow, Upload
+from user.pagination import (
+    UserPagination,
+    PostPagination,
+    LikePagination,
+    HashtagPagination,
+    CommentPagination,
+    FollowPagination,
+    KeysetPagination,
+)
 from user.permissions import (
     IsAdminOrIfAuthenticatedReadOnly,
     IsCreatorOrReadOnly,
 )
+from user.replicas import ReplicaReadMixin
+from user.search import (
+    search_post_ids,
+    search_shard_post_ids,
+    search_user_ids,
+)
+from user.sharding import (
+    MergedQuerySet,
+    group_by_shard,
+    shard_of_post,
+    sharding_enabled,
+    with_users,
+)
+from user.signals import follow_graph_changed
+from user.token_blacklist import RefreshToken
+from user.uploads import append_chunk, finish
 from user.serializers import (
     UserSerializer,
     AuthTokenSerializer,
     UserListSerializer,
     UserDetailSerializer,
     UserFollowSerializer,
+    BulkFollowSerializer,
+    FollowerSerializer,
+    FollowingSerializer,
     PostSerializer,
     PostDetailSerializer,
     PostListSerializer,
     CommentSerializer,
+    CommentListSerializer,
     LikeSerializer,
+    BulkLikeSerializer,
     LikeListSerializer,
+    HashtagSerializer,
+    UploadSerializer,
 )
 
+KEYSET_PAGE_PARAMETERS = [
+    OpenApiParameter(
+        name="cursor",
+        description="Cursor of the next or previous page",
+        type=str,
+    ),
+    OpenApiParameter(
+        name="page_size",
+        description="Number of results per page (ex. ?page_size=20)",
+        type=int,
+    ),
+]
+
 
 class CreateUserView(generics.CreateAPIView):
     serializer_class = UserSerializer
@@ -47,7 +105,9 @@ class ManageUserView(generics.RetrieveUpdateAPIView):
     permission_classes = (IsAuthenticated,)
 
     def get_object(self):
-        return self.request.user
+        # request.user may come from the authentication cache; save a fresh
+        # row so counters updated in the meantime are not overwritten.
+        return get_user_model().objects.get(pk=self.request.user.pk)
 
 
 class LogoutView(APIView):
@@ -64,22 +124,38 @@ class LogoutView(APIView):
             return Response(status=status.HTTP_400_BAD_REQUEST)
 
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(
+    ReplicaReadMixin, CachedResponseMixin, viewsets.ModelViewSet
+):
     queryset = get_user_model().objects.all()
     serializer_class = UserSerializer
     pagination_class = UserPagination
     permission_classes = (IsAdminOrIfAuthenticatedReadOnly,)
+    # Set per action to apply that action's rate from settings.
+    throttle_scope = None
 
     def get_serializer_class(self):
-        if self.action == "list":
+        if self.action in ("list", "search"):
             return UserListSerializer
         if self.action == "retrieve":
             return UserDetailSerializer
         if self.action in ("follow", "unfollow"):
             return UserFollowSerializer
+        if self.action in ("bulk_follow", "bulk_unfollow"):
+            return BulkFollowSerializer
+        if self.action == "followers":
+            return FollowerSerializer
+        if self.action == "following":
+            return FollowingSerializer
 
         return UserSerializer
 
+    def get_cache_scopes(self):
+        if self.action == "retrieve":
+            return [user_scope(self.kwargs["pk"])]
+
+        return None
+
     def get_queryset(self) -> queryset:
         queryset = super().get_queryset()
 
@@ -95,23 +171,23 @@ class UserViewSet(viewsets.ModelViewSet):
         if last_name:
             queryset = queryset.filter(last_name__icontains=last_name)
 
-        queryset = queryset.prefetch_related("user_follow")
-
-        return queryset.distinct()
+        return queryset
 
     @action(
         methods=["PATCH"],
         detail=True,
         url_path="follow",
         permission_classes=(IsAuthenticated,),
+        throttle_scope="follow",
     )
     def follow(self, request, pk=None):
         """Endpoint for following specific user"""
         user = self.get_object()
         follower = self.request.user
-        if user != follower and follower not in user.user_followers.all():
-            user.user_followers.add(follower)
-            user.save()
+        if user != follower and not is_following(follower.id, user.id):
+            with transaction.atomic():
+                self.lock_follows()
+                user.user_followers.add(follower)
 
         return Response(status=status.HTTP_200_OK)
 
@@ -120,17 +196,151 @@ class UserViewSet(viewsets.ModelViewSet):
         detail=True,
         url_path="unfollow",
         permission_classes=(IsAuthenticated,),
+        throttle_scope="follow",
     )
     def unfollow(self, request, pk=None):
         """Endpoint for unfollowing specific user"""
         user = self.get_object()
         follower = self.request.user
-        if follower in user.user_followers.all():
-            user.user_followers.remove(follower)
-            user.save()
+        if is_following(follower.id, user.id):
+            with transaction.atomic():
+                self.lock_follows()
+                user.user_followers.remove(follower)
 
         return Response(status=status.HTTP_200_OK)
 
+    def lock_follows(self) -> None:
+        """Queue follow changes of the requesting user behind each other.
+
+        Counters shift by the follows a change finds missing or present,
+        which only holds while no other change of the same follows runs.
+        """
+        get_user_model().objects.select_for_update().filter(
+            pk=self.request.user.id
+        ).values_list("pk").first()
+
+    def get_bulk_follow_ids(self, request) -> set[int]:
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return set(serializer.validated_data["user_ids"]) - {request.user.id}
+
+    @action(
+        methods=["POST"],
+        detail=False,
+        url_path="bulk_follow",
+        permission_classes=(IsAuthenticated,),
+        throttle_scope="follow",
+    )
+    def bulk_follow(self, request):
+        """Endpoint for following many users at once"""
+        user_ids = self.get_bulk_follow_ids(request)
+        follower_id = request.user.id
+        with transaction.atomic():
+            self.lock_follows()
+            following = Follow.objects.filter(from_user=follower_id)
+            candidate_ids = set(
+                get_user_model()
+                .objects.filter(id__in=user_ids)
+                .exclude(id__in=following.values("to_user"))
+                .values_list("id", flat=True)
+            )
+            Follow.objects.bulk_create(
+                [
+                    Follow(from_user_id=follower_id, to_user_id=user_id)
+                    for user_id in candidate_ids
+                ],
+                ignore_conflicts=True,
+            )
+            # Rows that already existed were skipped by the insert.
+            new_ids = set(
+                following.filter(to_user__in=candidate_ids).values_list(
+                    "to_user", flat=True
+                )
+            )
+            if new_ids:
+                follow_graph_changed({follower_id}, new_ids, 1)
+
+        return Response(
+            {"followed": sorted(new_ids)}, status=status.HTTP_200_OK
+        )
+
+    @action(
+        methods=["POST"],
+        detail=False,
+        url_path="bulk_unfollow",
+        permission_classes=(IsAuthenticated,),
+        throttle_scope="follow",
+    )
+    def bulk_unfollow(self, request):
+        """Endpoint for unfollowing many users at once"""
+        user_ids = self.get_bulk_follow_ids(request)
+        follower_id = request.user.id
+        with transaction.atomic():
+            self.lock_follows()
+            follows = Follow.objects.filter(
+                from_user=follower_id, to_user__in=user_ids
+            )
+            old_ids = set(follows.values_list("to_user", flat=True))
+            follows.delete()
+            if old_ids:
+                follow_graph_changed({follower_id}, old_ids, -1)
+
+        return Response(
+            {"unfollowed": sorted(old_ids)}, status=status.HTTP_200_OK
+        )
+
+    def list_follows(self, side: str, other: str):
+        user = self.get_object()
+        follows = Follow.objects.filter(**{side: user}).select_related(other)
+        page = self.paginate_queryset(follows)
+        serializer = self.get_serializer(page, many=True)
+
+        return self.get_paginated_response(serializer.data)
+
+    @extend_schema(parameters=KEYSET_PAGE_PARAMETERS)
+    @action(
+        methods=["GET"],
+        detail=True,
+        url_path="followers",
+        pagination_class=FollowPagination,
+    )
+    def followers(self, request, pk=None):
+        """Endpoint for paging through followers of specific user"""
+        return self.list_follows("to_user", "from_user")
+
+    @extend_schema(parameters=KEYSET_PAGE_PARAMETERS)
+    @action(
+        methods=["GET"],
+        detail=True,
+        url_path="following",
+        pagination_class=FollowPagination,
+    )
+    def following(self, request, pk=None):
+        """Endpoint for paging through users followed by specific user"""
+        return self.list_follows("from_user", "to_user")
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name="q",
+                description="Search by name prefix (ex. ?q=bra pi)",
+                type=str,
+            ),
+        ]
+    )
+    @action(methods=["GET"], detail=False, url_path="search")
+    def search(self, request):
+        """Endpoint for type-ahead search over usernames and names"""
+        limit = self.paginator.get_page_size(request)
+        user_ids = search_user_ids(request.query_params.get("q", ""), limit)
+        users = get_user_model().objects.in_bulk(user_ids)
+        serializer = self.get_serializer(
+            [users[user_id] for user_id in user_ids if user_id in users],
+            many=True,
+        )
+
+        return Response(serializer.data)
+
     @extend_schema(
         parameters=[
             OpenApiParameter(
@@ -154,11 +364,14 @@ class UserViewSet(viewsets.ModelViewSet):
         return super().list(request, *args, **kwargs)
 
 
-class PostViewSet(viewsets.ModelViewSet):
+class PostViewSet(
+    ReplicaReadMixin, CachedResponseMixin, viewsets.ModelViewSet
+):
     queryset = Post.objects.all()
     serializer_class = PostSerializer
     permission_classes = (IsAdminOrIfAuthenticatedReadOnly,)
     pagination_class = PostPagination
+    throttle_scope = None
 
     def get_serializer_class(self):
         if self.action == "list":
@@ -167,8 +380,12 @@ class PostViewSet(viewsets.ModelViewSet):
             return PostDetailSerializer
         if self.action == "add_comment":
             return CommentSerializer
+        if self.action == "comments":
+            return CommentListSerializer
         if self.action == "like":
             return LikeSerializer
+        if self.action == "bulk_like":
+            return BulkLikeSerializer
 
         return PostListSerializer
 
@@ -180,32 +397,160 @@ class PostViewSet(viewsets.ModelViewSet):
 
         return super().get_permissions()
 
-    def get_queryset(self):
-        queryset = self.queryset
+    def get_cache_scopes(self):
+        viewer_id = self.request.user.id
+        if self.action == "list":
+            author_ids = sorted({viewer_id, *following_ids(viewer_id)})
+            return [user_scope(viewer_id), *map(author_scope, author_ids)]
+        if self.action == "retrieve":
+            post_id = self.kwargs["pk"]
+            author_id = get_post_author(post_id)
+            if author_id is None:
+                return None
+            return [
+                user_scope(viewer_id),
+                user_scope(author_id),
+                post_scope(post_id),
+            ]
+
+        return None
 
-        hashtag = self.request.query_params.get("hashtag")
-        if hashtag:
-            queryset = queryset.filter(hashtag__icontains=hashtag)
+    def get_object(self):
+        try:
+            post = super().get_object()
+        except Http404:
+            post = self.get_archived_object()
+        remember_post_author(post.id, post.user_id)
+        return post
+
+    def get_archived_object(self):
+        """Post moved to the archive, if the user may see it. Only its
+        creator may change it, by editing or deleting it
+        """
+        archive = settings.POST_ARCHIVE_DATABASE
+        if archive is None:
+            raise Http404
+        # Timelines drop archived posts: visibility follows authors.
+        viewer_id = self.request.user.id
+        queryset = self.queryset.using(archive).filter(
+            user__in={viewer_id, *following_ids(viewer_id)}
+        )
+        if self.action == "retrieve":
+            queryset = queryset.prefetch_related("user")
+
+        post = generics.get_object_or_404(queryset, pk=self.kwargs["pk"])
+        self.check_object_permissions(self.request, post)
+        if self.request.method not in SAFE_METHODS and self.action not in (
+            "update",
+            "partial_update",
+            "destroy",
+        ):
+            raise PermissionDenied("Archived posts are read-only.")
+        return post
+
+    def get_shard_querysets(self) -> list:
+        """Posts the user may see, as one queryset per database of them"""
+        if not sharding_enabled():
+            queryset = self.queryset
+
+            hashtag = self.request.query_params.get("hashtag")
+            if hashtag:
+                queryset = queryset.filter(
+                    tags__name=hashtag.lstrip("#").lower()
+                )
+
+            username = self.request.query_params.get("username")
+            if username:
+                queryset = queryset.filter(user__username__icontains=username)
+
+            queryset = queryset.filter(
+                timeline_entries__owner=self.request.user
+            )
+            return [queryset]
+
+        # Shards hold no timelines: the feed is the posts of the viewer
+        # and of whoever they follow. Users and hashtags are looked up on
+        # "default" first, as shards can't join them.
+        viewer_id = self.request.user.id
+        author_ids = {viewer_id, *following_ids(viewer_id)}
 
         username = self.request.query_params.get("username")
         if username:
-            queryset = queryset.filter(user__username__icontains=username)
-
-        if self.action in ("list", "retrieve"):
-            queryset = queryset.prefetch_related("user")
+            author_ids &= set(
+                get_user_model()
+                .objects.filter(
+                    id__in=author_ids, username__icontains=username
+                )
+                .values_list("id", flat=True)
+            )
 
-        queryset = queryset.filter(
-            Q(user=self.request.user)
-            | Q(user__in=self.request.user.user_follow.all())
-        )
+        hashtag = self.request.query_params.get("hashtag")
+        hashtag_id = None
+        if hashtag:
+            hashtag_id = (
+                Hashtag.objects.filter(name=hashtag.lstrip("#").lower())
+                .values_list("id", flat=True)
+                .first()
+            )
+            if hashtag_id is None:
+                return []
+
+        querysets = []
+        for alias, user_ids in group_by_shard(author_ids).items():
+            queryset = self.queryset.using(alias).filter(user__in=user_ids)
+            if hashtag_id is not None:
+                queryset = queryset.filter(tags=hashtag_id)
+            querysets.append(queryset)
+        return querysets
+
+    def get_feed_querysets(self) -> list:
+        """The feed's querysets, annotated with what it is ordered by.
+
+        Timelines order and seek on their own rows, which
+        timeline_owner_created_idx walks without sorting; shards have no
+        timelines and order on the posts themselves.
+        """
+        prefix = "" if sharding_enabled() else "timeline_entries__"
+        return [
+            queryset.annotate(
+                feed_created_at=F(f"{prefix}created_at"),
+                feed_post_id=F(f"{prefix}post" if prefix else "id"),
+            )
+            for queryset in self.get_shard_querysets()
+        ]
 
-        return queryset
+    def get_queryset(self):
+        if self.action == "list":
+            querysets = self.get_feed_querysets()
+            ordering = self.pagination_class.cursor_ordering
+        else:
+            querysets = self.get_shard_querysets()
+            ordering = ("-created_at", "-id")
+        if self.action in ("list", "retrieve"):
+            querysets = [
+                queryset.prefetch_related("user") for queryset in querysets
+            ]
+
+        if not sharding_enabled():
+            return querysets[0].order_by(*ordering)
+        if self.detail:
+            try:
+                post_id = int(self.kwargs["pk"])
+            except ValueError:
+                return self.queryset.none()
+            alias = shard_of_post(post_id)
+            for queryset in querysets:
+                if queryset.db == alias:
+                    return queryset
+            return self.queryset.none()
+        return MergedQuerySet(querysets, ordering)
 
     @action(
         methods=["POST"],
         detail=True,
         url_path="add_comment",
         permission_classes=(IsAuthenticated,),
+        throttle_scope="comment",
     )
     def add_comment(self, request, pk=None):
         """Endpoint for adding comment to specific post"""
@@ -215,24 +560,146 @@ class PostViewSet(viewsets.ModelViewSet):
 
         return Response(status=status.HTTP_200_OK)
 
+    @extend_schema(parameters=KEYSET_PAGE_PARAMETERS)
+    @action(
+        methods=["GET"],
+        detail=True,
+        url_path="comments",
+        pagination_class=CommentPagination,
+    )
+    def comments(self, request, pk=None):
+        """Endpoint for paging through comments of specific post"""
+        post = self.get_object()
+        comments = with_users(post.comments.all())
+        page = self.paginate_queryset(comments)
+        serializer = self.get_serializer(page, many=True)
+
+        return self.get_paginated_response(serializer.data)
+
     @action(
         methods=["POST"],
         detail=True,
         url_path="like",
         permission_classes=(IsAuthenticated,),
+        throttle_scope="like",
     )
     def like(self, request, pk=None):
         """Endpoint for liking specific post"""
         post = self.get_object()
-        user = self.request.user
-        try:
-            like = get_object_or_404(Like, post=post, user=user)
-            like.is_liked = not like.is_liked
-            like.save()
-        except Http404:
-            Like.objects.create(post=post, user=user, is_liked=True)
+        if settings.LIKE_BUFFER_ENABLED:
+            is_liked = get_buffer().toggle(
+                request.user.id,
+                post.id,
+                post.likes.filter(user=request.user, is_liked=True).exists,
+            )
+            return Response({"is_liked": is_liked}, status=status.HTTP_200_OK)
+
+        db = post._state.db
+        with transaction.atomic(using=db):
+            is_liked = Like.objects.db_manager(db).toggle(
+                post.id, request.user.id
+            )
+            Post.objects.db_manager(db).update_counter(
+                post.id, "likes_count", 1 if is_liked else -1
+            )
+        bump_post(post.id, post.user_id)
+
+        return Response({"is_liked": is_liked}, status=status.HTTP_200_OK)
 
-        return Response(status=status.HTTP_200_OK)
+    @action(
+        methods=["POST"],
+        detail=False,
+        url_path="bulk_like",
+        permission_classes=(IsAuthenticated,),
+        throttle_scope="like",
+    )
+    def bulk_like(self, request):
+        """Endpoint for liking or unliking many posts at once"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        states = {
+            like["post"]: like["is_liked"]
+            for like in serializer.validated_data["likes"]
+        }
+        authors = {}
+        shard_states = {}
+        for queryset in self.get_shard_querysets():
+            posts = dict(
+                queryset.filter(id__in=states).values_list("id", "user")
+            )
+            if posts:
+                authors.update(posts)
+                shard_states[queryset.db] = {
+                    post_id: states[post_id] for post_id in posts
+                }
+        states = {
+            post_id: is_liked
+            for post_id, is_liked in states.items()
+            if post_id in authors
+        }
+        if settings.LIKE_BUFFER_ENABLED:
+            get_buffer().put(request.user.id, states)
+            return Response(
+                {"applied": sorted(states)}, status=status.HTTP_200_OK
+            )
+
+        deltas = {}
+        for db, db_states in shard_states.items():
+            with transaction.atomic(using=db):
+                db_deltas = Like.objects.db_manager(db).set_many(
+                    request.user.id, db_states
+                )
+                Post.objects.db_manager(db).shift_counters(
+                    "likes_count", db_deltas
+                )
+            deltas.update(db_deltas)
+        bump_posts(
+            {
+                post_id: authors[post_id]
+                for post_id, delta in deltas.items()
+                if delta
+            }
+        )
+
+        return Response({"applied": sorted(states)}, status=status.HTTP_200_OK)
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name="q",
+                description="Search post text and hashtags (ex. ?q=sunny)",
+                type=str,
+            ),
+        ]
+    )
+    @action(methods=["GET"], detail=False, url_path="search")
+    def search(self, request):
+        """Endpoint for full-text search over posts in user's feed"""
+        limit = self.paginator.get_page_size(request)
+        query = request.query_params.get("q", "")
+        if sharding_enabled():
+            viewer_id = request.user.id
+            author_ids = {viewer_id, *following_ids(viewer_id)}
+            hits = search_shard_post_ids(query, author_ids, limit)
+        else:
+            hits = [
+                (None, post_id)
+                for post_id in search_post_ids(query, request.user.id, limit)
+            ]
+
+        shard_post_ids = {}
+        for alias, post_id in hits:
+            shard_post_ids.setdefault(alias, []).append(post_id)
+        posts = {}
+        for alias, post_ids in shard_post_ids.items():
+            queryset = with_users(Post.objects.using(alias))
+            posts.update(queryset.in_bulk(post_ids))
+        serializer = self.get_serializer(
+            [posts[post_id] for _, post_id in hits if post_id in posts],
+            many=True,
+        )
+
+        return Response(serializer.data)
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
@@ -246,7 +713,7 @@ class PostViewSet(viewsets.ModelViewSet):
             ),
             OpenApiParameter(
                 name="hashtag",
-                description="Filter by hashtag (ex. ?hashtag=sun)",
+                description="Filter by exact hashtag (ex. ?hashtag=sun)",
                 type=str,
             ),
         ]
@@ -255,14 +722,175 @@ class PostViewSet(viewsets.ModelViewSet):
         return super().list(request, *args, **kwargs)
 
 
-class LikeList(generics.ListAPIView):
+class LikeList(ReplicaReadMixin, generics.ListAPIView):
     queryset = Like.objects.all()
     serializer_class = LikeListSerializer
+    pagination_class = LikePagination
+
+    def get_pending_likes(self) -> dict[int, bool]:
+        if not settings.LIKE_BUFFER_ENABLED:
+            return {}
+        if not hasattr(self, "_pending_likes"):
+            self._pending_likes = get_buffer().pending(self.request.user.id)
+        return self._pending_likes
 
     def get_queryset(self):
         queryset = self.queryset.select_related("post")
         user = self.request.user
 
-        queryset = queryset.filter(user=user, is_liked=True)
+        pending = self.get_pending_likes()
+        liked = [post_id for post_id, liked in pending.items() if liked]
+        unliked = [post_id for post_id, liked in pending.items() if not liked]
+        queryset = queryset.filter(
+            Q(is_liked=True) | Q(post__in=liked), user=user
+        ).exclude(post__in=unliked)
+
+        if sharding_enabled():
+            # A user's likes sit next to the posts they like.
+            return MergedQuerySet(queryset.per_shard(), ("-id",))
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        if request.query_params.get(KeysetPagination.cursor_query_param):
+            return response
+
+        # Likes still waiting in the buffer have no row yet; show them
+        # first, as they are the newest.
+        liked = {
+            post_id
+            for post_id, is_liked in self.get_pending_likes().items()
+            if is_liked
+        }
+        likes = Like.objects.filter(user=request.user, post__in=liked)
+        for shard_likes in likes.per_shard():
+            liked -= set(shard_likes.values_list("post", flat=True))
+        if liked:
+            posts = {}
+            for shard_posts in Post.objects.all().per_shard():
+                posts.update(shard_posts.in_bulk(liked))
+            pending = self.get_serializer(
+                [
+                    Like(user=request.user, post=post, is_liked=True)
+                    for post in posts.values()
+                ],
+                many=True,
+            ).data
+            results = response.data
+            if isinstance(results, dict):
+                results = results["results"]
+            results[:0] = pending
+
+        return response
+
+    async def aget(self, request, *args, **kwargs):
+        """Load liked posts with the async ORM when nothing is buffered"""
+        if (
+            settings.LIKE_BUFFER_ENABLED
+            or KeysetPagination.cursor_query_param in request.query_params
+            or sharding_enabled()
+        ):
+            return await sync_to_async(self.list)(request, *args, **kwargs)
+
+        likes = [like async for like in self.get_queryset()]
+        serializer = self.get_serializer(likes, many=True)
+        return Response(serializer.data)
+
+
+class HashtagList(generics.ListAPIView):
+    queryset = Hashtag.objects.all()
+    serializer_class = HashtagSerializer
+    pagination_class = HashtagPagination
+    permission_classes = (IsAuthenticated,)
+
+    def get_queryset(self):
+        queryset = self.queryset
+
+        prefix = self.request.query_params.get("q", "").lstrip("#").lower()
+        if prefix:
+            # A range over the unique index instead of LIKE, which SQLite
+            # can't serve from an index for case-insensitive matches.
+            queryset = queryset.filter(
+                name__gte=prefix, name__lt=prefix + chr(0x10FFFF)
+            )
 
         return queryset
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name="q",
+                description="Autocomplete by hashtag prefix (ex. ?q=su)",
+                type=str,
+            ),
+        ]
+    )
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+
+class UploadViewSet(
+    mixins.CreateModelMixin,
+    mixins.RetrieveModelMixin,
+    viewsets.GenericViewSet,
+):
+    """
+    Resumable uploads: create one with the total `size`, then PATCH raw
+    chunks with an `Upload-Offset` header; GET tells where to resume.
+    """
+
+    queryset = Upload.objects.all()
+    serializer_class = UploadSerializer
+    permission_classes = (IsAuthenticated,)
+
+    def get_queryset(self):
+        return self.queryset.filter(user=self.request.user)
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+    @extend_schema(
+        request={"application/offset+octet-stream": bytes},
+        parameters=[
+            OpenApiParameter(
+                name="Upload-Offset",
+                location=OpenApiParameter.HEADER,
+                description="Byte offset of this chunk in the file",
+                type=int,
+                required=True,
+            ),
+        ],
+    )
+    def partial_update(self, request, pk=None):
+        """Endpoint for appending a chunk to an upload"""
+        upload = self.get_object()
+        try:
+            offset = int(request.headers["Upload-Offset"])
+            length = int(request.headers.get("Content-Length") or 0)
+        except (KeyError, ValueError):
+            raise ValidationError("Upload-Offset header is required.")
+
+        if upload.is_complete or offset != upload.offset:
+            return Response(
+                self.get_serializer(upload).data,
+                status=status.HTTP_409_CONFLICT,
+            )
+        if length > settings.UPLOAD_CHUNK_MAX_SIZE:
+            return Response(
+                {"detail": "Chunk is too large."},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            )
+        if offset + length > upload.size:
+            raise ValidationError("Chunk ends past the declared size.")
+
+        if not append_chunk(upload, offset, request.stream, length):
+            upload.refresh_from_db()
+            return Response(
+                self.get_serializer(upload).data,
+                status=status.HTTP_409_CONFLICT,
+            )
+        upload.refresh_from_db()
+        if upload.offset == upload.size:
+            finish(upload)
+
+        return Response(self.get_serializer(upload).data)